@@ -0,0 +1,198 @@
+import io
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+GIF_MAX_COLORS = 256
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Disposal is stored by name, since GIF and APNG number the same operations differently
+GIF_DISPOSAL = {0: "none", 1: "none", 2: "background", 3: "previous"}
+APNG_DISPOSAL = {0: "none", 1: "background", 2: "previous"}
+
+
+def is_animated(path):
+    with Image.open(path) as im:
+        return getattr(im, "n_frames", 1) > 1
+
+
+def frame_info(im):
+    if im.format == "GIF":
+        disposal = GIF_DISPOSAL.get(im.disposal_method, "none")
+    else:
+        disposal = APNG_DISPOSAL.get(im.info.get("disposal", 0), "none")
+    return {
+        "duration": int(im.info.get("duration", 0)),
+        "disposal": disposal,
+    }
+
+
+def gif_disposal(name):
+    return {"none": 1, "background": 2, "previous": 3}[name]
+
+
+def apng_disposal(name):
+    return {"none": 0, "background": 1, "previous": 2}[name]
+
+
+def apng_delay(duration):
+    # (numerator, denominator) of a frame delay in seconds; both are 16-bit, so
+    # long delays fall back to coarser units
+    duration = max(0, int(duration))
+    for den in (1000, 100, 10, 1):
+        num = round(duration * den / 1000)
+        if num <= 0xFFFF:
+            return num, den
+    return 0xFFFF, 1
+
+
+def iter_frames(path):
+    # Decodes one frame at a time; only the current frame is held in memory
+    with Image.open(path) as im:
+        for n in range(getattr(im, "n_frames", 1)):
+            im.seek(n)
+            yield np.asarray(im.convert("RGBA")), frame_info(im)
+
+
+def pack(rgba):
+    return np.ascontiguousarray(rgba, dtype=np.uint8).view(np.uint32).reshape(rgba.shape[:-1])
+
+
+def union_palette(path):
+    # Packed RGBA values of every color used in any frame, sorted
+    union = np.empty(0, dtype=np.uint32)
+    for rgba, _ in iter_frames(path):
+        union = np.union1d(union, np.unique(pack(rgba)))
+    return union
+
+
+def recolor_animation(src, dst, recipe):
+    if not dst.lower().endswith((".gif", ".png", ".apng")):
+        raise ValueError(f"animations can only be saved as GIF or PNG: {dst}")
+
+    union = union_palette(src)
+    mapped = recipe.compile(union.view(np.uint8).reshape(-1, 4))
+
+    with Image.open(src) as im:
+        size = im.size
+        frame_count = getattr(im, "n_frames", 1)
+        loop = im.info.get("loop")
+
+    def recolored_frames():
+        for rgba, info in iter_frames(src):
+            yield np.searchsorted(union, pack(rgba)), info
+
+    # Frames are still being read from src while the output is written, so
+    # dst is only replaced once the new file is complete; this makes saving
+    # over the source safe
+    root, ext = os.path.splitext(dst)
+    partial = f"{root}.{os.getpid()}.tmp{ext}"
+    try:
+        if dst.lower().endswith(".gif"):
+            write_gif(partial, size, mapped, recolored_frames(), loop)
+        else:
+            write_apng(partial, size, frame_count, mapped, recolored_frames(), loop)
+        os.replace(partial, dst)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return frame_count
+
+
+def write_gif(dst, size, palette, frames, loop=None):
+    # frames yields (index map into palette, frame info). The shared palette
+    # becomes the global color table, so frames are written as they arrive.
+    opaque = palette[:, 3] > 0
+    colors, color_index = np.unique(palette[:, :3][opaque], axis=0, return_inverse=True)
+    transparent = None if opaque.all() else len(colors)
+    if len(colors) + (transparent is not None) > GIF_MAX_COLORS:
+        return _write_gif_quantized(dst, size, palette, frames, loop)
+
+    lookup = np.full(len(palette), transparent or 0, dtype=np.uint8)
+    lookup[opaque] = color_index.reshape(-1)
+    table = np.zeros((2 ** max(1, (len(colors) + (transparent is not None) - 1).bit_length()), 3), np.uint8)
+    table[:len(colors)] = colors
+
+    with open(dst, "wb") as fp:
+        fp.write(b"GIF89a" + struct.pack("<HH", *size))
+        fp.write(bytes([0x80 | (len(table).bit_length() - 2), transparent or 0, 0]))
+        fp.write(table.tobytes())
+        if loop is not None:
+            fp.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+
+        for index, info in frames:
+            frame = Image.fromarray(lookup[index])
+            params = {"duration": info["duration"], "disposal": gif_disposal(info["disposal"])}
+            if transparent is not None:
+                params["transparency"] = transparent
+            for chunk in GifImagePlugin.getdata(frame, (0, 0), **params):
+                fp.write(chunk)
+        fp.write(b";")
+
+
+def _write_gif_quantized(dst, size, palette, frames, loop):
+    # More colors than one GIF table holds: let Pillow quantize each frame.
+    # Pillow keeps every encoded frame until the file is written.
+    frames = iter(frames)
+    first_index, first_info = next(frames)
+    # Filled in as Pillow pulls frames, before it looks each entry up
+    durations = [first_info["duration"]]
+    disposals = [gif_disposal(first_info["disposal"])]
+
+    def rest():
+        for index, info in frames:
+            durations.append(info["duration"])
+            disposals.append(gif_disposal(info["disposal"]))
+            yield Image.fromarray(palette[index])
+
+    params = {"duration": durations, "disposal": disposals}
+    if loop is not None:
+        params["loop"] = loop
+    Image.fromarray(palette[first_index]).save(dst, save_all=True, append_images=rest(), **params)
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def _encoded_idat(rgba):
+    buffer = io.BytesIO()
+    Image.fromarray(rgba).save(buffer, "PNG")
+    data = buffer.getvalue()
+    pos, idat = len(PNG_SIGNATURE), []
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        if kind == b"IDAT":
+            idat.append(data[pos + 8:pos + 8 + length])
+        pos += 12 + length
+    return b"".join(idat)
+
+
+def write_apng(dst, size, frame_count, palette, frames, loop=None):
+    width, height = size
+    sequence = 0
+    with open(dst, "wb") as fp:
+        fp.write(PNG_SIGNATURE)
+        fp.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+        plays = 1 if loop is None else loop
+        fp.write(png_chunk(b"acTL", struct.pack(">II", frame_count, plays)))
+
+        for n, (index, info) in enumerate(frames):
+            # Frames are already composited onto the full canvas, so each one
+            # replaces what is there (APNG_BLEND_OP_SOURCE) instead of being
+            # blended over it a second time
+            fp.write(png_chunk(b"fcTL", struct.pack(">IIIIIHHBB", sequence, width, height, 0, 0,
+                                                     *apng_delay(info["duration"]), apng_disposal(info["disposal"]),
+                                                     0)))
+            sequence += 1
+            data = _encoded_idat(palette[index])
+            if n == 0:
+                fp.write(png_chunk(b"IDAT", data))
+            else:
+                fp.write(png_chunk(b"fdAT", struct.pack(">I", sequence) + data))
+                sequence += 1
+        fp.write(png_chunk(b"IEND", b""))
@@ -0,0 +1,309 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from PIL import Image
+
+from engine import index_colors, apply_palette
+from recipe import Recipe
+from animation import is_animated, recolor_animation
+from streaming import stream_swap, DEFAULT_STRIP_ROWS
+from indexed import read_indexed, indexed_digest, can_write_indexed, write_indexed
+from result_cache import ResultCache, DEFAULT_CACHE_BYTES
+from parallel import parallel_swap
+from colorspace import METRICS, BRIGHTNESS_MODES
+import perf
+from perf import stage
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".npy")
+
+
+def parse_color(text):
+    text = text.strip()
+    if "," in text:
+        rgb = tuple(int(v) for v in text.split(","))
+    else:
+        text = text.lstrip("#")
+        if len(text) != 6:
+            raise ValueError(f"invalid color: {text!r}")
+        rgb = tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+    if len(rgb) != 3 or not all(0 <= v <= 255 for v in rgb):
+        raise ValueError(f"invalid color: {text!r}")
+    return rgb
+
+
+def parse_swap(text, default_threshold=30, default_preserve=True):
+    # OLD:NEW[:THRESHOLD[:PRESERVE_BW]], e.g. "#ff0000:0,255,0:40:no"
+    parts = text.split(":")
+    if not 2 <= len(parts) <= 4:
+        raise ValueError(f"invalid swap: {text!r}")
+    old_rgb = parse_color(parts[0])
+    new_rgb = parse_color(parts[1])
+    thresh = int(parts[2]) if len(parts) > 2 and parts[2] else default_threshold
+    preserve = default_preserve
+    if len(parts) > 3:
+        flag = parts[3].lower()
+        if flag not in ("yes", "no", "true", "false", "1", "0"):
+            raise ValueError(f"invalid preserve flag in swap: {text!r}")
+        preserve = flag in ("yes", "true", "1")
+    return old_rgb, new_rgb, thresh, preserve
+
+
+def collect_inputs(source):
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def output_names(paths):
+    # Output file names relative to the output directory. Inputs with the same
+    # name from different directories keep their relative directory instead
+    # of overwriting each other.
+    names = [os.path.basename(path) for path in paths]
+    if len(set(names)) == len(names):
+        return names
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+    return [os.path.relpath(os.path.abspath(path), root) for path in paths]
+
+
+def recolor_image(img, recipe):
+    palette, index = index_colors(np.asarray(img.convert("RGBA")))
+    return Image.fromarray(apply_palette(recipe.compile(palette), index))
+
+
+def recolor_file(path, output_dir, recipe, strip_rows=None, profile=False, cache_dir=None,
+                 cache_bytes=DEFAULT_CACHE_BYTES, band_workers=1, out_name=None):
+    # Returns the timings recorded for this file so worker processes can hand them back
+    perf.profiler.enabled = profile
+    start = time.perf_counter()
+    out_path = os.path.join(output_dir, out_name or os.path.basename(path))
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    cached = None
+    # Raw .npy arrays are always streamed, since Pillow can't open them.
+    # Animations are already written a frame at a time, so --strip-rows
+    # leaves them to the frame writer rather than flattening them.
+    npy = path.lower().endswith(".npy")
+    if not npy and is_animated(path):
+        with stage("animation"):
+            recolor_animation(path, out_path, recipe)
+    elif strip_rows or npy:
+        with stage("stream_swap"):
+            stream_swap(path, out_path, recipe, strip_rows or DEFAULT_STRIP_ROWS)
+    elif cache_dir:
+        with ResultCache(cache_dir, cache_bytes) as cache:
+            cached = recolor_cached(path, out_path, recipe, cache)
+    else:
+        with stage("decode"):
+            rgba, found = read_sprite(path)
+        if found is None and band_workers > 1:
+            # One big image: split it into row bands across processes instead
+            with stage("swap", rgba.shape[0] * rgba.shape[1]):
+                rgba = parallel_swap(rgba, recipe, band_workers)
+            with stage("encode"):
+                save_rgba(rgba, out_path)
+        else:
+            with stage("swap", rgba.shape[0] * rgba.shape[1] if found is None else found[1].size):
+                palette, index = found if found is not None else index_colors(rgba)
+                mapped = recipe.compile(palette)
+            with stage("encode"):
+                encode(mapped, index, found is not None, out_path)
+    return path, out_path, time.perf_counter() - start, perf.profiler.drain(), cached
+
+
+def read_sprite(path):
+    # (rgba, None) for most images; (None, (palette, index)) for indexed ones
+    with Image.open(path) as img:
+        found = read_indexed(img)
+        if found is not None:
+            return None, found
+        return np.asarray(img.convert("RGBA")), None
+
+
+def decode(path):
+    # (palette, index, indexed): indexed images keep their own palette and
+    # index map, anything else is reduced to its unique colors
+    rgba, found = read_sprite(path)
+    if found is not None:
+        return (*found, True)
+    return (*index_colors(rgba), False)
+
+
+def save_rgba(rgba, out_path):
+    result = Image.fromarray(rgba)
+    if out_path.lower().endswith((".jpg", ".jpeg")):
+        result = result.convert("RGB")
+    result.save(out_path)
+
+
+def encode(palette, index, indexed, out_path):
+    # Indexed sources are written back as indexed images where the format allows
+    if indexed and can_write_indexed(out_path, palette):
+        write_indexed(out_path, palette, index)
+    else:
+        save_rgba(apply_palette(palette, index), out_path)
+
+
+def recolor_cached(path, out_path, recipe, cache):
+    # A file seen before with the same size and mtime is served without decoding;
+    # otherwise its pixels are hashed, and equal pixels still share results
+    ext = os.path.splitext(out_path)[1].lower()
+    with stage("cache_lookup"):
+        digest = cache.source_digest(path)
+        if digest and cache.fetch_output(digest, recipe, ext, out_path):
+            return True
+
+    with stage("decode"):
+        palette, index, indexed = decode(path)
+    with stage("cache_lookup"):
+        new_digest = indexed_digest(palette, index)
+        cache.remember_source(path, new_digest)
+        if new_digest != digest and cache.fetch_output(new_digest, recipe, ext, out_path):
+            return True
+        mapped = cache.fetch_mapping(new_digest, recipe)
+
+    with stage("swap", index.size):
+        if mapped is None:
+            mapped = recipe.compile(palette)
+            cache.store_mapping(new_digest, recipe, mapped)
+    with stage("encode"):
+        encode(mapped, index, indexed, out_path)
+    with stage("cache_store"):
+        cache.store_output(new_digest, recipe, ext, out_path)
+    return False
+
+
+def run_batch(paths, output_dir, recipe, workers=1, progress=None, strip_rows=None, profile=False,
+              cache_dir=None, cache_bytes=DEFAULT_CACHE_BYTES, band_workers=None):
+    # Returns (results, failures). A file that can't be recolored is reported
+    # as a (path, error) failure and the rest of the batch carries on.
+    os.makedirs(output_dir, exist_ok=True)
+    results, failures = [], []
+    # A lone file gets the workers as row bands; otherwise whole files are spread out
+    if band_workers is None:
+        band_workers = workers if len(paths) == 1 else 1
+    options = (strip_rows, profile, cache_dir, cache_bytes, band_workers)
+    names = output_names(paths)
+
+    def report(result):
+        path, out_path, seconds, events, cached = result
+        results.append(result)
+        perf.profiler.events.extend(events)
+        if progress:
+            progress(len(results) + len(failures), len(paths), path, out_path, seconds, cached)
+
+    def fail(path, error):
+        failures.append((path, error))
+        if progress:
+            progress(len(results) + len(failures), len(paths), path, None, None, None, error)
+
+    if workers <= 1 or len(paths) == 1:
+        for path, name in zip(paths, names):
+            try:
+                result = recolor_file(path, output_dir, recipe, *options, name)
+            except Exception as exc:
+                fail(path, exc)
+            else:
+                report(result)
+        return results, failures
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(recolor_file, path, output_dir, recipe, *options, name): path
+                   for path, name in zip(paths, names)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as exc:
+                fail(futures[future], exc)
+            else:
+                report(result)
+    return results, failures
+
+
+def print_progress(done, total, path, out_path, seconds, cached=None, error=None):
+    if error is not None:
+        print(f"[{done}/{total}] {path} failed: {error}", file=sys.stderr)
+        return
+    note = ", cached" if cached else ""
+    print(f"[{done}/{total}] {path} -> {out_path} ({seconds * 1000:.1f} ms{note})")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Recolor sprites without opening the GUI.")
+    parser.add_argument("input", help="input directory or glob pattern")
+    parser.add_argument("output", help="output directory")
+    parser.add_argument("-s", "--swap", action="append", default=[], metavar="OLD:NEW[:THRESHOLD[:PRESERVE_BW]]",
+                        help="color swap, applied in the order given; colors are hex or r,g,b")
+    parser.add_argument("-r", "--recipe", help="JSON recipe to apply before any --swap")
+    parser.add_argument("-t", "--threshold", type=int, default=30,
+                        help="default sensitivity to gradient (default: 30)")
+    parser.add_argument("--no-preserve-bw", dest="preserve_bw", action="store_false",
+                        help="also recolor near-black and near-white pixels by default")
+    parser.add_argument("--metric", choices=[key for key, _ in METRICS], default="rgb",
+                        help="color distance used by --swap thresholds (default: %(default)s; "
+                             "de76/de2000 thresholds are in CIELAB ΔE units)")
+    parser.add_argument("--brightness", choices=[key for key, _ in BRIGHTNESS_MODES], default="average",
+                        help="how --swap carries shading over to the new color (default: %(default)s)")
+    parser.add_argument("--strip-rows", type=int, metavar="ROWS",
+                        help="stream each image in strips of ROWS rows to bound memory on huge atlases")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="reuse results from earlier runs stored in DIR; unchanged sprites skip decode and swap")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_BYTES // (1024 * 1024), metavar="MB",
+                        help="evict least recently used cache entries beyond this size (default: %(default)s)")
+    parser.add_argument("--profile", metavar="JSON", help="write per-stage timings to a JSON file")
+    parser.add_argument("--trace", metavar="JSON", help="write timings in Chrome trace-event format")
+    parser.add_argument("--band-workers", type=int, metavar="N",
+                        help="processes that share one image by row bands (default: --workers for a single input)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        recipe = Recipe.load(args.recipe) if args.recipe else Recipe()
+        for swap in args.swap:
+            recipe.add(*parse_swap(swap, args.threshold, args.preserve_bw), args.metric, args.brightness)
+    except (OSError, ValueError, KeyError) as exc:
+        parser.error(str(exc))
+    if not recipe.steps:
+        parser.error("at least one --swap or a --recipe is required")
+
+    paths = collect_inputs(args.input)
+    if not paths:
+        print(f"No images found for {args.input}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    profile = bool(args.profile or args.trace)
+    perf.profiler.reset()
+    results, failures = run_batch(paths, args.output, recipe, args.workers, print_progress, args.strip_rows,
+                                  profile, args.cache, args.cache_size * 1024 * 1024, args.band_workers)
+    elapsed = time.perf_counter() - start
+    print(f"Recolored {len(results)} sprites in {elapsed:.2f} s")
+    if failures:
+        print(f"{len(failures)} of {len(paths)} sprites failed", file=sys.stderr)
+    if args.cache:
+        lookups = [result[4] for result in results if result[4] is not None]
+        if lookups:
+            print(f"Cache: {sum(lookups)}/{len(lookups)} hits ({100 * sum(lookups) / len(lookups):.0f}%)")
+
+    if profile:
+        print(perf.profiler.format_summary())
+        if args.profile:
+            perf.profiler.export_json(args.profile)
+        if args.trace:
+            perf.profiler.export_trace(args.trace)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import argparse
+import hashlib
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from engine import swap_rgba, index_colors, swap_rows, apply_palette
+from distance_index import DistanceIndex, palette_counts
+from palette import color_histogram, cluster_swatches
+from preview import PreviewRenderer
+
+DEFAULT_SIZES = (32, 128, 512, 1024, 2048, 4096)
+DEFAULT_PALETTE_SIZES = (8, 64, 512)
+DEFAULT_THRESHOLDS = (0, 30, 100)
+BASE_COLOR = (120, 60, 200)
+NEW_COLOR = (250, 180, 20)
+
+
+def make_sprite(size, palette_size, seed=0):
+    # Blocky sprite drawn from shades of BASE_COLOR plus black/white outline colors
+    rng = np.random.default_rng(seed)
+    shades = np.clip(np.array(BASE_COLOR) + rng.integers(-80, 81, size=(palette_size, 3)), 0, 255)
+    # Tiny palettes keep as many of these fixed colors as fit
+    shades[:3] = [(0, 0, 0), (255, 255, 255), BASE_COLOR][:palette_size]
+    alpha = np.where(rng.random(palette_size) < 0.1, 0, 255)
+    palette = np.column_stack([shades, alpha]).astype(np.uint8)
+
+    block = max(1, size // 32)
+    cells = rng.integers(0, palette_size, size=(-(-size // block),) * 2)
+    index = np.repeat(np.repeat(cells, block, axis=0), block, axis=1)[:size, :size]
+    return palette[index]
+
+
+def digest(rgba):
+    return hashlib.blake2b(np.ascontiguousarray(rgba).data, digest_size=16).hexdigest()
+
+
+def time_call(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def bench_swap(rgba, thresh, preserve):
+    return swap_rgba(rgba, NEW_COLOR, BASE_COLOR, thresh, preserve)
+
+
+def bench_palette_swap(rgba, thresh, preserve):
+    palette, index = index_colors(rgba)
+    rows = DistanceIndex(palette, palette_counts(palette, index), BASE_COLOR, preserve).rows(thresh)
+    return apply_palette(swap_rows(palette, rows, NEW_COLOR, BASE_COLOR), index)
+
+
+def bench_extract(rgba):
+    colors, counts = color_histogram(rgba, use_cache=False)
+    swatches, _ = cluster_swatches(colors, counts, 10, 24)
+    return swatches
+
+
+def bench_preview(rgba):
+    return np.asarray(Image.fromarray(rgba).resize((250, 250), Image.LANCZOS))
+
+
+def bench_preview_render(palette, index):
+    frame, _ = PreviewRenderer(index).update(palette)
+    return frame
+
+
+def run_cases(sizes, palette_sizes, thresholds, repeat=3, progress=None):
+    results = []
+
+    def record(path, case, fn):
+        output, times = time_call(fn, repeat)
+        entry = dict(case, path=path, repeat=repeat, seconds_min=min(times),
+                     seconds_median=statistics.median(times), digest=digest(output))
+        results.append(entry)
+        if progress:
+            progress(entry)
+        return entry
+
+    for size, palette_size in itertools.product(sizes, palette_sizes):
+        rgba = make_sprite(size, palette_size)
+        case = {"size": size, "palette_size": palette_size, "pixels": size * size}
+        record("extract", case, lambda: bench_extract(rgba))
+        record("preview_resize", case, lambda: bench_preview(rgba))
+        palette, index = index_colors(rgba)
+        record("preview_render", case, lambda: bench_preview_render(palette, index))
+
+        for thresh, preserve in itertools.product(thresholds, (True, False)):
+            swap_case = dict(case, threshold=thresh, preserve_bw=preserve)
+            swap = record("swap_rgba", swap_case, lambda: bench_swap(rgba, thresh, preserve))
+            fused = record("palette_swap", swap_case, lambda: bench_palette_swap(rgba, thresh, preserve))
+            # Both engines must agree pixel for pixel
+            if swap["digest"] != fused["digest"]:
+                raise AssertionError(f"palette_swap differs from swap_rgba for {swap_case}")
+    return results
+
+
+def case_key(entry):
+    return tuple(entry.get(k) for k in ("path", "size", "palette_size", "threshold", "preserve_bw"))
+
+
+def compare(results, baseline):
+    # Returns (mismatched digests, {case: current / baseline median time})
+    previous = {case_key(e): e for e in baseline["results"]}
+    mismatches, ratios = [], {}
+    for entry in results:
+        old = previous.get(case_key(entry))
+        if old is None:
+            continue
+        if old["digest"] != entry["digest"]:
+            mismatches.append(case_key(entry))
+        if old["seconds_median"] > 0:
+            ratios[case_key(entry)] = entry["seconds_median"] / old["seconds_median"]
+    return mismatches, ratios
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "pillow": PIL.__version__,
+            "platform": platform.platform(), "machine": platform.machine()}
+
+
+def print_entry(entry):
+    extra = ""
+    if "threshold" in entry:
+        extra = f" t={entry['threshold']} bw={'on' if entry['preserve_bw'] else 'off'}"
+    print(f"{entry['path']:<15} {entry['size']:>5}px {entry['palette_size']:>4} colors{extra:<15} "
+          f"{entry['seconds_median'] * 1000:10.2f} ms")
+
+
+def int_list(text):
+    return tuple(int(v) for v in text.split(","))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the swap, extraction and preview hot paths.")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON file to write results to")
+    parser.add_argument("--sizes", type=int_list, default=DEFAULT_SIZES, help="comma-separated sprite sizes")
+    parser.add_argument("--palette-sizes", type=int_list, default=DEFAULT_PALETTE_SIZES)
+    parser.add_argument("--thresholds", type=int_list, default=DEFAULT_THRESHOLDS)
+    parser.add_argument("-n", "--repeat", type=int, default=3)
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results to check digests and timings against")
+    args = parser.parse_args(argv)
+    if min(args.palette_sizes) < 1:
+        parser.error("--palette-sizes must be positive")
+
+    results = run_cases(args.sizes, args.palette_sizes, args.thresholds, args.repeat, print_entry)
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            mismatches, ratios = compare(results, json.load(f))
+        for key, ratio in sorted(ratios.items(), key=lambda item: -item[1])[:10]:
+            print(f"{ratio:6.2f}x  {key}")
+        if mismatches:
+            print(f"{len(mismatches)} cases changed output:", *mismatches, sep="\n  ")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
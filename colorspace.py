@@ -0,0 +1,131 @@
+import numpy as np
+
+# Distance metrics and brightness modes, as (key, menu label)
+METRICS = (("rgb", "RGB"), ("weighted", "Weighted RGB"), ("de76", "CIELAB ΔE76"), ("de2000", "CIELAB ΔE2000"))
+BRIGHTNESS_MODES = (("average", "Average"), ("luminance", "Luminance"), ("lightness", "L*"))
+
+LAB_CACHE_LIMIT = 1 << 20
+
+_SRGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                         [0.2126729, 0.7151522, 0.0721750],
+                         [0.0193339, 0.1191920, 0.9503041]])
+_XYZ_TO_SRGB = np.linalg.inv(_SRGB_TO_XYZ)
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+_LUMA = np.array([0.2126, 0.7152, 0.0722])
+_DELTA = 6 / 29
+
+# Lab of every RGB color converted so far, as (sorted packed keys, values).
+# Replaced as a whole, so threads never see keys and values out of step.
+_lab_cache = (np.empty(0, dtype=np.uint32), np.empty((0, 3)))
+
+
+def pack_rgb(rgb):
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def srgb_to_lab(rgb):
+    # CIELAB (D65) of sRGB colors in 0..255, without caching
+    c = np.asarray(rgb, dtype=np.float64) / 255
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _SRGB_TO_XYZ.T / _WHITE_D65
+    f = np.where(xyz > _DELTA ** 3, np.cbrt(xyz), xyz / (3 * _DELTA ** 2) + 4 / 29)
+    fx, fy, fz = f[..., 0], f[..., 1], f[..., 2]
+    return np.stack([116 * fy - 16, 500 * (fx - fy), 200 * (fy - fz)], axis=-1)
+
+
+def lab_to_srgb(lab):
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16) / 116
+    f = np.stack([fy + lab[..., 1] / 500, fy, fy - lab[..., 2] / 200], axis=-1)
+    xyz = np.where(f > _DELTA, f ** 3, 3 * _DELTA ** 2 * (f - 4 / 29)) * _WHITE_D65
+    linear = np.clip(xyz @ _XYZ_TO_SRGB.T, 0, 1)
+    c = np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return np.clip(np.round(c * 255), 0, 255).astype(np.uint8)
+
+
+def to_lab(rgb):
+    # Like srgb_to_lab, but each distinct color is only ever converted once
+    global _lab_cache
+    keys = pack_rgb(rgb)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    lab_keys, lab_values = _lab_cache
+    missing = unique[~np.isin(unique, lab_keys, assume_unique=True)]
+    if len(missing):
+        if len(lab_keys) + len(missing) > LAB_CACHE_LIMIT:
+            lab_keys, lab_values = lab_keys[:0], lab_values[:0]
+        rgb_missing = np.stack([missing >> 16, (missing >> 8) & 0xFF, missing & 0xFF], axis=-1)
+        merged = np.concatenate([lab_keys, missing])
+        order = np.argsort(merged, kind="stable")
+        lab_keys = merged[order]
+        lab_values = np.concatenate([lab_values, srgb_to_lab(rgb_missing)])[order]
+        _lab_cache = (lab_keys, lab_values)
+    return lab_values[np.searchsorted(lab_keys, unique)][inverse.reshape(keys.shape)]
+
+
+def clear_lab_cache():
+    global _lab_cache
+    _lab_cache = (np.empty(0, dtype=np.uint32), np.empty((0, 3)))
+
+
+def weighted_rgb_distance(rgb, old_rgb_values):
+    # "Redmean" weighting: green counts most, red and blue trade off with redness
+    rgb = np.asarray(rgb, dtype=np.float64)
+    old = np.asarray(old_rgb_values, dtype=np.float64)
+    mean_red = (rgb[..., 0] + old[0]) / 2
+    diff = rgb - old
+    weights = np.stack([2 + mean_red / 256, np.full_like(mean_red, 4.0), 2 + (255 - mean_red) / 256], axis=-1)
+    return np.sqrt((weights * diff * diff).sum(axis=-1))
+
+
+def delta_e76(lab1, lab2):
+    diff = np.asarray(lab1) - np.asarray(lab2)
+    return np.sqrt((diff * diff).sum(axis=-1))
+
+
+def delta_e2000(lab1, lab2):
+    # CIEDE2000 after Sharma, Wu and Dalal (2005), vectorized
+    lab1, lab2 = np.asarray(lab1, dtype=np.float64), np.asarray(lab2, dtype=np.float64)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_bar = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    g = 0.5 * (1 - np.sqrt(c_bar ** 7 / (c_bar ** 7 + 25.0 ** 7)))
+    a1p, a2p = (1 + g) * a1, (1 + g) * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+    chroma = c1p * c2p
+
+    dl = L2 - L1
+    dc = c2p - c1p
+    dh = h2p - h1p
+    dh = np.where(dh > 180, dh - 360, np.where(dh < -180, dh + 360, dh))
+    dh = np.where(chroma == 0, 0, dh)
+    dh_term = 2 * np.sqrt(chroma) * np.sin(np.radians(dh / 2))
+
+    l_bar = (L1 + L2) / 2
+    cp_bar = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_bar = np.where(np.abs(h1p - h2p) <= 180, h_sum / 2,
+                     np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2))
+    h_bar = np.where(chroma == 0, h_sum, h_bar)
+
+    t = (1 - 0.17 * np.cos(np.radians(h_bar - 30)) + 0.24 * np.cos(np.radians(2 * h_bar))
+         + 0.32 * np.cos(np.radians(3 * h_bar + 6)) - 0.20 * np.cos(np.radians(4 * h_bar - 63)))
+    d_theta = 30 * np.exp(-((h_bar - 275) / 25) ** 2)
+    r_c = 2 * np.sqrt(cp_bar ** 7 / (cp_bar ** 7 + 25.0 ** 7))
+    s_l = 1 + 0.015 * (l_bar - 50) ** 2 / np.sqrt(20 + (l_bar - 50) ** 2)
+    s_c = 1 + 0.045 * cp_bar
+    s_h = 1 + 0.015 * cp_bar * t
+    r_t = -np.sin(np.radians(2 * d_theta)) * r_c
+
+    l_term, c_term, h_term = dl / s_l, dc / s_c, dh_term / s_h
+    return np.sqrt(l_term ** 2 + c_term ** 2 + h_term ** 2 + r_t * c_term * h_term)
+
+
+def luma(rgb):
+    # Element-wise rather than a matmul, whose BLAS rounding depends on the
+    # number of rows; the selected color must give the same luma on its own
+    # as inside a palette
+    return (np.asarray(rgb, dtype=np.float64) * _LUMA).sum(axis=-1)
@@ -0,0 +1,43 @@
+import numpy as np
+
+from engine import color_distance, black_or_white
+
+
+def palette_counts(palette, index):
+    return np.bincount(index.ravel(), minlength=len(palette))
+
+
+class DistanceIndex:
+    # Palette rows sorted by their distance to one selected color, with running
+    # pixel counts. Raising the threshold only ever adds rows in this order, so
+    # any threshold is answered with a binary search.
+
+    def __init__(self, palette, counts, old_rgb_values, preserve, metric="rgb"):
+        self.palette = palette
+        self.old_rgb = tuple(old_rgb_values)
+        self.preserve = bool(preserve)
+        self.metric = metric
+
+        rgb = palette[:, :3]
+        distance = color_distance(rgb, self.old_rgb, metric)
+        if self.preserve:
+            exact = np.all(rgb == np.asarray(self.old_rgb), axis=-1)
+            distance[black_or_white(rgb) & ~exact] = np.inf
+
+        self.order = np.argsort(distance, kind="stable")
+        self.distances = distance[self.order]
+        self.cumulative_pixels = np.cumsum(np.asarray(counts)[self.order])
+
+    def matches(self, palette, old_rgb_values, preserve, metric="rgb"):
+        return (palette is self.palette and tuple(old_rgb_values) == self.old_rgb
+                and bool(preserve) == self.preserve and metric == self.metric)
+
+    def color_count(self, thresh):
+        return int(np.searchsorted(self.distances, thresh, side="right"))
+
+    def pixel_count(self, thresh):
+        n = self.color_count(thresh)
+        return int(self.cumulative_pixels[n - 1]) if n else 0
+
+    def rows(self, thresh):
+        return self.order[:self.color_count(thresh)]
@@ -0,0 +1,130 @@
+import numpy as np
+
+import colorspace
+
+# Channel limits used by the "Preserve B/W" toggle
+BLACK_MAX = 10
+WHITE_MIN = 245
+
+
+def color_distance(rgb, old_rgb_values, metric="rgb"):
+    if metric == "rgb":
+        diff = np.asarray(rgb, dtype=np.int32) - np.asarray(old_rgb_values, dtype=np.int32)
+        return np.sqrt((diff * diff).sum(axis=-1))
+    if metric == "weighted":
+        return colorspace.weighted_rgb_distance(rgb, old_rgb_values)
+    if metric == "de76":
+        return colorspace.delta_e76(colorspace.to_lab(rgb), colorspace.to_lab(old_rgb_values))
+    if metric == "de2000":
+        return colorspace.delta_e2000(colorspace.to_lab(rgb), colorspace.to_lab(old_rgb_values))
+    raise ValueError(f"unknown distance metric: {metric!r}")
+
+
+def black_or_white(rgb):
+    rgb = np.asarray(rgb)
+    return np.all(rgb <= BLACK_MAX, axis=-1) | np.all(rgb >= WHITE_MIN, axis=-1)
+
+
+def swap_masks(rgb, old_rgb_values, thresh, preserve, metric="rgb"):
+    exact = np.all(np.asarray(rgb) == np.asarray(old_rgb_values), axis=-1)
+    related = color_distance(rgb, old_rgb_values, metric) <= thresh
+
+    if preserve:
+        related &= ~black_or_white(rgb)
+
+    return exact, related & ~exact
+
+
+def adjust_brightness(rgb, new_rgb_values, old_rgb_values, brightness="average"):
+    if brightness == "luminance":
+        return adjust_luminance(rgb, new_rgb_values, old_rgb_values)
+    if brightness == "lightness":
+        return adjust_lightness(rgb, new_rgb_values, old_rgb_values)
+    if brightness != "average":
+        raise ValueError(f"unknown brightness mode: {brightness!r}")
+
+    # adjust lightness based on brightness ratio for the related color
+    old_r, old_g, old_b = old_rgb_values
+    brightness_old = (old_r + old_g + old_b) / 3
+    brightness_pixel = np.asarray(rgb, dtype=np.int32).sum(axis=-1) / 3
+    if brightness_old > 0:
+        brightness_ratio = brightness_pixel / brightness_old
+    else:
+        brightness_ratio = np.ones_like(brightness_pixel)
+
+    adjusted = np.asarray(new_rgb_values, dtype=np.float64) * brightness_ratio[..., None]
+    return np.clip(np.trunc(adjusted), 0, 255).astype(np.uint8)
+
+
+def adjust_luminance(rgb, new_rgb_values, old_rgb_values):
+    # Same ratio scaling, but weighing the channels the way the eye does
+    luma_old = float(colorspace.luma(old_rgb_values))
+    luma_pixel = colorspace.luma(rgb)
+    ratio = luma_pixel / luma_old if luma_old > 0 else np.ones_like(luma_pixel)
+    adjusted = np.asarray(new_rgb_values, dtype=np.float64) * ratio[..., None]
+    return np.clip(np.trunc(adjusted), 0, 255).astype(np.uint8)
+
+
+def adjust_lightness(rgb, new_rgb_values, old_rgb_values):
+    # Shift the new color's L* by how much lighter or darker the pixel is than
+    # the selected color, keeping the new color's a* and b*
+    shift = colorspace.to_lab(rgb)[..., 0] - colorspace.to_lab(old_rgb_values)[0]
+    lab = np.broadcast_to(colorspace.to_lab(new_rgb_values), shift.shape + (3,)).copy()
+    lab[..., 0] = np.clip(lab[..., 0] + shift, 0, 100)
+    return colorspace.lab_to_srgb(lab)
+
+
+def swap_rgb(rgb, new_rgb_values, old_rgb_values, thresh, preserve, metric="rgb", brightness="average"):
+    # Same rules as the original per-pixel loop, evaluated on a whole (..., 3) array
+    rgb = np.asarray(rgb, dtype=np.uint8)
+    exact, related = swap_masks(rgb, old_rgb_values, thresh, preserve, metric)
+    out = rgb.copy()
+
+    out[exact] = new_rgb_values
+    if related.any():
+        out[related] = adjust_brightness(rgb[related], new_rgb_values, old_rgb_values, brightness)
+
+    return out
+
+
+def swap_rgba(rgba, new_rgb_values, old_rgb_values, thresh, preserve, metric="rgb", brightness="average"):
+    out = np.array(rgba, dtype=np.uint8)
+    out[..., :3] = swap_rgb(out[..., :3], new_rgb_values, old_rgb_values, thresh, preserve, metric, brightness)
+    return out
+
+
+def index_colors(rgba):
+    # Reduce an RGBA image to its unique colors and a per-pixel index into them
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    packed = rgba.view(np.uint32).reshape(rgba.shape[:-1])
+    # Sorting plus a binary search is much cheaper than np.unique(return_inverse=True)
+    unique = np.unique(packed)
+    palette = unique.view(np.uint8).reshape(-1, 4).copy()
+    index_dtype = np.uint16 if len(unique) <= 0xFFFF else np.uint32
+    return palette, np.searchsorted(unique, packed).astype(index_dtype)
+
+
+def apply_palette(palette, index):
+    # Gathering whole 32-bit pixels is several times faster than gathering (N, 4) rows
+    packed = np.ascontiguousarray(palette, dtype=np.uint8).view(np.uint32).reshape(-1)
+    return packed[index].view(np.uint8).reshape(*np.shape(index), 4)
+
+
+def swap_indexed(palette, index, new_rgb_values, old_rgb_values, thresh, preserve, metric="rgb",
+                 brightness="average"):
+    # The index map never changes during a swap, only the palette entries do
+    new_palette = swap_rgba(palette, new_rgb_values, old_rgb_values, thresh, preserve, metric, brightness)
+    return new_palette, apply_palette(new_palette, index)
+
+
+def swap_rows(palette, rows, new_rgb_values, old_rgb_values, brightness="average"):
+    # Recolor palette rows already known to be affected, e.g. from a DistanceIndex.
+    # Exact matches come out as new_rgb_values since their brightness is unchanged.
+    new_palette = np.array(palette, dtype=np.uint8)
+    rows = np.asarray(rows)
+    exact = np.all(new_palette[rows, :3] == np.asarray(old_rgb_values[:3]), axis=-1)
+    new_palette[rows, :3] = adjust_brightness(new_palette[rows, :3], new_rgb_values, old_rgb_values,
+                                              brightness)
+    # Set explicitly, as swap_rgb does, rather than trusting the ratio to round back
+    new_palette[rows[exact], :3] = new_rgb_values
+    return new_palette
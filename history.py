@@ -0,0 +1,95 @@
+from collections import deque, namedtuple
+
+import numpy as np
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# Only the palette rows a swap touched are kept, plus whatever the caller
+# needs to replay it (e.g. the recipe steps it added). Region swaps may also
+# append palette rows and repoint pixels, which is kept in the same way.
+PaletteDelta = namedtuple("PaletteDelta", ["rows", "before", "after", "data", "size", "added", "index"],
+                          defaults=(None, None, None))
+IndexDelta = namedtuple("IndexDelta", ["pixels", "before", "after", "dtype"])
+
+
+def palette_delta(before, after, data=None):
+    size = len(before)
+    rows = np.flatnonzero(np.any(before != after[:size], axis=-1))
+    added = after[size:].copy() if len(after) > size else None
+    return PaletteDelta(rows, before[rows].copy(), after[rows].copy(), data, size, added)
+
+
+def index_delta(before, after):
+    pixels = np.flatnonzero(before != after)
+    return IndexDelta(pixels, before.ravel()[pixels], after.ravel()[pixels], before.dtype)
+
+
+def delta_nbytes(delta):
+    nbytes = delta.rows.nbytes + delta.before.nbytes + delta.after.nbytes
+    if delta.added is not None:
+        nbytes += delta.added.nbytes
+    if delta.index is not None:
+        nbytes += delta.index.pixels.nbytes + delta.index.before.nbytes + delta.index.after.nbytes
+    return nbytes
+
+
+class SwapHistory:
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BUDGET):
+        self.max_bytes = max_bytes
+        self.undo_entries = deque()
+        self.redo_entries = []
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.undo_entries)
+
+    def can_undo(self):
+        return bool(self.undo_entries)
+
+    def can_redo(self):
+        return bool(self.redo_entries)
+
+    def clear(self):
+        self.undo_entries.clear()
+        self.redo_entries.clear()
+        self.nbytes = 0
+
+    def record(self, before, after, data=None, index_before=None, index_after=None):
+        delta = palette_delta(before, after, data)
+        if index_after is not None and index_after is not index_before:
+            delta = delta._replace(index=index_delta(index_before, index_after))
+        self.redo_entries.clear()
+        self._push(delta)
+        return delta
+
+    def undo(self, palette, index=None):
+        # Returns (palette, index, data); index is only copied if the step changed it
+        delta = self.undo_entries.pop()
+        self.nbytes -= delta_nbytes(delta)
+        self.redo_entries.append(delta)
+        palette = palette[:delta.size].copy()
+        palette[delta.rows] = delta.before
+        if delta.index is not None:
+            index = index.astype(delta.index.dtype)
+            index.ravel()[delta.index.pixels] = delta.index.before
+        return palette, index, delta.data
+
+    def redo(self, palette, index=None):
+        delta = self.redo_entries.pop()
+        self._push(delta)
+        palette = palette.copy()
+        palette[delta.rows] = delta.after
+        if delta.added is not None:
+            palette = np.concatenate([palette, delta.added])
+        if delta.index is not None:
+            index = index.astype(np.result_type(index.dtype, delta.index.after.dtype))
+            index.ravel()[delta.index.pixels] = delta.index.after
+        return palette, index, delta.data
+
+    def _push(self, delta):
+        self.undo_entries.append(delta)
+        self.nbytes += delta_nbytes(delta)
+        # Drop the oldest steps once over budget, but always keep the newest one
+        while self.nbytes > self.max_bytes and len(self.undo_entries) > 1:
+            self.nbytes -= delta_nbytes(self.undo_entries.popleft())
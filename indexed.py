@@ -0,0 +1,92 @@
+import hashlib
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from animation import PNG_SIGNATURE, png_chunk
+
+INDEXED_EXTENSIONS = (".png", ".gif")
+MAX_PALETTE = 256
+
+
+def read_indexed(im):
+    # (RGBA palette, index map) of a "P" image, with its transparency folded
+    # into the palette alpha; None for images without a palette
+    if im.mode != "P":
+        return None
+    index = np.asarray(im)
+    rgb = np.frombuffer(bytes(im.getpalette("RGB") or b""), dtype=np.uint8).reshape(-1, 3)
+    size = max(len(rgb), int(index.max(initial=0)) + 1)
+    palette = np.zeros((size, 4), dtype=np.uint8)
+    palette[:len(rgb), :3] = rgb
+    palette[:, 3] = 255
+
+    transparency = im.info.get("transparency")
+    if isinstance(transparency, int):
+        if transparency < size:
+            palette[transparency, 3] = 0
+    elif transparency is not None:
+        alpha = np.frombuffer(bytes(transparency), dtype=np.uint8)[:size]
+        palette[:len(alpha), 3] = alpha
+    return palette, index
+
+
+def load_indexed(path):
+    with Image.open(path) as im:
+        return read_indexed(im)
+
+
+def indexed_digest(palette, index):
+    digest = hashlib.blake2b(np.ascontiguousarray(palette, dtype=np.uint8).data, digest_size=16)
+    digest.update(np.ascontiguousarray(index).data)
+    digest.update(repr((palette.shape, index.shape, index.dtype.str)).encode())
+    return digest.hexdigest()
+
+
+def can_write_indexed(path, palette):
+    if not path.lower().endswith(INDEXED_EXTENSIONS) or len(palette) > MAX_PALETTE:
+        return False
+    if path.lower().endswith(".gif"):
+        # GIF has one fully transparent index and no partial alpha
+        alpha = palette[:, 3]
+        return np.isin(alpha, (0, 255)).all() and np.count_nonzero(alpha == 0) <= 1
+    return True
+
+
+def write_indexed(path, palette, index):
+    im = Image.fromarray(np.asarray(index, dtype=np.uint8))
+    im.putpalette(np.ascontiguousarray(palette[:, :3]).tobytes(), "RGB")
+    params = {}
+    transparent = np.flatnonzero(palette[:, 3] < 255)
+    if path.lower().endswith(".gif"):
+        params["optimize"] = False
+        if len(transparent):
+            params["transparency"] = int(transparent[0])
+    elif len(transparent):
+        # tRNS only needs to reach the last non-opaque entry
+        params["transparency"] = palette[:transparent[-1] + 1, 3].tobytes()
+    im.save(path, **params)
+
+
+def index_idat(index):
+    # Compressed image data of an 8-bit indexed PNG. It depends only on the
+    # index map, so it can be shared by any number of palettes.
+    index = np.ascontiguousarray(index, dtype=np.uint8)
+    rows = np.zeros((index.shape[0], index.shape[1] + 1), dtype=np.uint8)
+    rows[:, 1:] = index
+    return zlib.compress(rows.tobytes(), 6)
+
+
+def write_palette_png(path, palette, idat, size):
+    width, height = size
+    with open(path, "wb") as fp:
+        fp.write(PNG_SIGNATURE)
+        fp.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 3, 0, 0, 0)))
+        fp.write(png_chunk(b"PLTE", np.ascontiguousarray(palette[:, :3]).tobytes()))
+        transparent = np.flatnonzero(palette[:, 3] < 255)
+        if len(transparent):
+            fp.write(png_chunk(b"tRNS", palette[:transparent[-1] + 1, 3].tobytes()))
+        fp.write(png_chunk(b"IDAT", idat))
+        fp.write(png_chunk(b"IEND", b""))
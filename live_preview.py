@@ -0,0 +1,63 @@
+import queue
+import threading
+
+
+class PreviewWorker:
+    # Runs preview renders on one background thread. Every submit() supersedes
+    # the jobs before it, so only the newest result is ever handed back.
+
+    def __init__(self):
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        self.jobs.put((generation, fn, args))
+        return generation
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+
+    def is_stale(self, generation):
+        return generation != self.generation
+
+    def poll(self):
+        # Called from the Tk loop; returns the newest live result or None
+        latest = None
+        while True:
+            try:
+                generation, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if not self.is_stale(generation):
+                latest = result
+        if isinstance(latest, Exception):
+            raise latest
+        return latest
+
+    def stop(self):
+        self.cancel()
+        self.jobs.put((None, None, ()))
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            generation, fn, args = self.jobs.get()
+            if fn is None:
+                break
+            # Skip jobs that were replaced while waiting in the queue
+            if self.is_stale(generation) or not self.jobs.empty():
+                continue
+            try:
+                result = fn(*args)
+            except Exception as exc:
+                result = exc
+            if not self.is_stale(generation):
+                self.results.put((generation, result))
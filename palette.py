@@ -0,0 +1,94 @@
+import hashlib
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+
+from region import merge_runs
+
+HISTOGRAM_CACHE_SIZE = 8
+
+_histogram_cache = OrderedDict()
+
+
+def image_digest(rgba):
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    digest = hashlib.blake2b(rgba.data, digest_size=16)
+    digest.update(repr(rgba.shape).encode())
+    return digest.hexdigest()
+
+
+def color_histogram(rgba, use_cache=True):
+    # Every distinct RGBA color and its pixel count, most frequent first
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    key = image_digest(rgba) if use_cache else None
+    if key in _histogram_cache:
+        _histogram_cache.move_to_end(key)
+        return _histogram_cache[key]
+
+    packed = rgba.view(np.uint32).reshape(-1)
+    unique, counts = np.unique(packed, return_counts=True)
+    colors = unique.view(np.uint8).reshape(-1, 4)
+    # Most frequent first; ties go to the larger color, like sorting getcolors() in reverse
+    order = np.lexsort((-colors[:, 3].astype(np.int16), -colors[:, 2].astype(np.int16),
+                        -colors[:, 1].astype(np.int16), -colors[:, 0].astype(np.int16), -counts))
+    histogram = (colors[order].copy(), counts[order])
+
+    if key is not None:
+        _histogram_cache[key] = histogram
+        if len(_histogram_cache) > HISTOGRAM_CACHE_SIZE:
+            _histogram_cache.popitem(last=False)
+    return histogram
+
+
+def clear_histogram_cache():
+    _histogram_cache.clear()
+
+
+def cluster_swatches(colors, counts, max_swatches=10, merge_distance=0):
+    # Group similar shades into one swatch, represented by the most frequent
+    # color of the group. Colors are first bucketed on a grid of
+    # merge_distance; neighbouring cells are then joined whenever their most
+    # frequent colors are within merge_distance, so shades on either side of
+    # a cell boundary still end up together. Joins chain, like single-linkage
+    # clustering.
+    colors = np.asarray(colors, dtype=np.uint8)
+    counts = np.asarray(counts)
+    if merge_distance <= 1 or len(colors) == 0:
+        return colors[:max_swatches], counts[:max_swatches]
+
+    cells = colors.astype(np.int32) // int(merge_distance)
+    cells, first, group = np.unique(cells, axis=0, return_index=True, return_inverse=True)
+    group = group.reshape(-1)
+    # colors are sorted by count, so the first member of each cell is its most frequent color
+    representatives = colors[first].astype(np.int32)
+
+    # np.unique sorts cells lexicographically, so packed keys come out sorted too
+    keys = cell_keys(cells)
+    pairs_a, pairs_b = [], []
+    for offset in itertools.product((-1, 0, 1), repeat=4):
+        if not any(offset):
+            continue
+        neighbour = cell_keys(cells + np.asarray(offset))
+        pos = np.minimum(np.searchsorted(keys, neighbour), len(keys) - 1)
+        found = np.flatnonzero(keys[pos] == neighbour)
+        diff = representatives[found] - representatives[pos[found]]
+        close = (diff * diff).sum(axis=-1) <= merge_distance * merge_distance
+        pairs_a.append(found[close])
+        pairs_b.append(pos[found[close]])
+    root = merge_runs(len(cells), np.concatenate(pairs_a), np.concatenate(pairs_b))
+
+    # Each group shows the most frequent color of all its cells
+    shown = np.full(len(cells), len(colors))
+    np.minimum.at(shown, root, first)
+    group_counts = np.bincount(root[group], weights=counts, minlength=len(cells)).astype(counts.dtype)
+    roots = np.flatnonzero(root == np.arange(len(cells)))
+    order = roots[np.argsort(-group_counts[roots], kind="stable")][:max_swatches]
+    return colors[shown[order]], group_counts[order]
+
+
+def cell_keys(cells):
+    # One integer per grid cell, in the same order as the cells themselves;
+    # the +1 leaves room for neighbours at -1
+    cells = np.asarray(cells, dtype=np.int64) + 1
+    return ((cells[..., 0] * 258 + cells[..., 1]) * 258 + cells[..., 2]) * 258 + cells[..., 3]
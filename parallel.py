@@ -0,0 +1,69 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from recipe import Recipe
+from streaming import iter_strips
+
+# Below this, starting worker processes costs more than the swap itself
+PARALLEL_MIN_PIXELS = 4 * 1024 * 1024
+BANDS_PER_WORKER = 2
+
+
+def _attach(name):
+    # The parent owns the block; workers must not unlink it on exit
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _swap_band(name, shape, top, bottom, recipe):
+    # Recolors rows [top, bottom) of the shared image in place. Every color is
+    # mapped on its own, so bands give the same result as the whole image.
+    block = _attach(name)
+    try:
+        rgba = np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+        rgba[top:bottom] = recipe.apply(rgba[top:bottom])
+        del rgba
+    finally:
+        block.close()
+    return bottom - top
+
+
+def band_rows(height, bands):
+    return max(1, -(-height // bands))
+
+
+def parallel_swap(rgba, recipe, workers=None, min_pixels=PARALLEL_MIN_PIXELS):
+    # Applies a recipe to one image with row bands spread over worker
+    # processes, which all read and write a single shared-memory copy
+    rgba = np.asarray(rgba, dtype=np.uint8)
+    workers = workers or os.cpu_count() or 1
+    height = rgba.shape[0]
+    if workers <= 1 or rgba.shape[0] * rgba.shape[1] < min_pixels or height < 2:
+        return recipe.apply(rgba)
+
+    block = shared_memory.SharedMemory(create=True, size=rgba.nbytes)
+    try:
+        shared = np.ndarray(rgba.shape, dtype=np.uint8, buffer=block.buf)
+        shared[...] = rgba
+        rows = band_rows(height, workers * BANDS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_swap_band, block.name, rgba.shape, top, bottom, recipe)
+                       for top, bottom in iter_strips(height, rows)]
+            for future in futures:
+                future.result()
+        result = shared.copy()
+        del shared
+    finally:
+        block.close()
+        block.unlink()
+    return result
+
+
+def parallel_color_change(rgba, new_rgb_values, old_rgb_values, thresh, preserve, workers=None,
+                          min_pixels=PARALLEL_MIN_PIXELS):
+    return parallel_swap(rgba, Recipe([(old_rgb_values, new_rgb_values, thresh, preserve)]), workers, min_pixels)
@@ -0,0 +1,139 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_DISABLED = nullcontext()
+
+try:
+    _PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+except (AttributeError, ValueError, OSError):
+    _PAGE_KB = 4
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def current_rss_kb():
+    # Resident set size right now; only Linux exposes it without extra packages
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident * _PAGE_KB
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "pixels", "start", "rss")
+
+    def __init__(self, profiler, name, pixels):
+        self.profiler = profiler
+        self.name = name
+        self.pixels = pixels
+
+    def __enter__(self):
+        self.rss = current_rss_kb()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        # How much the process grew (or shrank) during the stage; other
+        # threads' allocations count too
+        rss = current_rss_kb()
+        rss_delta = None if rss is None or self.rss is None else rss - self.rss
+        self.profiler.events.append({
+            "name": self.name,
+            "start": self.start,
+            "duration": end - self.start,
+            "pixels": self.pixels,
+            "rss_delta_kb": rss_delta,
+            "peak_rss_kb": peak_rss_kb(),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        })
+        return False
+
+
+class Profiler:
+    # Off by default: stage() then hands back a shared no-op context manager
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.events = []
+
+    def stage(self, name, pixels=None):
+        if not self.enabled:
+            return _DISABLED
+        return _Stage(self, name, pixels)
+
+    def reset(self):
+        self.events = []
+
+    def drain(self):
+        events, self.events = self.events, []
+        return events
+
+    def summary(self):
+        stages = {}
+        for event in self.events:
+            stats = stages.setdefault(event["name"], {"calls": 0, "total": 0.0, "max": 0.0, "pixels": 0,
+                                                      "max_rss_delta_kb": None})
+            stats["calls"] += 1
+            stats["total"] += event["duration"]
+            stats["max"] = max(stats["max"], event["duration"])
+            stats["pixels"] += event["pixels"] or 0
+            if event.get("rss_delta_kb") is not None:
+                stats["max_rss_delta_kb"] = max(stats["max_rss_delta_kb"] or 0, event["rss_delta_kb"])
+        for stats in stages.values():
+            stats["mean"] = stats["total"] / stats["calls"]
+        return stages
+
+    def format_summary(self):
+        # "RSS +MB" is the most the process grew during one call of the stage
+        lines = [f"{'stage':<16}{'calls':>6}{'total ms':>11}{'mean ms':>10}{'max ms':>10}{'Mpx':>8}{'RSS +MB':>9}"]
+        for name, stats in sorted(self.summary().items(), key=lambda item: -item[1]["total"]):
+            grown = stats["max_rss_delta_kb"]
+            grown = "-" if grown is None else f"{grown / 1024:.1f}"
+            lines.append(f"{name:<16}{stats['calls']:>6}{stats['total'] * 1000:>11.2f}"
+                         f"{stats['mean'] * 1000:>10.2f}{stats['max'] * 1000:>10.2f}{stats['pixels'] / 1e6:>8.2f}"
+                         f"{grown:>9}")
+        peaks = [e["peak_rss_kb"] for e in self.events if e["peak_rss_kb"] is not None]
+        if peaks:
+            lines.append(f"peak RSS of the process: {max(peaks) / 1024:.1f} MB")
+        return "\n".join(lines)
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "events": self.events}, f, indent=2)
+
+    def export_trace(self, path):
+        # Chrome trace-event format, viewable in chrome://tracing or Perfetto
+        origin = min((e["start"] for e in self.events), default=0)
+        events = [{
+            "name": e["name"], "ph": "X", "ts": (e["start"] - origin) * 1e6, "dur": e["duration"] * 1e6,
+            "pid": e["pid"], "tid": e["tid"],
+            "args": {"pixels": e["pixels"], "rss_delta_kb": e.get("rss_delta_kb"), "peak_rss_kb": e["peak_rss_kb"]},
+        } for e in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+profiler = Profiler()
+
+
+def stage(name, pixels=None):
+    return profiler.stage(name, pixels)
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from palette import image_digest
+
+PREVIEW_BOX = 250
+ZOOM_CACHE_SIZE = 3
+FRAME_CACHE_SIZE = 32
+
+
+def fit_zoom(size, box=PREVIEW_BOX):
+    # (up, down): repeat every pixel `up` times after keeping every `down`th one
+    longest = max(size)
+    if longest <= box:
+        return box // longest, 1
+    return 1, -(-longest // box)
+
+
+def zoom_levels(size, box=PREVIEW_BOX):
+    # Every integer zoom that still fits the box, smallest first
+    up, down = fit_zoom(size, box)
+    return [(n, 1) for n in range(1, up + 1)] if down == 1 else [(1, down)]
+
+
+def zoom_label(zoom):
+    up, down = zoom
+    return f"{up}x" if down == 1 else f"1/{down}x"
+
+
+def zoom_array(array, zoom):
+    # Nearest-neighbour scaling of the first two axes
+    up, down = zoom
+    array = array[::down, ::down]
+    if up > 1:
+        array = np.repeat(np.repeat(array, up, axis=0), up, axis=1)
+    return array
+
+
+def changed_box(mask):
+    # (left, top, right, bottom) around the True pixels, or None
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+class PreviewRenderer:
+    # Renders palette states of one index map at integer zoom. Zoomed index
+    # maps and rendered frames are cached, so returning to an earlier palette
+    # (undo, redo) costs a lookup, and a new palette only re-renders the
+    # pixels whose palette rows changed.
+
+    def __init__(self, index, box=PREVIEW_BOX):
+        self.index = index
+        self.size = (index.shape[1], index.shape[0])
+        self.box = box
+        self.zoom = fit_zoom(self.size, box)
+        self.zoomed = OrderedDict()
+        self.frames = OrderedDict()
+        self.palette = None
+        self.frame = None
+
+    def set_index(self, index):
+        # A region swap or its undo repointed pixels; cached renders no longer apply
+        if index is self.index:
+            return
+        size = (index.shape[1], index.shape[0])
+        if size != self.size:
+            self.size = size
+            self.zoom = fit_zoom(size, self.box)
+        self.index = index
+        self.zoomed.clear()
+        self.frames.clear()
+        self.invalidate()
+
+    def invalidate(self):
+        # The next update redraws everything, e.g. after showing an outside frame
+        self.palette = self.frame = None
+
+    def set_zoom(self, zoom):
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.invalidate()
+
+    def zoomed_index(self):
+        if self.zoom in self.zoomed:
+            self.zoomed.move_to_end(self.zoom)
+        else:
+            self.zoomed[self.zoom] = zoom_array(self.index, self.zoom)
+            if len(self.zoomed) > ZOOM_CACHE_SIZE:
+                self.zoomed.popitem(last=False)
+        return self.zoomed[self.zoom]
+
+    def update(self, palette):
+        # Returns (frame, box): box is the (left, top, right, bottom) region
+        # that differs from the previous frame, or None if nothing changed
+        index = self.zoomed_index()
+        height, width = index.shape
+        full = (0, 0, width, height)
+
+        if self.frame is None or len(palette) != len(self.palette):
+            box = full
+        else:
+            changed = (palette != self.palette).any(axis=1)
+            box = changed_box(changed[index]) if changed.any() else None
+
+        key = (image_digest(palette), self.zoom)
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+        elif box == full:
+            frame = palette[index]
+        else:
+            frame = self.frame.copy()
+            if box is not None:
+                left, top, right, bottom = box
+                frame[top:bottom, left:right] = palette[index[top:bottom, left:right]]
+
+        self.frames[key] = frame
+        if len(self.frames) > FRAME_CACHE_SIZE:
+            self.frames.popitem(last=False)
+        self.palette, self.frame = palette, frame
+        return frame, box
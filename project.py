@@ -2,82 +2,121 @@ import tkinter as tk
 from tkinter import filedialog, colorchooser, messagebox
 from PIL import Image, ImageTk
 
-# Global variables for application and image states
+from session import SwapSession, color_change as session_color_change
+from engine import swap_rows
+from recipe import Recipe
+from live_preview import PreviewWorker
+from palette import color_histogram, cluster_swatches
+from preview import PreviewRenderer, zoom_array, zoom_levels, zoom_label
+from region import swap_region
+from colorspace import METRICS, BRIGHTNESS_MODES
+import perf
+from perf import stage
+
+# Global variables for the window; the sprite itself lives in the session
+session = None
 selected_color = None
 new_rgb = None
-original_pil = None
-modified_pil = None
+preview_renderer = None
+region_seed = None
 unique_colors = []
-undo_stack = []
 original_img = None
 modified_img = None
 selected_from_latest = False
 threshold = None
 preserve_bw = None
+group_shades = None
+region_mode = None
+connectivity = None
+distance_metric = "rgb"
+brightness_mode = "average"
 original_canvas = None
 modified_canvas = None
 original_color_frame = None
 latest_color_frame = None
 status_label = None
+threshold_info_label = None
+zoom_info_label = None
+perf_toggle = None
+perf_panel = None
+perf_text = None
+perf_enabled = None
+perf_panel_visible = False
+preview_worker = None
+preview_pending = False
+
+PREVIEW_POLL_MS = 30
+MAX_SWATCHES = 10
+SHADE_MERGE_DISTANCE = 24
+PERF_REFRESH_MS = 500
 
 
 def load_image(path):
-    global original_img, modified_img, original_pil, modified_pil
-    global original_canvas, modified_canvas
+    global session, preview_renderer, region_seed
 
-    original_pil = Image.open(path).convert("RGBA")
-    modified_pil = original_pil.copy()
-
-    display_size = (250, 250)
-    original_img = ImageTk.PhotoImage(original_pil.resize(display_size, Image.LANCZOS))
-    modified_img = ImageTk.PhotoImage(modified_pil.resize(display_size, Image.LANCZOS))
-    original_canvas.config(image=original_img)
-    modified_canvas.config(image=modified_img)
-    extract_and_show_colors(original_pil)
+    stop_preview()
+    region_seed = None
+    session = SwapSession.open(path)
+    preview_renderer = PreviewRenderer(session.index)
+    zoom_info_label.config(text=zoom_label(preview_renderer.zoom))
+    show_original_preview()
+    refresh_modified_preview()
+    extract_and_show_colors(session.original)
+    update_threshold_info()
 
 
 def upload_image():
-    file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.bmp")])
+    file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.png *.jpg *.bmp *.gif")])
     if file_path:
         load_image(file_path)
 
 
-def extract_and_show_colors(pil_img):
+def extract_and_show_colors(rgba):
     global unique_colors, original_color_frame, latest_color_frame
-    
+
     # Clear previous color swatches
     for widget in original_color_frame.winfo_children():
         widget.destroy()
     for widget in latest_color_frame.winfo_children():
         widget.destroy()
-        
+
     # Extract colors
-    colors = pil_img.getcolors(maxcolors=16)
-    if colors:
-        colors.sort(reverse=True)
-        unique_colors = [color for count, color in colors if len(color) >= 3][:10]
-        
+    with stage("extract_palette", rgba.shape[0] * rgba.shape[1]):
+        colors, counts = color_histogram(rgba)
+    if len(colors):
+        merge_distance = SHADE_MERGE_DISTANCE if group_shades.get() else 0
+        swatches, _ = cluster_swatches(colors, counts, MAX_SWATCHES, merge_distance)
+        unique_colors = [tuple(int(v) for v in color) for color in swatches]
+
         # Display original colors
         for idx, color in enumerate(unique_colors):
             r, g, b, *_ = color
-            color_frame = tk.Frame(original_color_frame, width=30, height=30, bg=f'#{r:02x}{g:02x}{b:02x}', 
+            color_frame = tk.Frame(original_color_frame, width=30, height=30, bg=f'#{r:02x}{g:02x}{b:02x}',
                                   relief="raised", bd=1)
             color_frame.color_value = color
             color_frame.pack(side="left", padx=5)
             color_frame.bind("<Button-1>", lambda e, c=color: select_color(c, False))
-            
-            color_frame_latest = tk.Frame(latest_color_frame, width=30, height=30, bg=f'#{r:02x}{g:02x}{b:02x}', 
+
+            color_frame_latest = tk.Frame(latest_color_frame, width=30, height=30, bg=f'#{r:02x}{g:02x}{b:02x}',
                                         relief="raised", bd=1)
             color_frame_latest.color_value = color
             color_frame_latest.pack(side="left", padx=5)
             color_frame_latest.bind("<Button-1>", lambda e, c=color: select_color(c, True))
 
+def regroup_swatches():
+    if session is not None:
+        extract_and_show_colors(session.rgba())
+
+
 def select_color(c, from_latest=False):
-    global selected_color, selected_from_latest
+    global selected_color, selected_from_latest, region_seed
     selected_color = c
     selected_from_latest = from_latest
+    region_seed = None
+    cancel_preview()
     highlight_selected_swatch(c, from_latest)
     update_status_label()
+    update_threshold_info()
 
 
 def highlight_selected_swatch(color, from_latest=False):
@@ -90,66 +129,171 @@ def highlight_selected_swatch(color, from_latest=False):
 
 
 def pick_new_color():
-    global new_rgb, selected_color
+    global new_rgb, selected_color, preview_pending
     if selected_color is None:
         messagebox.showinfo("Select Color", "Please select a color to change on the sprite.")
         return
     color = colorchooser.askcolor(title="Choose New Color")
     if color[0]:
         new_rgb = tuple(int(x) for x in color[0])
-        apply_color_swap()
+        # Nothing is committed until Apply Swap; the slider re-renders this preview
+        preview_pending = True
+        schedule_preview()
+        status_label.config(text="Previewing swap. Adjust the gradient sensitivity, then click Apply Swap to keep it.")
+
+
+def toggle_region_mode():
+    global region_seed
+    region_seed = None
+    cancel_preview()
+    if region_mode.get():
+        status_label.config(text="Region mode: click the edited sprite to pick the area to recolor.")
+    else:
+        update_status_label()
 
 
-def color_change(img, pixels, new_rgb_values, old_rgb_values):
-    global threshold, preserve_bw
+def preview_to_image(event):
+    # Pixel of the sprite under a click on the edited preview, or None
+    renderer = get_preview_renderer()
+    (width, height), (up, down) = renderer.size, renderer.zoom
+    shown_width, shown_height = -(-width // down) * up, -(-height // down) * up
+    left = (event.widget.winfo_width() - shown_width) // 2
+    top = (event.widget.winfo_height() - shown_height) // 2
+    x, y = (event.x - left) // up * down, (event.y - top) // up * down
+    if 0 <= x < width and 0 <= y < height:
+        return x, y
+    return None
+
+
+def select_region(event):
+    global region_seed, preview_pending
+    if session is None or not region_mode.get():
+        return
+    point = preview_to_image(event)
+    if point is None:
+        return
+    x, y = point
+    color = session.color_at(x, y)
+    select_color(color, True)
+    region_seed = point
+    status_label.config(text=f"Region at ({x}, {y}) selected: RGB{color[:3]}. Pick a new color, then Apply Swap.")
+    if new_rgb is not None:
+        preview_pending = True
+        schedule_preview()
+
+
+def swap_preview_region(palette, index, region_labels, rows, connectivity, seed, new_rgb_values, old_rgb_values, zoom,
+                        brightness="average"):
+    # Labelling a large sprite can take seconds, so it runs here on the preview
+    # worker too; the session's label cache is shared and locked
+    with stage("live_preview", index.size):
+        labels = region_labels.labels(index, rows, connectivity)
+        x, y = seed
+        palette, index = swap_region(palette, index, labels == labels[y, x], new_rgb_values, old_rgb_values,
+                                     brightness)
+        return palette[zoom_array(index, zoom)]
+
+
+def swap_preview_palette(palette, rows, new_rgb_values, old_rgb_values, brightness="average"):
+    with stage("live_preview", len(rows)):
+        return swap_rows(palette, rows, new_rgb_values, old_rgb_values, brightness)
+
+
+def schedule_preview(*_):
+    if not preview_pending or selected_color is None or new_rgb is None or session is None:
+        return
+    old_rgb = tuple(selected_color[:3])
+    rows = get_distance_index(old_rgb).rows(threshold.get())
+    if region_seed is not None:
+        preview_worker.submit(swap_preview_region, session.palette, session.index, session.region_labels, rows,
+                              connectivity.get(), region_seed, new_rgb, old_rgb, get_preview_renderer().zoom,
+                              brightness_mode)
+        return
+    preview_worker.submit(swap_preview_palette, session.palette, rows, new_rgb, old_rgb, brightness_mode)
+
+
+def set_distance_metric(label):
+    global distance_metric
+    distance_metric = dict((name, key) for key, name in METRICS)[label]
+    on_threshold_change()
 
-    width, height = img.size
-    old_r, old_g, old_b = old_rgb_values
-    new_r, new_g, new_b = new_rgb_values
+
+def set_brightness_mode(label):
+    global brightness_mode
+    brightness_mode = dict((name, key) for key, name in BRIGHTNESS_MODES)[label]
+    schedule_preview()
+
+
+def on_threshold_change(*_):
+    update_threshold_info()
+    schedule_preview()
+
+
+def update_threshold_info():
+    if selected_color is None or session is None:
+        threshold_info_label.config(text="")
+        return
     thresh = threshold.get()
-    preserve = preserve_bw.get()
+    index = get_distance_index(selected_color[:3])
+    threshold_info_label.config(text=f"Affects {index.color_count(thresh)} colors, {index.pixel_count(thresh)} px")
+
+
+def poll_preview():
+    # Always rescheduled, so one failed render doesn't end live preview
+    try:
+        preview = preview_worker.poll()
+        if preview is not None and preview_pending:
+            # Region previews come back as finished frames, global ones as a palette
+            if preview.ndim == 3:
+                get_preview_renderer().invalidate()
+                show_preview_frame(preview)
+            else:
+                show_modified_preview(preview)
+    except Exception as exc:
+        status_label.config(text=f"Preview failed: {exc}")
+    finally:
+        modified_canvas.after(PREVIEW_POLL_MS, poll_preview)
+
+
+def stop_preview():
+    global preview_pending
+    was_pending = preview_pending
+    if preview_pending:
+        preview_pending = False
+        preview_worker.cancel()
+    return was_pending
 
-    for x in range(width):
-        for y in range(height):
-            r, g, b, a = pixels[x, y]
 
-            if (r, g, b) == old_rgb_values:
-                pixels[x, y] = (*new_rgb_values, a)
-                continue
+def cancel_preview():
+    if stop_preview():
+        refresh_modified_preview()
 
-            if preserve:
-                is_black = r <= 10 and g <= 10 and b <= 10
-                is_white = r >= 245 and g >= 245 and b >= 245
-                if is_black or is_white:
-                    continue
 
-            distance = ((r - old_r)**2 + (g - old_g)**2 + (b - old_b)**2)**0.5
-            # adjust lightness based on brightness ratio for the related color
-            if distance <= thresh:
-                brightness_old = (old_r + old_g + old_b) / 3
-                brightness_pixel = (r + g + b) / 3
-                brightness_ratio = brightness_pixel / brightness_old if brightness_old > 0 else 1
+def color_change(img, pixels, new_rgb_values, old_rgb_values):
+    # Kept for callers of the old API: swaps img in place with the current GUI settings
+    swapped = session_color_change(img, new_rgb_values, old_rgb_values, threshold.get(), preserve_bw.get(),
+                                   distance_metric, brightness_mode)
+    img.paste(swapped)
 
-                adjusted_r = min(255, max(0, int(new_r * brightness_ratio)))
-                adjusted_g = min(255, max(0, int(new_g * brightness_ratio)))
-                adjusted_b = min(255, max(0, int(new_b * brightness_ratio)))
 
-                pixels[x, y] = (adjusted_r, adjusted_g, adjusted_b, a)
+def get_distance_index(old_rgb_values):
+    return session.distance_index(old_rgb_values, preserve_bw.get(), distance_metric)
 
 
 def apply_color_swap():
-    global modified_img, modified_pil, selected_color, new_rgb, selected_from_latest
+    global selected_color, new_rgb, selected_from_latest, region_seed
     if selected_color is None or new_rgb is None:
         messagebox.showwarning("Missing", "Select a base color and new color first.")
         return
 
-    undo_stack.append(modified_pil.copy())
-    pixels = modified_pil.load()
-    color_change(modified_pil, pixels, new_rgb, selected_color[:3])
+    stop_preview()
+    # Region swaps depend on where the sprite was clicked, so the session keeps them out of the recipe
+    session.swap(new_rgb, selected_color, threshold.get(), preserve_bw.get(), distance_metric, brightness_mode,
+                 region_seed, connectivity.get())
+    region_seed = None
 
-    display_size = (250, 250)
-    modified_img = ImageTk.PhotoImage(modified_pil.resize(display_size, Image.LANCZOS))
-    modified_canvas.config(image=modified_img)
+    refresh_modified_preview()
+    update_threshold_info()
 
     old_color = selected_color
     new_color_with_alpha = (*new_rgb, selected_color[3] if len(selected_color) > 3 else 255)
@@ -161,6 +305,135 @@ def apply_color_swap():
             break
 
 
+def get_preview_renderer():
+    global preview_renderer
+    if preview_renderer is None:
+        preview_renderer = PreviewRenderer(session.index)
+    preview_renderer.set_index(session.index)
+    return preview_renderer
+
+
+def show_original_preview():
+    global original_img
+    zoom = get_preview_renderer().zoom
+    with stage("preview", session.original.shape[0] * session.original.shape[1]):
+        original_img = ImageTk.PhotoImage(Image.fromarray(zoom_array(session.original, zoom)))
+    original_canvas.config(image=original_img)
+
+
+def show_preview_frame(frame):
+    global modified_img
+    modified_img = ImageTk.PhotoImage(Image.fromarray(frame))
+    modified_canvas.config(image=modified_img)
+
+
+def show_modified_preview(palette):
+    renderer = get_preview_renderer()
+    with stage("preview"):
+        frame, box = renderer.update(palette)
+        if box is None:
+            return
+        left, top, right, bottom = box
+        if box == (0, 0, frame.shape[1], frame.shape[0]):
+            show_preview_frame(frame)
+        else:
+            # Only the changed region is pushed to Tk
+            region = ImageTk.PhotoImage(Image.fromarray(frame[top:bottom, left:right]))
+            modified_canvas.tk.call(str(modified_img), "copy", str(region), "-to", left, top)
+
+
+def refresh_modified_preview():
+    show_modified_preview(session.palette)
+
+
+def change_zoom(step):
+    if session is None:
+        return
+    renderer = get_preview_renderer()
+    levels = zoom_levels(renderer.size, renderer.box)
+    level = levels.index(renderer.zoom) if renderer.zoom in levels else len(levels) - 1
+    renderer.set_zoom(levels[min(max(level + step, 0), len(levels) - 1)])
+    zoom_info_label.config(text=zoom_label(renderer.zoom))
+    show_original_preview()
+    refresh_modified_preview()
+    schedule_preview()
+
+
+def toggle_perf_panel():
+    global perf_panel_visible
+    perf_panel_visible = not perf_panel_visible
+    if perf_panel_visible:
+        perf_toggle.config(text="Performance \u25be")
+        perf_panel.pack(fill="x", padx=10, pady=(0, 5))
+        refresh_perf_panel()
+    else:
+        perf_toggle.config(text="Performance \u25b8")
+        perf_panel.pack_forget()
+
+
+def set_profiling():
+    perf.profiler.enabled = perf_enabled.get()
+
+
+def refresh_perf_panel():
+    if not perf_panel_visible:
+        return
+    text = perf.profiler.format_summary() if perf.profiler.events else "No timings recorded yet."
+    perf_text.delete("1.0", "end")
+    perf_text.insert("1.0", text)
+    perf_text.after(PERF_REFRESH_MS, refresh_perf_panel)
+
+
+def export_perf(trace=False):
+    if not perf.profiler.events:
+        messagebox.showinfo("Export Timings", "No timings recorded yet.")
+        return
+    save_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
+    if save_path:
+        if trace:
+            perf.profiler.export_trace(save_path)
+        else:
+            perf.profiler.export_json(save_path)
+        messagebox.showinfo("Saved", f"Timings saved to {save_path}")
+
+
+def apply_recipe(loaded_recipe):
+    global region_seed
+    if session is None:
+        messagebox.showerror("Error", "Upload a sprite before applying a recipe.")
+        return
+    region_seed = None
+
+    stop_preview()
+    session.apply_recipe(loaded_recipe)
+
+    refresh_modified_preview()
+    extract_and_show_colors(session.rgba())
+    update_threshold_info()
+
+
+def save_recipe():
+    if session is None or not session.recipe.steps:
+        messagebox.showinfo("Save Recipe", "No swaps to save yet.")
+        return
+    save_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Recipe", "*.json")])
+    if save_path:
+        session.recipe.save(save_path)
+        messagebox.showinfo("Saved", f"Recipe saved to {save_path}")
+
+
+def load_recipe():
+    file_path = filedialog.askopenfilename(filetypes=[("Recipe", "*.json")])
+    if not file_path:
+        return
+    try:
+        loaded_recipe = Recipe.load(file_path)
+    except (OSError, ValueError, KeyError) as exc:
+        messagebox.showerror("Error", f"Could not load recipe: {exc}")
+        return
+    apply_recipe(loaded_recipe)
+
+
 def update_status_label():
     if selected_color:
         r, g, b = selected_color[:3]
@@ -171,41 +444,67 @@ def update_status_label():
 
 
 def undo():
-    global modified_pil, modified_img
-    if not undo_stack:
+    global region_seed
+    if session is None or not session.history.can_undo():
         messagebox.showinfo("Undo", "Nothing to undo.")
         return
-    modified_pil = undo_stack.pop()
-    display_size = (250, 250)
-    modified_img = ImageTk.PhotoImage(modified_pil.resize(display_size, Image.LANCZOS))
-    modified_canvas.config(image=modified_img)
-    extract_and_show_colors(modified_pil)
+    stop_preview()
+    region_seed = None
+    session.undo()
+    refresh_modified_preview()
+    extract_and_show_colors(session.rgba())
+    update_status_label()
+    update_threshold_info()
+
+
+def redo():
+    global region_seed
+    if session is None or not session.history.can_redo():
+        messagebox.showinfo("Redo", "Nothing to redo.")
+        return
+    stop_preview()
+    region_seed = None
+    session.redo()
+    refresh_modified_preview()
+    extract_and_show_colors(session.rgba())
     update_status_label()
+    update_threshold_info()
 
 
 def save_image():
-    if modified_pil is None:
+    if session is None:
         messagebox.showerror("Error", "No image to save.")
         return
     save_path = filedialog.asksaveasfilename(defaultextension=".png")
     if save_path:
-        modified_pil.save(save_path)
-        messagebox.showinfo("Saved", f"Sprite saved to {save_path}")
+        try:
+            frame_count = session.save(save_path)
+        except ValueError as exc:
+            messagebox.showerror("Error", f"Could not save sprite: {exc}")
+            return
+        if frame_count is not None:
+            messagebox.showinfo("Saved", f"Animated sprite ({frame_count} frames) saved to {save_path}")
+        else:
+            messagebox.showinfo("Saved", f"Sprite saved to {save_path}")
 
 
 def main():
     #UI backbone was suggested by OpenAI, but I fine-tuned it to fit my needs
-    global threshold, preserve_bw
+    global threshold, preserve_bw, group_shades, region_mode, connectivity, preview_worker
     global original_canvas, modified_canvas
-    global original_color_frame, latest_color_frame, status_label
+    global original_color_frame, latest_color_frame, status_label, threshold_info_label, zoom_info_label
+    global perf_toggle, perf_panel, perf_text, perf_enabled
 
     root = tk.Tk()
     root.title("Pixel Art Palette Swapper")
-    root.geometry("850x600")
+    root.geometry("850x900")
     root.configure(bg="#f0f0f0")
 
     threshold = tk.IntVar(value=30)
     preserve_bw = tk.BooleanVar(value=True)
+    group_shades = tk.BooleanVar(value=False)
+    region_mode = tk.BooleanVar(value=False)
+    connectivity = tk.IntVar(value=4)
 
     top_frame = tk.Frame(root, bg="#f0f0f0")
     palette_frame = tk.Frame(root, bg="#f0f0f0", relief="ridge", bd=2)
@@ -229,17 +528,51 @@ def main():
     modified_canvas = tk.Label(image_frame_right)
     original_canvas.pack(padx=10, pady=10)
     modified_canvas.pack(padx=10, pady=10)
+    modified_canvas.bind("<Button-1>", select_region)
 
     tk.Button(buttons_section, text="Upload Sprite", width=15, command=upload_image).pack(pady=10)
-    tk.Button(buttons_section, text="Pick New Color", width=15, command=pick_new_color).pack(pady=10)
-    tk.Button(buttons_section, text="Undo", width=15, command=undo).pack(pady=10)
+    tk.Button(buttons_section, text="Pick New Color", width=15, command=pick_new_color).pack(pady=(10, 2))
+    tk.Button(buttons_section, text="Apply Swap", width=15, command=apply_color_swap).pack(pady=(2, 10))
+    tk.Button(buttons_section, text="Undo", width=15, command=undo).pack(pady=(10, 2))
+    tk.Button(buttons_section, text="Redo", width=15, command=redo).pack(pady=(2, 10))
     tk.Button(buttons_section, text="Save Sprite", width=15, command=save_image).pack(pady=10)
+    tk.Button(buttons_section, text="Load Recipe", width=15, command=load_recipe).pack(pady=(10, 2))
+    tk.Button(buttons_section, text="Save Recipe", width=15, command=save_recipe).pack(pady=(2, 10))
+
+    zoom_section = tk.Frame(buttons_section, bg="#f0f0f0")
+    zoom_section.pack(anchor="w")
+    tk.Label(zoom_section, text="Zoom", bg="#f0f0f0").pack(side="left")
+    tk.Button(zoom_section, text="\u2212", width=2, command=lambda: change_zoom(-1)).pack(side="left", padx=(5, 0))
+    zoom_info_label = tk.Label(zoom_section, text="", width=5, bg="#f0f0f0")
+    zoom_info_label.pack(side="left")
+    tk.Button(zoom_section, text="+", width=2, command=lambda: change_zoom(1)).pack(side="left")
 
     tk.Label(buttons_section, text="Sensitivity to Gradient", bg="#f0f0f0").pack(anchor="w", pady=(10, 5))
     tk.Scale(buttons_section, from_=0, to=100, orient='horizontal', variable=threshold,
-             length=150, bg="#f0f0f0").pack(anchor="w")
-
-    tk.Checkbutton(buttons_section, text="Preserve B/W", variable=preserve_bw, bg="#f0f0f0").pack(anchor="w", pady=5)
+             length=150, bg="#f0f0f0", command=on_threshold_change).pack(anchor="w")
+    threshold_info_label = tk.Label(buttons_section, text="", bg="#f0f0f0", font=("Arial", 9))
+    threshold_info_label.pack(anchor="w")
+
+    tk.Checkbutton(buttons_section, text="Preserve B/W", variable=preserve_bw, bg="#f0f0f0",
+                   command=on_threshold_change).pack(anchor="w", pady=5)
+    for text, choices, current, command in (("Distance", METRICS, distance_metric, set_distance_metric),
+                                            ("Brightness", BRIGHTNESS_MODES, brightness_mode,
+                                             set_brightness_mode)):
+        menu_section = tk.Frame(buttons_section, bg="#f0f0f0")
+        menu_section.pack(anchor="w")
+        tk.Label(menu_section, text=text, width=9, anchor="w", bg="#f0f0f0").pack(side="left")
+        labels = dict(choices)
+        tk.OptionMenu(menu_section, tk.StringVar(root, labels[current]), *labels.values(),
+                      command=command).pack(side="left")
+    tk.Checkbutton(buttons_section, text="Group Similar Shades", variable=group_shades, bg="#f0f0f0",
+                   command=regroup_swatches).pack(anchor="w")
+    region_section = tk.Frame(buttons_section, bg="#f0f0f0")
+    region_section.pack(anchor="w", pady=(5, 0))
+    tk.Checkbutton(region_section, text="Region Mode", variable=region_mode, bg="#f0f0f0",
+                   command=toggle_region_mode).pack(side="left")
+    for n in (4, 8):
+        tk.Radiobutton(region_section, text=f"{n}-way", variable=connectivity, value=n, bg="#f0f0f0",
+                       command=on_threshold_change).pack(side="left")
 
     tk.Label(palette_frame, text="Edited Sprite Palette (Clickable)", bg="#f0f0f0").pack(pady=(5, 0))
     latest_color_frame = tk.Frame(palette_frame, bg="#f0f0f0")
@@ -254,7 +587,26 @@ def main():
     status_label = tk.Label(status_frame, text="No color selected", bg="#f0f0f0", font=("Arial", 10))
     status_label.pack(side="left", padx=10)
 
+    perf_enabled = tk.BooleanVar(value=False)
+    perf_section = tk.Frame(root, bg="#f0f0f0")
+    perf_section.pack(fill="x", padx=20)
+    perf_toggle = tk.Button(perf_section, text="Performance \u25b8", relief="flat", bg="#f0f0f0",
+                            command=toggle_perf_panel)
+    perf_toggle.pack(anchor="w")
+    perf_panel = tk.Frame(perf_section, bg="#f0f0f0")
+    perf_controls = tk.Frame(perf_panel, bg="#f0f0f0")
+    perf_controls.pack(fill="x")
+    tk.Checkbutton(perf_controls, text="Record timings", variable=perf_enabled, bg="#f0f0f0",
+                   command=set_profiling).pack(side="left")
+    tk.Button(perf_controls, text="Export JSON", command=export_perf).pack(side="left", padx=5)
+    tk.Button(perf_controls, text="Export Trace", command=lambda: export_perf(trace=True)).pack(side="left")
+    perf_text = tk.Text(perf_panel, height=8, font=("Courier", 9))
+    perf_text.pack(fill="x", pady=5)
+
+    preview_worker = PreviewWorker()
+    root.after(PREVIEW_POLL_MS, poll_preview)
     root.mainloop()
+    preview_worker.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,70 @@
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from engine import index_colors, apply_palette, swap_rgba
+
+RECIPE_VERSION = 2
+# Version 1 recipes predate the metric and brightness fields and load with their defaults
+READABLE_VERSIONS = (1, 2)
+
+SwapStep = namedtuple("SwapStep", ["old_rgb", "new_rgb", "threshold", "preserve_bw", "metric", "brightness"],
+                      defaults=("rgb", "average"))
+
+
+class Recipe:
+    # An ordered list of swaps that is compiled into a single color mapping
+
+    def __init__(self, steps=()):
+        self.steps = [SwapStep(*step) for step in steps]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __eq__(self, other):
+        return isinstance(other, Recipe) and self.steps == other.steps
+
+    def add(self, old_rgb, new_rgb, threshold, preserve_bw, metric="rgb", brightness="average"):
+        self.steps.append(SwapStep(tuple(old_rgb[:3]), tuple(new_rgb[:3]), threshold, bool(preserve_bw),
+                                   metric, brightness))
+
+    def compile(self, palette):
+        # Every step is a function of RGB alone, so running the steps over the
+        # unique colors gives the combined mapping for the whole image
+        palette = np.array(palette, dtype=np.uint8)
+        for old_rgb, new_rgb, threshold, preserve_bw, metric, brightness in self.steps:
+            palette = swap_rgba(palette, new_rgb, old_rgb, threshold, preserve_bw, metric, brightness)
+        return palette
+
+    def apply(self, rgba):
+        palette, index = index_colors(rgba)
+        return apply_palette(self.compile(palette), index)
+
+    def to_dict(self):
+        return {
+            "version": RECIPE_VERSION,
+            "steps": [{"old": list(step.old_rgb), "new": list(step.new_rgb),
+                       "threshold": step.threshold, "preserve_bw": step.preserve_bw,
+                       "metric": step.metric, "brightness": step.brightness}
+                      for step in self.steps],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") not in READABLE_VERSIONS:
+            raise ValueError(f"unsupported recipe version: {data.get('version')!r}")
+        recipe = cls()
+        for step in data["steps"]:
+            recipe.add(step["old"], step["new"], step["threshold"], step["preserve_bw"],
+                       step.get("metric", "rgb"), step.get("brightness", "average"))
+        return recipe
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from engine import swap_rows
+
+LABEL_CACHE_SIZE = 8
+
+
+def row_runs(mask):
+    # Horizontal runs of True pixels in row-major order: (row, start, end) arrays
+    height, width = mask.shape
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+
+def touching_runs(rows, starts, ends, width, connectivity):
+    # Pairs of runs on neighbouring rows that touch. Runs are placed on one
+    # number line with a gap between rows, so each run finds the runs of the
+    # row above with two binary searches.
+    reach = 1 if connectivity == 8 else 0
+    stride = width + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    above = (rows - 1) * stride
+    lo = np.searchsorted(end_keys, above + starts - reach, side="right")
+    hi = np.searchsorted(start_keys, above + ends + reach, side="left")
+    counts = np.maximum(hi - lo, 0)
+    below = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(lo, counts) + offsets, below
+
+
+def merge_runs(n, a, b):
+    # Union-find over run pairs, done a whole edge list at a time: hook each
+    # root onto the smaller one, then flatten, until every pair agrees
+    parent = np.arange(n)
+    while True:
+        root_a, root_b = parent[a], parent[b]
+        apart = root_a != root_b
+        if not apart.any():
+            return parent
+        smaller = np.minimum(root_a[apart], root_b[apart])
+        np.minimum.at(parent, root_a[apart], smaller)
+        np.minimum.at(parent, root_b[apart], smaller)
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def label_regions(mask, connectivity=4):
+    # Connected components of a boolean mask: 0 for background, 1..n otherwise
+    if connectivity not in (4, 8):
+        raise ValueError(f"connectivity must be 4 or 8, not {connectivity!r}")
+    mask = np.asarray(mask, dtype=bool)
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    rows, starts, ends = row_runs(mask)
+    if not len(rows):
+        return labels
+    parent = merge_runs(len(rows), *touching_runs(rows, starts, ends, mask.shape[1], connectivity))
+    # Roots are numbered in order, so components come out in row-major order
+    roots = parent == np.arange(len(parent))
+    run_labels = np.cumsum(roots)[parent]
+    # True pixels come in the same row-major order as the runs
+    labels[mask] = np.repeat(run_labels, ends - starts)
+    return labels
+
+
+class RegionLabels:
+    # Component labels of one index map, per set of selected palette rows and
+    # connectivity. Clicking elsewhere with the same settings is a lookup.
+
+    def __init__(self, cache_size=LABEL_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.index = None
+        self.cache = OrderedDict()
+        # The live preview labels on its worker thread while the GUI may ask too
+        self.lock = threading.Lock()
+
+    def labels(self, index, rows, connectivity=4):
+        with self.lock:
+            return self._labels(index, rows, connectivity)
+
+    def _labels(self, index, rows, connectivity):
+        if index is not self.index:
+            self.index = index
+            self.cache.clear()
+        rows = np.unique(rows)
+        key = (rows.tobytes(), connectivity)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        selected = np.zeros(int(index.max(initial=0)) + 1, dtype=bool)
+        selected[rows[rows < len(selected)]] = True
+        labels = label_regions(selected[index], connectivity)
+        self.cache[key] = labels
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return labels
+
+
+def swap_region(palette, index, region, new_rgb_values, old_rgb_values, brightness="average"):
+    # Recolor only the pixels in region (a boolean mask). Palette rows used
+    # solely inside the region are edited in place; rows shared with pixels
+    # outside get a recolored copy appended, and the region is pointed at it.
+    # Returns (palette, index); index is the same object if it did not change.
+    inside = np.bincount(index[region], minlength=len(palette))
+    used = np.flatnonzero(inside)
+    shared = used[inside[used] < np.bincount(index.ravel(), minlength=len(palette))[used]]
+
+    new_palette = swap_rows(palette, np.setdiff1d(used, shared), new_rgb_values, old_rgb_values, brightness)
+    if not len(shared):
+        return new_palette, index
+
+    copies = swap_rows(palette[shared], np.arange(len(shared)), new_rgb_values, old_rgb_values,
+                      brightness)
+    lookup = np.arange(len(palette))
+    lookup[shared] = len(palette) + np.arange(len(shared))
+    new_palette = np.concatenate([new_palette, copies])
+    dtype = np.uint16 if len(new_palette) <= 0xFFFF else np.uint32
+    new_index = index.astype(dtype)
+    new_index[region] = lookup[index[region]]
+    return new_palette, new_index
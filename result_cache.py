@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, nbytes INTEGER NOT NULL, last_used REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL);
+"""
+
+
+def recipe_key(recipe):
+    # Two recipes that swap the same way hash the same, however they were built
+    steps = []
+    for old_rgb, new_rgb, threshold, preserve_bw, metric, brightness in recipe.steps:
+        threshold = int(threshold) if float(threshold).is_integer() else float(threshold)
+        step = [[int(v) for v in old_rgb[:3]], [int(v) for v in new_rgb[:3]], threshold, bool(preserve_bw)]
+        # Default settings are left out so entries cached before they existed still hit
+        if (metric, brightness) != ("rgb", "average"):
+            step += [metric, brightness]
+        steps.append(step)
+    return hashlib.blake2b(json.dumps(steps).encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    # Content-addressed store of recolored images and compiled palettes.
+    # Outputs are keyed by (pixel digest, recipe, output format), mappings by
+    # (pixel digest, recipe). Source files are remembered by path, size and
+    # mtime so a hit needs no decode at all. Safe to share between processes.
+
+    def __init__(self, root, max_bytes=DEFAULT_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "index.sqlite"), timeout=30)
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def source_digest(self, path):
+        # Pixel digest recorded for this file, unless it changed since
+        stat = os.stat(path)
+        row = self.db.execute("SELECT size, mtime_ns, digest FROM sources WHERE path = ?",
+                              (os.path.abspath(path),)).fetchone()
+        if row and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+        return None
+
+    def remember_source(self, path, digest):
+        stat = os.stat(path)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                            (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest))
+
+    def fetch_output(self, digest, recipe, ext, dst):
+        # Copies a cached output to dst; returns whether there was one
+        found = self._fetch(f"out-{digest}-{recipe_key(recipe)}{ext}", lambda path: shutil.copyfile(path, dst))
+        if found is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store_output(self, digest, recipe, ext, src):
+        self._store(f"out-{digest}-{recipe_key(recipe)}{ext}", lambda path: shutil.copyfile(src, path))
+
+    def fetch_mapping(self, digest, recipe):
+        return self._fetch(f"map-{digest}-{recipe_key(recipe)}.npy", np.load)
+
+    def store_mapping(self, digest, recipe, mapped):
+        def write(path):
+            with open(path, "wb") as f:
+                np.save(f, mapped)
+        self._store(f"map-{digest}-{recipe_key(recipe)}.npy", write)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def nbytes(self):
+        return self.db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+
+    def _fetch(self, key, read):
+        # read(path) of a cached entry, or None if there is none. Another
+        # process may evict the file at any point, so a file gone by the time
+        # it is read counts as a miss too.
+        path = os.path.join(self.root, "objects", key)
+        if self.db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is None:
+            return None
+        try:
+            found = read(path)
+        except FileNotFoundError:
+            with self.db:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        with self.db:
+            self.db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return found
+
+    def _store(self, key, write):
+        path = os.path.join(self.root, "objects", key)
+        # Written under a temporary name so readers never see a partial file
+        partial = f"{path}.{os.getpid()}.tmp"
+        write(partial)
+        os.replace(partial, path)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                            (key, os.path.getsize(path), time.time()))
+        self.evict()
+
+    def evict(self):
+        # Drops least recently used entries until the cache fits max_bytes
+        total = self.nbytes()
+        if total <= self.max_bytes:
+            return
+        for key, nbytes in self.db.execute(
+                "SELECT key, nbytes FROM entries ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            with self.db:
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            try:
+                os.remove(os.path.join(self.root, "objects", key))
+            except FileNotFoundError:
+                pass
+            total -= nbytes
@@ -0,0 +1,167 @@
+import numpy as np
+from PIL import Image
+
+from engine import index_colors, apply_palette, swap_rgba, swap_rows
+from recipe import Recipe
+from history import SwapHistory, DEFAULT_MEMORY_BUDGET
+from distance_index import DistanceIndex, palette_counts
+from indexed import read_indexed, can_write_indexed, write_indexed
+from animation import is_animated, recolor_animation
+from region import RegionLabels, swap_region
+from perf import stage
+
+
+def color_change(image, new_rgb_values, old_rgb_values, thresh, preserve, metric="rgb", brightness="average"):
+    # One swap over a whole PIL image, returned as a new RGBA image
+    rgba = np.asarray(image.convert("RGBA"))
+    return Image.fromarray(swap_rgba(rgba, new_rgb_values, tuple(old_rgb_values[:3]), thresh, preserve, metric,
+                                     brightness))
+
+
+class SwapSession:
+    # One sprite being recolored: its palette and index map, undo history and
+    # the recipe of swaps made so far. Sessions share no state, so several
+    # sprites can be edited side by side in one process.
+
+    def __init__(self, rgba, path=None, indexed=None, history_bytes=DEFAULT_MEMORY_BUDGET):
+        self.path = path
+        self.original = np.asarray(rgba, dtype=np.uint8)
+        self.indexed = indexed is not None
+        if indexed is None:
+            # Index the sprite once; later swaps only recolor its palette
+            with stage("index", self.original.shape[0] * self.original.shape[1]):
+                indexed = index_colors(self.original)
+        self.palette, self.index = indexed
+        self.counts = palette_counts(self.palette, self.index)
+        self.history = SwapHistory(history_bytes)
+        self.recipe = Recipe()
+        self.region_labels = RegionLabels()
+        # Region swaps currently applied; the recipe can't replay them
+        self.region_edits = 0
+        self._distance_index = None
+
+    @classmethod
+    def open(cls, path, history_bytes=DEFAULT_MEMORY_BUDGET):
+        with stage("decode"):
+            with Image.open(path) as image:
+                # Indexed sprites keep their own palette, so swaps edit palette entries
+                indexed = read_indexed(image)
+                rgba = np.asarray(image.convert("RGBA"))
+        return cls(rgba, path, indexed, history_bytes)
+
+    @property
+    def size(self):
+        return self.index.shape[1], self.index.shape[0]
+
+    def rgba(self):
+        return apply_palette(self.palette, self.index)
+
+    def image(self):
+        return Image.fromarray(self.rgba())
+
+    def color_at(self, x, y):
+        return tuple(int(v) for v in self.palette[self.index[y, x]])
+
+    def distance_index(self, old_rgb_values, preserve, metric="rgb"):
+        old_rgb_values = tuple(old_rgb_values[:3])
+        # Rebuilt only when the selected color, the B/W toggle, the metric or the palette changes
+        if self._distance_index is None or not self._distance_index.matches(self.palette, old_rgb_values, preserve,
+                                                                            metric):
+            self._distance_index = DistanceIndex(self.palette, self.counts, old_rgb_values, preserve, metric)
+        return self._distance_index
+
+    def rows(self, old_rgb_values, thresh, preserve, metric="rgb"):
+        return self.distance_index(old_rgb_values, preserve, metric).rows(thresh)
+
+    def region(self, seed, old_rgb_values, thresh, preserve, metric="rgb", connectivity=4):
+        # (labels, label) of the connected area around seed, within the threshold
+        rows = self.rows(old_rgb_values, thresh, preserve, metric)
+        with stage("label_regions", self.index.size):
+            labels = self.region_labels.labels(self.index, rows, connectivity)
+        x, y = seed
+        return labels, labels[y, x]
+
+    def swap(self, new_rgb_values, old_rgb_values, thresh, preserve, metric="rgb", brightness="average",
+             seed=None, connectivity=4):
+        # Commits one swap as an undo step. With a seed only the connected area
+        # around it changes; such swaps depend on where the sprite was clicked,
+        # so they stay out of the recipe and animated sprites can't be saved
+        # while one is applied.
+        new_rgb_values, old_rgb_values = tuple(new_rgb_values[:3]), tuple(old_rgb_values[:3])
+        previous_palette, previous_index = self.palette, self.index
+        if seed is None:
+            rows = self.rows(old_rgb_values, thresh, preserve, metric)
+            with stage("swap", self.index.size):
+                self.palette = swap_rows(self.palette, rows, new_rgb_values, old_rgb_values, brightness)
+            self.recipe.add(old_rgb_values, new_rgb_values, thresh, preserve, metric, brightness)
+            steps = self.recipe.steps[-1:]
+        else:
+            labels, label = self.region(seed, old_rgb_values, thresh, preserve, metric, connectivity)
+            with stage("swap", self.index.size):
+                self.palette, self.index = swap_region(self.palette, self.index, labels == label, new_rgb_values,
+                                                       old_rgb_values, brightness)
+            if self.index is not previous_index:
+                self.counts = palette_counts(self.palette, self.index)
+            self.region_edits += 1
+            steps = None
+        with stage("undo_record"):
+            self.history.record(previous_palette, self.palette, steps, previous_index, self.index)
+
+    def apply_recipe(self, recipe):
+        # The whole recipe is one pass and one undo step
+        previous_palette = self.palette
+        with stage("swap", self.index.size):
+            self.palette = recipe.compile(self.palette)
+        self.recipe.steps.extend(recipe.steps)
+        self.history.record(previous_palette, self.palette, list(recipe.steps))
+
+    def undo(self):
+        if not self.history.can_undo():
+            return False
+        previous_index = self.index
+        self.palette, self.index, steps = self.history.undo(self.palette, self.index)
+        if self.index is not previous_index:
+            self.counts = palette_counts(self.palette, self.index)
+        if steps is None:
+            self.region_edits -= 1
+        else:
+            del self.recipe.steps[len(self.recipe.steps) - len(steps):]
+        return True
+
+    def redo(self):
+        if not self.history.can_redo():
+            return False
+        previous_index = self.index
+        self.palette, self.index, steps = self.history.redo(self.palette, self.index)
+        if self.index is not previous_index:
+            self.counts = palette_counts(self.palette, self.index)
+        if steps is None:
+            self.region_edits += 1
+        else:
+            self.recipe.steps.extend(steps)
+        return True
+
+    def save(self, path):
+        # Returns the frame count for animated sprites, which get the recorded
+        # recipe replayed over every frame, and None otherwise
+        if self.path and path.lower().endswith((".gif", ".png")) and is_animated(self.path):
+            if self.region_edits:
+                raise ValueError("Region swaps can't be replayed over the frames of an animated sprite; "
+                                 "undo them or save as a still image")
+            return recolor_animation(self.path, path, self.recipe)
+        if self.indexed and can_write_indexed(path, self.palette):
+            write_indexed(path, self.palette, self.index)
+        else:
+            self.image().save(path)
+        return None
+
+
+def main():
+    # Launches the GUI, which is only imported here so scripts and batch
+    # workers that import this module never load tkinter
+    import project
+    project.main()
+
+
+if __name__ == "__main__":
+    main()
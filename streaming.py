@@ -0,0 +1,191 @@
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from animation import PNG_SIGNATURE, png_chunk
+
+DEFAULT_STRIP_ROWS = 256
+
+
+class ImageRows:
+    # A decoded image sliced into RGBA row strips on demand. Only Pillow's own
+    # copy of the image is held; each strip is converted as it is asked for.
+
+    def __init__(self, image):
+        self.image = image
+        self.shape = (image.height, image.width, 4)
+
+    def __len__(self):
+        return self.image.height
+
+    def __getitem__(self, rows):
+        top, bottom, _ = rows.indices(self.image.height)
+        return np.asarray(self.image.crop((0, top, self.image.width, max(top, bottom))).convert("RGBA"))
+
+
+def open_rgba(path):
+    # Something that slices into (rows, width, 4) uint8 strips: .npy inputs are
+    # memory-mapped, encoded images are decoded once by Pillow
+    if path.lower().endswith(".npy"):
+        rgba = np.load(path, mmap_mode="r")
+        if rgba.ndim != 3 or rgba.shape[2] != 4 or rgba.dtype != np.uint8:
+            raise ValueError(f"expected an (height, width, 4) uint8 array in {path}")
+        return rgba
+    image = Image.open(path)
+    # Loading a single-frame image also closes its file
+    image.load()
+    return ImageRows(image)
+
+
+def remove_partial(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def iter_strips(height, strip_rows=DEFAULT_STRIP_ROWS):
+    for top in range(0, height, strip_rows):
+        yield top, min(top + strip_rows, height)
+
+
+class StripMapper:
+    # Remembers the mapped color of everything seen so far, so each distinct
+    # color goes through the recipe once no matter how many strips use it
+
+    def __init__(self, recipe):
+        self.recipe = recipe
+        self.keys = np.empty(0, dtype=np.uint32)
+        self.values = np.empty((0, 4), dtype=np.uint8)
+
+    def apply(self, rgba):
+        rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+        packed = rgba.view(np.uint32).reshape(rgba.shape[:-1])
+        unique, inverse = np.unique(packed, return_inverse=True)
+
+        new_keys = unique[~np.isin(unique, self.keys, assume_unique=True)]
+        if len(new_keys):
+            new_values = self.recipe.compile(new_keys.view(np.uint8).reshape(-1, 4))
+            keys = np.concatenate([self.keys, new_keys])
+            order = np.argsort(keys, kind="stable")
+            self.keys = keys[order]
+            self.values = np.concatenate([self.values, new_values])[order]
+
+        lookup = self.values[np.searchsorted(self.keys, unique)]
+        return lookup[inverse.reshape(packed.shape)]
+
+
+class PngStripWriter:
+    # Writes an RGBA PNG row strip by row strip with the "Up" filter,
+    # so only the current strip is ever held
+
+    def __init__(self, path, size):
+        self.fp = open(path, "wb")
+        self.width, self.height = size
+        self.previous = np.zeros((1, self.width * 4), dtype=np.uint8)
+        self.compressor = zlib.compressobj(6)
+        self.fp.write(PNG_SIGNATURE)
+        self.fp.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 6, 0, 0, 0)))
+
+    def write(self, rgba):
+        rows = np.ascontiguousarray(rgba, dtype=np.uint8).reshape(-1, self.width * 4)
+        above = np.concatenate([self.previous, rows[:-1]])
+        filtered = np.empty((len(rows), self.width * 4 + 1), dtype=np.uint8)
+        filtered[:, 0] = 2
+        filtered[:, 1:] = rows - above
+        self.previous = rows[-1:].copy()
+        self._write_idat(self.compressor.compress(filtered.tobytes()))
+
+    def close(self):
+        self._write_idat(self.compressor.flush())
+        self.fp.write(png_chunk(b"IEND", b""))
+        self.fp.close()
+
+    def abort(self):
+        self.fp.close()
+        remove_partial(self.fp.name)
+
+    def _write_idat(self, data):
+        if data:
+            self.fp.write(png_chunk(b"IDAT", data))
+
+
+class MemmapStripWriter:
+    # Strips go into a memory-mapped .npy; other formats are encoded from it at the end
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.top = 0
+        if path.lower().endswith(".npy"):
+            self.scratch = None
+            npy_path = path
+        else:
+            fd, npy_path = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(os.path.abspath(path)))
+            os.close(fd)
+            self.scratch = npy_path
+        width, height = size
+        self.rgba = np.lib.format.open_memmap(npy_path, mode="w+", dtype=np.uint8, shape=(height, width, 4))
+
+    def write(self, rgba):
+        self.rgba[self.top:self.top + len(rgba)] = rgba
+        self.top += len(rgba)
+
+    def close(self):
+        self.rgba.flush()
+        if not self.scratch:
+            self._release()
+            return
+        image = None
+        try:
+            image = Image.frombuffer("RGBA", self.size, self.rgba, "raw", "RGBA", 0, 1)
+            if self.path.lower().endswith((".jpg", ".jpeg")):
+                image = image.convert("RGB")
+            image.save(self.path)
+        except BaseException:
+            remove_partial(self.path)
+            raise
+        finally:
+            image = None
+            self._release()
+            os.remove(self.scratch)
+
+    def abort(self):
+        # Nothing is encoded from a partly filled image
+        self._release()
+        if self.scratch:
+            os.remove(self.scratch)
+        remove_partial(self.path)
+
+    def _release(self):
+        # Windows can't remove a file that is still mapped, so the map is
+        # closed once the last view of it is gone
+        mapping = self.rgba._mmap
+        self.rgba = None
+        if mapping is not None:
+            mapping.close()
+
+
+def open_writer(path, size):
+    if path.lower().endswith(".png"):
+        return PngStripWriter(path, size)
+    return MemmapStripWriter(path, size)
+
+
+def stream_swap(src, dst, recipe, strip_rows=DEFAULT_STRIP_ROWS):
+    source = open_rgba(src)
+    height, width = source.shape[:2]
+    mapper = StripMapper(recipe)
+    writer = open_writer(dst, (width, height))
+    try:
+        for top, bottom in iter_strips(height, strip_rows):
+            writer.write(mapper.apply(source[top:bottom]))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return width, height
@@ -0,0 +1,128 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from animation import apng_delay, is_animated, iter_frames, union_palette, recolor_animation
+from recipe import Recipe
+
+RECIPE = Recipe([((200, 40, 40), (0, 100, 255), 30, True)])
+
+
+def make_frames(count=4, noisy=False):
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        rgba = np.zeros((20, 30, 4), dtype=np.uint8)
+        rgba[...] = (200, 40, 40, 255)
+        rgba[i * 3:i * 3 + 5, 5:15] = (0, 0, 0, 0)
+        rgba[10:, i * 5:i * 5 + 4] = (180, 50, 50, 255)
+        if noisy:
+            rgba[:, 20:, :3] = rng.integers(0, 256, size=(20, 10, 3))
+        frames.append(rgba)
+    return frames
+
+
+def save_animation(path, frames, **params):
+    images = [Image.fromarray(f) for f in frames]
+    images[0].save(path, save_all=True, append_images=images[1:], **params)
+
+
+def assert_recolored(src, dst):
+    sources = list(iter_frames(src))
+    results = list(iter_frames(dst))
+    assert len(results) == len(sources)
+    for (rgba, info), (out, out_info) in zip(sources, results):
+        expected = RECIPE.apply(rgba)
+        opaque = expected[..., 3] > 0
+        assert np.array_equal(out[..., 3] > 0, opaque)
+        assert np.array_equal(out[opaque][:, :3], expected[opaque][:, :3])
+        assert out_info["duration"] == info["duration"]
+        assert out_info["disposal"] == info["disposal"]
+
+
+@pytest.mark.parametrize("src_name", ["in.gif", "in.png"])
+@pytest.mark.parametrize("dst_name", ["out.gif", "out.png"])
+def test_recolor_animation(tmp_path, src_name, dst_name):
+    src, dst = str(tmp_path / src_name), str(tmp_path / dst_name)
+    save_animation(src, make_frames(), duration=[100, 200, 300, 400], loop=0, disposal=2)
+
+    assert recolor_animation(src, dst, RECIPE) == 4
+
+    assert_recolored(src, dst)
+    with Image.open(dst) as out:
+        assert out.info.get("loop") == 0
+
+
+def test_recolor_animation_keeps_disposal(tmp_path):
+    src, dst = str(tmp_path / "in.gif"), str(tmp_path / "out.gif")
+    save_animation(src, make_frames(3), duration=[50, 60, 70], disposal=[1, 3, 2])
+
+    recolor_animation(src, dst, RECIPE)
+
+    assert [info["disposal"] for _, info in iter_frames(dst)] == ["none", "previous", "background"]
+
+
+def test_recolor_animation_many_colors(tmp_path):
+    src, dst = str(tmp_path / "in.png"), str(tmp_path / "out.gif")
+    save_animation(src, make_frames(2, noisy=True), duration=[100, 100], loop=0)
+
+    recolor_animation(src, dst, RECIPE)
+
+    with Image.open(dst) as out:
+        assert out.n_frames == 2
+    assert [info["duration"] for _, info in iter_frames(dst)] == [100, 100]
+
+
+def test_recolor_apng_blend_and_long_delays(tmp_path):
+    src, dst = str(tmp_path / "in.png"), str(tmp_path / "out.png")
+    save_animation(src, make_frames(3), duration=[100, 70000, 3000000], blend=[0, 1, 1], loop=0)
+
+    recolor_animation(src, dst, RECIPE)
+
+    assert_recolored(src, dst)
+    with Image.open(dst) as out:
+        for n in range(out.n_frames):
+            out.seek(n)
+            assert out.info["blend"] == 0
+
+
+def test_apng_delay():
+    assert apng_delay(100) == (100, 1000)
+    assert apng_delay(70000) == (7000, 100)
+    assert apng_delay(70005) == (7000, 100)
+    assert apng_delay(10 ** 9) == (0xFFFF, 1)
+
+
+@pytest.mark.parametrize("name", ["anim.gif", "anim.png"])
+def test_recolor_animation_over_its_source(tmp_path, name):
+    src = str(tmp_path / name)
+    save_animation(src, make_frames(), duration=[100, 200, 300, 400], loop=0)
+    original = str(tmp_path / f"original-{name}")
+    save_animation(original, make_frames(), duration=[100, 200, 300, 400], loop=0)
+
+    assert recolor_animation(src, src, RECIPE) == 4
+
+    assert_recolored(original, src)
+    assert sorted(os.listdir(tmp_path)) == sorted([name, f"original-{name}"])
+
+
+def test_union_palette(tmp_path):
+    src = str(tmp_path / "in.png")
+    frames = make_frames()
+    save_animation(src, frames, duration=100)
+
+    union = union_palette(src).view(np.uint8).reshape(-1, 4)
+
+    expected = {tuple(c) for f in frames for c in f.reshape(-1, 4).tolist()}
+    assert {tuple(c) for c in union.tolist()} == expected
+
+
+def test_is_animated_and_bad_output(tmp_path):
+    src = str(tmp_path / "in.gif")
+    save_animation(src, make_frames(2), duration=100)
+    Image.new("RGBA", (2, 2)).save(tmp_path / "still.png")
+
+    assert is_animated(src)
+    assert not is_animated(str(tmp_path / "still.png"))
+    with pytest.raises(ValueError):
+        recolor_animation(src, str(tmp_path / "out.bmp"), RECIPE)
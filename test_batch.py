@@ -0,0 +1,234 @@
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from unittest.mock import patch
+from PIL import Image
+from batch import parse_color, parse_swap, collect_inputs, recolor_image, run_batch, main
+from engine import swap_rgba
+from recipe import Recipe
+
+
+def make_sprite(path, seed):
+    rng = np.random.default_rng(seed)
+    rgba = rng.integers(0, 256, size=(12, 9, 4), dtype=np.uint8)
+    rgba[::2, ::3, :3] = (200, 40, 40)
+    Image.fromarray(rgba).save(path)
+    return rgba
+
+
+def test_parse_color():
+    assert parse_color("#ff8000") == (255, 128, 0)
+    assert parse_color("10,20,30") == (10, 20, 30)
+    with pytest.raises(ValueError):
+        parse_color("#fff")
+    with pytest.raises(ValueError):
+        parse_color("300,0,0")
+
+
+def test_parse_swap():
+    assert parse_swap("ff0000:00ff00") == ((255, 0, 0), (0, 255, 0), 30, True)
+    assert parse_swap("ff0000:0,0,255:45:no", 10, True) == ((255, 0, 0), (0, 0, 255), 45, False)
+    with pytest.raises(ValueError):
+        parse_swap("ff0000")
+    with pytest.raises(ValueError):
+        parse_swap("ff0000:00ff00:10:maybe")
+
+
+def test_collect_inputs(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"")
+    (tmp_path / "b.txt").write_bytes(b"")
+    (tmp_path / "c.GIF").write_bytes(b"")
+
+    assert collect_inputs(str(tmp_path)) == [str(tmp_path / "a.png"), str(tmp_path / "c.GIF")]
+    assert collect_inputs(str(tmp_path / "*.png")) == [str(tmp_path / "a.png")]
+
+
+def test_recolor_image_applies_recipe():
+    rgba = np.random.default_rng(1).integers(0, 256, size=(8, 8, 4), dtype=np.uint8)
+    swaps = [((200, 40, 40), (10, 10, 240), 60, True), ((10, 10, 240), (90, 200, 90), 20, False)]
+
+    result = recolor_image(Image.fromarray(rgba), Recipe(swaps))
+
+    expected = rgba
+    for old_rgb, new_rgb, thresh, preserve in swaps:
+        expected = swap_rgba(expected, new_rgb, old_rgb, thresh, preserve)
+    assert np.array_equal(np.asarray(result), expected)
+
+
+def test_run_batch(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    sprites = {f"s{i}.png": make_sprite(src / f"s{i}.png", i) for i in range(3)}
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+    progress = []
+
+    results, failures = run_batch(collect_inputs(str(src)), str(tmp_path / "out"), recipe, workers=2,
+                                  progress=lambda done, total, *rest: progress.append((done, total)))
+
+    assert len(results) == 3 and failures == []
+    assert progress[-1] == (3, 3)
+    for name, rgba in sprites.items():
+        out = np.asarray(Image.open(tmp_path / "out" / name))
+        assert np.array_equal(out, swap_rgba(rgba, (0, 128, 255), (200, 40, 40), 30, True))
+
+
+def test_run_batch_keeps_going_after_a_bad_file(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    (src / "bad.png").write_bytes(b"not an image")
+    make_sprite(src / "ok.png", 0)
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+
+    for workers in (1, 2):
+        errors = []
+        results, failures = run_batch(collect_inputs(str(src)), str(tmp_path / f"out{workers}"), recipe,
+                                      workers=workers, progress=lambda *args: errors.append(args[6:]))
+        assert [result[0] for result in results] == [str(src / "ok.png")]
+        assert [path for path, _ in failures] == [str(src / "bad.png")]
+        assert (tmp_path / f"out{workers}" / "ok.png").exists()
+        assert sum(1 for error in errors if error and error[0] is not None) == 1
+
+    assert main([str(src), str(tmp_path / "out3"), "-s", "c82828:0080ff", "-j", "1"]) == 1
+
+
+def test_run_batch_same_name_in_different_directories(tmp_path):
+    for n, folder in enumerate(("a", "b")):
+        (tmp_path / "in" / folder).mkdir(parents=True)
+        make_sprite(tmp_path / "in" / folder / "hero.png", n)
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+
+    results, _ = run_batch(collect_inputs(str(tmp_path / "in" / "*" / "*.png")), str(tmp_path / "out"), recipe)
+
+    assert sorted(os.path.relpath(result[1], tmp_path / "out") for result in results) == [
+        os.path.join("a", "hero.png"), os.path.join("b", "hero.png")]
+
+
+def test_main(tmp_path, capsys):
+    make_sprite(tmp_path / "a.png", 0)
+
+    assert main([str(tmp_path / "*.png"), str(tmp_path / "out"), "-s", "c82828:0080ff", "-j", "1"]) == 0
+    assert (tmp_path / "out" / "a.png").exists()
+    assert "Recolored 1 sprites" in capsys.readouterr().out
+
+    assert main([str(tmp_path / "*.bmp"), str(tmp_path / "out"), "-s", "c82828:0080ff"]) == 1
+
+    Recipe([((200, 40, 40), (0, 128, 255), 30, True)]).save(tmp_path / "recipe.json")
+    assert main([str(tmp_path / "*.png"), str(tmp_path / "out2"), "-r", str(tmp_path / "recipe.json"), "-j", "1"]) == 0
+    assert np.array_equal(np.asarray(Image.open(tmp_path / "out2" / "a.png")),
+                          np.asarray(Image.open(tmp_path / "out" / "a.png")))
+
+
+def test_main_metric_and_brightness(tmp_path):
+    make_sprite(tmp_path / "a.png", 0)
+
+    assert main([str(tmp_path / "*.png"), str(tmp_path / "out"), "-s", "c82828:0080ff:8", "--metric", "de2000",
+                 "--brightness", "lightness", "-j", "1"]) == 0
+    rgba = np.asarray(Image.open(tmp_path / "a.png").convert("RGBA"))
+    out = np.asarray(Image.open(tmp_path / "out" / "a.png").convert("RGBA"))
+    assert np.array_equal(out, swap_rgba(rgba, (0, 128, 255), (200, 40, 40), 8, True, "de2000", "lightness"))
+
+
+def test_batch_does_not_import_tkinter():
+    code = "import sys, batch; assert 'tkinter' not in sys.modules and 'PIL.ImageTk' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_run_batch_animated(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    frames = [Image.new("RGBA", (5, 5), (200, 40, 40, 255)), Image.new("RGBA", (5, 5), (0, 0, 0, 255))]
+    frames[0].save(src / "anim.gif", save_all=True, append_images=frames[1:], duration=[40, 90])
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+
+    run_batch(collect_inputs(str(src)), str(tmp_path / "out"), recipe)
+    # --strip-rows must not flatten animations to their first frame
+    run_batch(collect_inputs(str(src)), str(tmp_path / "strips"), recipe, strip_rows=2)
+
+    for out_dir in ("out", "strips"):
+        with Image.open(tmp_path / out_dir / "anim.gif") as out:
+            assert out.n_frames == 2
+            assert out.convert("RGBA").getpixel((0, 0)) == (0, 128, 255, 255)
+
+
+def test_run_batch_streaming(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    rgba = make_sprite(src / "atlas.png", 4)
+    np.save(src / "raw.npy", rgba)
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+
+    run_batch(collect_inputs(str(src)), str(tmp_path / "out"), recipe, strip_rows=5)
+
+    expected = swap_rgba(rgba, (0, 128, 255), (200, 40, 40), 30, True)
+    assert np.array_equal(np.asarray(Image.open(tmp_path / "out" / "atlas.png")), expected)
+    assert np.array_equal(np.load(tmp_path / "out" / "raw.npy"), expected)
+
+
+def test_main_profile(tmp_path, capsys):
+    make_sprite(tmp_path / "a.png", 0)
+    make_sprite(tmp_path / "b.png", 1)
+    profile, trace = tmp_path / "perf.json", tmp_path / "trace.json"
+
+    assert main([str(tmp_path / "*.png"), str(tmp_path / "out"), "-s", "c82828:0080ff", "-j", "2",
+                 "--profile", str(profile), "--trace", str(trace)]) == 0
+
+    summary = json.loads(profile.read_text())["summary"]
+    assert summary["decode"]["calls"] == 2
+    assert summary["swap"]["pixels"] == 2 * 12 * 9
+    assert {e["name"] for e in json.loads(trace.read_text())["traceEvents"]} == {"decode", "swap", "encode"}
+    assert "decode" in capsys.readouterr().out
+
+
+def test_main_cache(tmp_path, capsys):
+    make_sprite(tmp_path / "a.png", 0)
+    make_sprite(tmp_path / "b.png", 1)
+    args = [str(tmp_path / "*.png"), str(tmp_path / "out"), "-s", "c82828:0080ff", "-j", "1",
+            "--cache", str(tmp_path / "cache")]
+
+    assert main(args) == 0
+    assert "Cache: 0/2 hits (0%)" in capsys.readouterr().out
+    first = np.asarray(Image.open(tmp_path / "out" / "a.png"))
+    os.remove(tmp_path / "out" / "a.png")
+
+    with patch("batch.decode", side_effect=AssertionError("decoded a cached sprite")):
+        assert main(args) == 0
+    assert "Cache: 2/2 hits (100%)" in capsys.readouterr().out
+    assert np.array_equal(np.asarray(Image.open(tmp_path / "out" / "a.png")), first)
+
+    # Same pixels in another format miss the output but reuse the compiled mapping
+    Image.open(tmp_path / "a.png").save(tmp_path / "c.bmp")
+    assert main([str(tmp_path / "c.bmp"), str(tmp_path / "out"), "-s", "c82828:0080ff", "-j", "1",
+                 "--cache", str(tmp_path / "cache")]) == 0
+    assert "Cache: 0/1 hits (0%)" in capsys.readouterr().out
+
+
+def test_run_batch_keeps_indexed_sprites_indexed(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    im = Image.fromarray(np.array([[0, 1, 2], [2, 1, 0]], dtype=np.uint8))
+    im.putpalette(bytes([200, 40, 40, 0, 0, 0, 180, 30, 30]), "RGB")
+    im.save(src / "indexed.png", transparency=1)
+    rgba = np.asarray(Image.open(src / "indexed.png").convert("RGBA"))
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+
+    run_batch(collect_inputs(str(src)), str(tmp_path / "out"), recipe)
+
+    with Image.open(tmp_path / "out" / "indexed.png") as out:
+        assert out.mode == "P"
+        assert np.array_equal(np.asarray(out), np.asarray(im))
+        assert np.array_equal(np.asarray(out.convert("RGBA")), swap_rgba(rgba, (0, 128, 255), (200, 40, 40), 30, True))
+
+
+def test_run_batch_single_file_uses_row_bands(tmp_path):
+    rgba = make_sprite(tmp_path / "atlas.png", 2)
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+
+    with patch("batch.parallel_swap", side_effect=lambda rgba, recipe, workers: recipe.apply(rgba)) as mock_swap:
+        run_batch([str(tmp_path / "atlas.png")], str(tmp_path / "out"), recipe, workers=3)
+
+    assert mock_swap.call_args.args[2] == 3
+    expected = swap_rgba(rgba, (0, 128, 255), (200, 40, 40), 30, True)
+    assert np.array_equal(np.asarray(Image.open(tmp_path / "out" / "atlas.png")), expected)
@@ -0,0 +1,51 @@
+import json
+import numpy as np
+import pytest
+from benchmark import make_sprite, run_cases, compare, main
+
+
+def test_make_sprite():
+    rgba = make_sprite(64, 16)
+
+    assert rgba.shape == (64, 64, 4)
+    assert len(np.unique(rgba.reshape(-1, 4), axis=0)) <= 16
+    assert np.array_equal(make_sprite(64, 16), rgba)
+    for palette_size in (1, 2, 3):
+        assert len(np.unique(make_sprite(16, palette_size).reshape(-1, 4), axis=0)) <= palette_size
+
+
+def test_run_cases():
+    results = run_cases((16, 40), (8,), (0, 30), repeat=1)
+
+    paths = {entry["path"] for entry in results}
+    assert paths == {"extract", "preview_resize", "preview_render", "swap_rgba", "palette_swap"}
+    assert len(results) == 2 * (3 + 2 * 2 * 2)
+    assert all(entry["seconds_min"] >= 0 for entry in results)
+
+
+def test_compare():
+    results = run_cases((16,), (8,), (30,), repeat=1)
+    baseline = {"results": [dict(entry) for entry in results]}
+    baseline["results"][0]["digest"] = "different"
+
+    mismatches, ratios = compare(results, baseline)
+
+    assert mismatches == [("extract", 16, 8, None, None)]
+    assert len(ratios) <= len(results)
+
+
+def test_main(tmp_path, capsys):
+    out = tmp_path / "bench.json"
+    args = ["-o", str(out), "--sizes", "16", "--palette-sizes", "4", "--thresholds", "30", "-n", "1"]
+
+    assert main(args) == 0
+    data = json.loads(out.read_text())
+    assert data["environment"]["numpy"] == np.__version__
+
+    assert main(["-o", str(tmp_path / "again.json")] + args[2:] + ["--compare", str(out)]) == 0
+    assert "Wrote" in capsys.readouterr().out
+
+
+def test_main_rejects_empty_palettes(tmp_path):
+    with pytest.raises(SystemExit):
+        main(["-o", str(tmp_path / "bench.json"), "--sizes", "16", "--palette-sizes", "0"])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import colorspace
+from colorspace import srgb_to_lab, lab_to_srgb, to_lab, delta_e76, delta_e2000, weighted_rgb_distance
+
+
+def test_lab_reference_colors():
+    assert np.allclose(srgb_to_lab([255, 255, 255]), (100, 0, 0), atol=1e-3)
+    assert np.allclose(srgb_to_lab([0, 0, 0]), (0, 0, 0))
+    assert np.allclose(srgb_to_lab([255, 0, 0]), (53.24, 80.09, 67.20), atol=0.01)
+
+
+def test_lab_round_trip():
+    rgb = np.random.default_rng(0).integers(0, 256, size=(5000, 3))
+    assert np.array_equal(lab_to_srgb(srgb_to_lab(rgb)), rgb)
+
+
+def test_to_lab_converts_each_color_once():
+    colorspace.clear_lab_cache()
+    rgb = np.array([[[10, 20, 30], [200, 100, 0]], [[10, 20, 30], [10, 20, 30]]])
+
+    assert np.array_equal(to_lab(rgb), srgb_to_lab(rgb))
+    assert len(colorspace._lab_cache[0]) == 2
+    assert np.array_equal(to_lab([200, 100, 0]), srgb_to_lab([200, 100, 0]))
+    assert len(colorspace._lab_cache[0]) == 2
+
+
+@pytest.mark.parametrize("lab1, lab2, expected", [
+    ((50, 2.6772, -79.7751), (50, 0, -82.7485), 2.0425),
+    ((50, 0, 0), (50, -1, 2), 2.3669),
+    ((50, 2.5, 0), (73, 25, -18), 27.1492),
+    ((2.0776, 0.0795, -1.135), (0.9033, -0.0636, -0.5514), 0.9082),
+])
+def test_delta_e2000_reference_pairs(lab1, lab2, expected):
+    # From Sharma, Wu and Dalal's CIEDE2000 test data
+    assert delta_e2000(lab1, lab2) == pytest.approx(expected, abs=1e-4)
+    assert delta_e2000(lab2, lab1) == pytest.approx(expected, abs=1e-4)
+
+
+def test_distances_are_zero_for_the_same_color():
+    lab = srgb_to_lab([[12, 200, 90], [0, 0, 0]])
+    assert np.allclose(delta_e76(lab, lab), 0)
+    assert np.allclose(delta_e2000(lab, lab), 0)
+    assert weighted_rgb_distance([[12, 200, 90]], (12, 200, 90))[0] == 0
+
+
+def test_weighted_rgb_counts_green_most():
+    assert weighted_rgb_distance([128, 138, 128], (128, 128, 128)) > weighted_rgb_distance([138, 128, 128],
+                                                                                          (128, 128, 128))
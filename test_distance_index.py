@@ -0,0 +1,78 @@
+import numpy as np
+from distance_index import DistanceIndex, palette_counts
+from engine import index_colors, swap_masks, swap_rows, swap_rgba, apply_palette
+
+
+def sprite(seed):
+    rng = np.random.default_rng(seed)
+    rgba = np.empty((32, 32, 4), dtype=np.uint8)
+    rgba[..., :3] = np.clip(np.array([90, 150, 60]) + rng.integers(-60, 61, size=(32, 32, 3)), 0, 255)
+    rgba[..., 3] = 255
+    rgba[::5, ::3, :3] = 0
+    rgba[2::9, 1::4, :3] = 250
+    return rgba
+
+
+def test_palette_counts():
+    palette, index = index_colors(sprite(0))
+    counts = palette_counts(palette, index)
+
+    assert counts.sum() == 32 * 32
+    assert counts[index[0, 0]] == np.count_nonzero(index == index[0, 0])
+
+
+def test_counts_match_swap_masks():
+    palette, index = index_colors(sprite(1))
+    counts = palette_counts(palette, index)
+    rgb = palette[:, :3]
+
+    for preserve in (True, False):
+        dist_index = DistanceIndex(palette, counts, (90, 150, 60), preserve)
+        for thresh in (0, 1, 17, 30, 64, 100):
+            exact, related = swap_masks(rgb, (90, 150, 60), thresh, preserve)
+            affected = exact | related
+            assert dist_index.color_count(thresh) == affected.sum()
+            assert dist_index.pixel_count(thresh) == counts[affected].sum()
+            assert set(dist_index.rows(thresh).tolist()) == set(np.flatnonzero(affected).tolist())
+
+
+def test_exact_black_selection_survives_preserve():
+    palette = np.array([[0, 0, 0, 255], [5, 5, 5, 255], [40, 40, 40, 255]], dtype=np.uint8)
+
+    dist_index = DistanceIndex(palette, [3, 2, 1], (0, 0, 0), True)
+
+    assert dist_index.rows(100).tolist() == [0, 2]
+    assert dist_index.pixel_count(100) == 4
+
+
+def test_swap_rows_matches_swap_rgba():
+    rgba = sprite(2)
+    palette, index = index_colors(rgba)
+    dist_index = DistanceIndex(palette, palette_counts(palette, index), (90, 150, 60), True)
+
+    new_palette = swap_rows(palette, dist_index.rows(45), (200, 30, 120), (90, 150, 60))
+
+    expected = swap_rgba(rgba, (200, 30, 120), (90, 150, 60), 45, True)
+    assert np.array_equal(apply_palette(new_palette, index), expected)
+
+
+def test_matches():
+    palette, index = index_colors(sprite(3))
+    dist_index = DistanceIndex(palette, palette_counts(palette, index), (90, 150, 60), True)
+
+    assert dist_index.matches(palette, [90, 150, 60], 1)
+    assert not dist_index.matches(palette.copy(), (90, 150, 60), True)
+    assert not dist_index.matches(palette, (90, 150, 60), False)
+    assert not dist_index.matches(palette, (90, 150, 60), True, "de2000")
+
+
+def test_swap_rows_matches_swap_rgba_with_perceptual_settings():
+    rgba = sprite(4)
+    palette, index = index_colors(rgba)
+    dist_index = DistanceIndex(palette, palette_counts(palette, index), (90, 150, 60), True, "de2000")
+
+    assert dist_index.matches(palette, (90, 150, 60), True, "de2000")
+    for brightness in ("luminance", "lightness"):
+        new_palette = swap_rows(palette, dist_index.rows(12), (200, 30, 120), (90, 150, 60), brightness)
+        expected = swap_rgba(rgba, (200, 30, 120), (90, 150, 60), 12, True, "de2000", brightness)
+        assert np.array_equal(apply_palette(new_palette, index), expected)
@@ -0,0 +1,136 @@
+import random
+import numpy as np
+import pytest
+from PIL import Image
+from colorspace import srgb_to_lab
+from engine import swap_masks, swap_rgb, swap_rgba, index_colors, apply_palette, swap_indexed
+
+
+def legacy_color_change(img, new_rgb_values, old_rgb_values, thresh, preserve):
+    # The original per-pixel loop, kept here as the reference implementation
+    pixels = img.load()
+    width, height = img.size
+    old_r, old_g, old_b = old_rgb_values
+    new_r, new_g, new_b = new_rgb_values
+    for x in range(width):
+        for y in range(height):
+            r, g, b, a = pixels[x, y]
+            if (r, g, b) == old_rgb_values:
+                pixels[x, y] = (*new_rgb_values, a)
+                continue
+            if preserve:
+                is_black = r <= 10 and g <= 10 and b <= 10
+                is_white = r >= 245 and g >= 245 and b >= 245
+                if is_black or is_white:
+                    continue
+            distance = ((r - old_r)**2 + (g - old_g)**2 + (b - old_b)**2)**0.5
+            if distance <= thresh:
+                brightness_old = (old_r + old_g + old_b) / 3
+                brightness_pixel = (r + g + b) / 3
+                brightness_ratio = brightness_pixel / brightness_old if brightness_old > 0 else 1
+                pixels[x, y] = (min(255, max(0, int(new_r * brightness_ratio))),
+                                min(255, max(0, int(new_g * brightness_ratio))),
+                                min(255, max(0, int(new_b * brightness_ratio))), a)
+
+
+def random_sprite(size, seed, base=(120, 60, 200)):
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(-40, 41, size=(size, size, 3))
+    rgb = np.clip(np.array(base) + noise, 0, 255)
+    rgb[::7, ::5] = 0
+    rgb[3::11, 2::9] = 255
+    rgb[1::13] = base
+    alpha = rng.integers(0, 256, size=(size, size, 1))
+    return np.concatenate([rgb, alpha], axis=-1).astype(np.uint8)
+
+
+def test_swap_masks():
+    rgb = np.array([[255, 0, 0], [0, 0, 0], [250, 5, 5], [0, 0, 255]], dtype=np.uint8)
+
+    exact, related = swap_masks(rgb, (255, 0, 0), 10, True)
+
+    assert exact.tolist() == [True, False, False, False]
+    assert related.tolist() == [False, False, True, False]
+
+    exact, related = swap_masks(rgb, (5, 5, 5), 10, False)
+    assert related.tolist() == [False, True, False, False]
+
+
+def test_swap_rgb_black_base_color():
+    rgb = np.array([[0, 0, 0], [3, 3, 3]], dtype=np.uint8)
+
+    out = swap_rgb(rgb, (10, 200, 30), (0, 0, 0), 10, False)
+
+    assert out.tolist() == [[10, 200, 30], [10, 200, 30]]
+
+
+def test_swap_rgba_matches_legacy_loop():
+    random.seed(0)
+    for seed in range(6):
+        rgba = random_sprite(24, seed)
+        old_rgb = (120, 60, 200)
+        new_rgb = tuple(random.randint(0, 255) for _ in range(3))
+        thresh = random.choice([0, 10, 30, 55, 100])
+        preserve = bool(seed % 2)
+
+        expected = Image.fromarray(rgba).copy()
+        legacy_color_change(expected, new_rgb, old_rgb, thresh, preserve)
+        result = swap_rgba(rgba, new_rgb, old_rgb, thresh, preserve)
+
+        assert np.array_equal(result, np.asarray(expected))
+        assert np.array_equal(result[..., 3], rgba[..., 3])
+
+
+def test_index_colors():
+    rgba = random_sprite(16, 3)
+
+    palette, index = index_colors(rgba)
+
+    assert len(palette) == len({tuple(p) for p in rgba.reshape(-1, 4).tolist()})
+    assert np.array_equal(apply_palette(palette, index), rgba)
+
+
+def test_swap_indexed_matches_swap_rgba():
+    rgba = random_sprite(20, 4)
+    palette, index = index_colors(rgba)
+
+    new_palette, result = swap_indexed(palette, index, (10, 220, 90), (120, 60, 200), 40, True)
+
+    assert np.array_equal(result, swap_rgba(rgba, (10, 220, 90), (120, 60, 200), 40, True))
+    assert np.array_equal(apply_palette(new_palette, index), result)
+
+
+def test_metrics_and_brightness_modes_keep_exact_matches():
+    rng = np.random.default_rng(3)
+    rgba = rng.integers(0, 256, size=(24, 24, 4), dtype=np.uint8)
+    rgba[::4, ::3, :3] = (180, 70, 30)
+    exact = np.all(rgba[..., :3] == (180, 70, 30), axis=-1)
+
+    for metric, thresh in (("weighted", 90), ("de76", 20), ("de2000", 15)):
+        for brightness in ("average", "luminance", "lightness"):
+            out = swap_rgba(rgba, (20, 90, 250), (180, 70, 30), thresh, True, metric, brightness)
+            assert np.all(out[exact, :3] == (20, 90, 250))
+            assert np.array_equal(out[..., 3], rgba[..., 3])
+            changed = np.any(out[..., :3] != rgba[..., :3], axis=-1)
+            assert changed.sum() > exact.sum()
+
+
+def test_perceptual_metric_ranks_by_appearance():
+    # Equal RGB steps, but the blue step is much harder to see than the green one
+    rgb = np.array([[100, 100, 130], [100, 130, 100]], dtype=np.uint8)
+    exact, related = swap_masks(rgb, (100, 100, 100), 15, False, "de2000")
+    assert related.tolist() == [True, False]
+
+
+def test_lightness_mode_follows_pixel_lightness():
+    darker = swap_rgb(np.array([[60, 20, 10]], dtype=np.uint8), (90, 140, 200), (120, 40, 20), 200, False,
+                      brightness="lightness")[0]
+    shift = srgb_to_lab([60, 20, 10])[0] - srgb_to_lab([120, 40, 20])[0]
+    assert srgb_to_lab(darker)[0] == pytest.approx(srgb_to_lab([90, 140, 200])[0] + shift, abs=0.5)
+
+
+def test_unknown_metric_or_brightness_mode():
+    with pytest.raises(ValueError):
+        swap_rgb(np.zeros((2, 3), dtype=np.uint8), (1, 2, 3), (5, 5, 5), 30, False, metric="cmyk")
+    with pytest.raises(ValueError):
+        swap_rgb(np.zeros((2, 3), dtype=np.uint8), (1, 2, 3), (5, 5, 5), 30, False, brightness="hsv")
@@ -0,0 +1,93 @@
+import numpy as np
+from history import SwapHistory, palette_delta, delta_nbytes
+
+
+def make_palettes():
+    before = np.arange(40, dtype=np.uint8).reshape(10, 4)
+    after = before.copy()
+    after[[2, 7], :3] = 255
+    return before, after
+
+
+def test_palette_delta_keeps_changed_rows_only():
+    before, after = make_palettes()
+
+    delta = palette_delta(before, after, "step")
+
+    assert delta.rows.tolist() == [2, 7]
+    assert np.array_equal(delta.before, before[[2, 7]])
+    assert np.array_equal(delta.after, after[[2, 7]])
+    assert delta.data == "step"
+
+
+def test_undo_and_redo():
+    before, after = make_palettes()
+    history = SwapHistory()
+    history.record(before, after, "step")
+
+    palette, _, data = history.undo(after)
+    assert np.array_equal(palette, before)
+    assert data == "step"
+    assert not history.can_undo() and history.can_redo()
+
+    palette, _, data = history.redo(palette)
+    assert np.array_equal(palette, after)
+    assert history.can_undo() and not history.can_redo()
+
+
+def test_record_clears_redo():
+    before, after = make_palettes()
+    history = SwapHistory()
+    history.record(before, after)
+    history.undo(after)
+
+    history.record(before, after)
+
+    assert not history.can_redo()
+
+
+def test_memory_budget_evicts_oldest():
+    before, after = make_palettes()
+    entry_size = palette_delta(before, after).rows.nbytes + 2 * 8
+    history = SwapHistory(max_bytes=entry_size * 2)
+
+    for i in range(5):
+        history.record(before, after, i)
+
+    assert len(history) == 2
+    assert history.nbytes <= history.max_bytes
+    assert [d.data for d in history.undo_entries] == [3, 4]
+
+
+def test_undo_and_redo_region_swap():
+    before, _ = make_palettes()
+    after = np.concatenate([before, [[1, 2, 3, 255], [4, 5, 6, 255]]]).astype(np.uint8)
+    after[0] = 99
+    index_before = np.tile(np.arange(10, dtype=np.uint16), (3, 1))
+    index_after = index_before.copy()
+    index_after[0, :2] = [10, 11]
+    history = SwapHistory()
+
+    delta = history.record(before, after, "region", index_before, index_after)
+    assert delta.rows.tolist() == [0]
+    assert delta.index.pixels.tolist() == [0, 1]
+    assert history.nbytes == delta_nbytes(delta)
+
+    palette, index, data = history.undo(after, index_after)
+    assert np.array_equal(palette, before)
+    assert np.array_equal(index, index_before)
+    assert data == "region"
+    assert index_after[0, 0] == 10
+
+    palette, index, _ = history.redo(palette, index)
+    assert np.array_equal(palette, after)
+    assert np.array_equal(index, index_after)
+
+
+def test_palette_only_steps_keep_the_index():
+    before, after = make_palettes()
+    index = np.zeros((2, 2), dtype=np.uint16)
+    history = SwapHistory()
+    history.record(before, after, None, index, index)
+
+    assert history.undo(after, index)[1] is index
@@ -0,0 +1,83 @@
+import numpy as np
+from PIL import Image
+
+from indexed import (read_indexed, load_indexed, indexed_digest, can_write_indexed, write_indexed,
+                     index_idat, write_palette_png)
+
+
+def make_indexed(path, transparency=None):
+    im = Image.fromarray(np.array([[0, 1, 2], [2, 1, 0]], dtype=np.uint8))
+    im.putpalette(bytes([200, 40, 40, 0, 0, 0, 255, 255, 255]), "RGB")
+    params = {} if transparency is None else {"transparency": transparency}
+    im.save(path, **params)
+    return path
+
+
+def test_read_indexed_matches_rgba_conversion(tmp_path):
+    for transparency in (None, 1, b"\xff\x80"):
+        path = make_indexed(str(tmp_path / "sprite.png"), transparency)
+        palette, index = load_indexed(path)
+        with Image.open(path) as im:
+            assert np.array_equal(palette[index], np.asarray(im.convert("RGBA")))
+        assert index.tolist() == [[0, 1, 2], [2, 1, 0]]
+
+
+def test_read_indexed_needs_a_palette():
+    assert read_indexed(Image.new("RGBA", (2, 2))) is None
+    assert read_indexed(Image.new("RGB", (2, 2))) is None
+
+
+def test_write_indexed_round_trip(tmp_path):
+    palette = np.array([[10, 20, 30, 255], [0, 0, 0, 0], [250, 250, 250, 128]], dtype=np.uint8)
+    index = np.array([[0, 1], [2, 0]], dtype=np.uint8)
+    path = str(tmp_path / "out.png")
+
+    write_indexed(path, palette, index)
+
+    with Image.open(path) as im:
+        assert im.mode == "P"
+    read_palette, read_index = load_indexed(path)
+    assert np.array_equal(read_palette, palette)
+    assert np.array_equal(read_index, index)
+
+
+def test_write_indexed_gif(tmp_path):
+    palette = np.array([[10, 20, 30, 255], [0, 0, 0, 0]], dtype=np.uint8)
+    index = np.array([[0, 1], [1, 0]], dtype=np.uint8)
+    path = str(tmp_path / "out.gif")
+
+    write_indexed(path, palette, index)
+
+    with Image.open(path) as im:
+        assert np.array_equal(np.asarray(im.convert("RGBA")), palette[index])
+
+
+def test_can_write_indexed():
+    opaque = np.full((4, 4), 255, dtype=np.uint8)
+    partial = opaque.copy()
+    partial[1, 3] = 128
+    assert can_write_indexed("a.png", partial)
+    assert not can_write_indexed("a.gif", partial)
+    assert can_write_indexed("a.GIF", opaque)
+    assert not can_write_indexed("a.jpg", opaque)
+    assert not can_write_indexed("a.png", np.full((257, 4), 255, dtype=np.uint8))
+
+
+def test_indexed_digest():
+    palette = np.array([[1, 2, 3, 255]], dtype=np.uint8)
+    index = np.zeros((2, 2), dtype=np.uint8)
+    assert indexed_digest(palette, index) == indexed_digest(palette.copy(), index.copy())
+    assert indexed_digest(palette, index) != indexed_digest(palette, index.reshape(1, 4))
+
+
+def test_write_palette_png_shares_index_data(tmp_path):
+    index = np.array([[0, 1, 2], [2, 1, 0]], dtype=np.uint8)
+    idat = index_idat(index)
+    for n, palette in enumerate([
+            np.array([[10, 20, 30, 255], [0, 0, 0, 0], [250, 250, 250, 128]], dtype=np.uint8),
+            np.array([[1, 2, 3, 255], [4, 5, 6, 255], [7, 8, 9, 255]], dtype=np.uint8)]):
+        path = str(tmp_path / f"{n}.png")
+        write_palette_png(path, palette, idat, (3, 2))
+        with Image.open(path) as im:
+            assert im.mode == "P"
+            assert np.array_equal(np.asarray(im.convert("RGBA")), palette[index])
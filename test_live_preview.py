@@ -0,0 +1,73 @@
+import threading
+import time
+import pytest
+from live_preview import PreviewWorker
+
+
+def wait_for_result(worker, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = worker.poll()
+        if result is not None:
+            return result
+        time.sleep(0.01)
+    return None
+
+
+def test_submit_and_poll():
+    worker = PreviewWorker()
+
+    worker.submit(lambda a, b: a + b, 2, 3)
+
+    assert wait_for_result(worker) == 5
+    assert worker.poll() is None
+    worker.stop()
+
+
+def test_newer_job_supersedes_older_ones():
+    worker = PreviewWorker()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(value):
+        started.set()
+        release.wait(5)
+        return value
+
+    worker.submit(slow, "stale")
+    started.wait(5)
+    worker.submit(lambda: "queued but replaced")
+    worker.submit(lambda: "fresh")
+    release.set()
+
+    assert wait_for_result(worker) == "fresh"
+    assert worker.poll() is None
+    worker.stop()
+
+
+def test_cancel_drops_pending_result():
+    worker = PreviewWorker()
+    release = threading.Event()
+
+    worker.submit(lambda: release.wait(5) and "done")
+    worker.cancel()
+    release.set()
+
+    assert wait_for_result(worker, timeout=0.3) is None
+    worker.stop()
+
+
+def test_errors_are_raised_on_poll():
+    worker = PreviewWorker()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    worker.submit(fail)
+    deadline = time.monotonic() + 5
+    while worker.results.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with pytest.raises(RuntimeError):
+        worker.poll()
+    worker.stop()
@@ -0,0 +1,68 @@
+import numpy as np
+from unittest.mock import patch
+from PIL import Image
+from palette import color_histogram, cluster_swatches, clear_histogram_cache, image_digest
+
+
+def test_color_histogram_counts_every_color():
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, size=(64, 64, 4), dtype=np.uint8)
+    rgba[:8] = (10, 20, 30, 255)
+
+    colors, counts = color_histogram(rgba, use_cache=False)
+
+    assert counts.sum() == 64 * 64
+    assert tuple(colors[0]) == (10, 20, 30, 255)
+    assert counts[0] == 8 * 64
+    assert np.all(np.diff(counts) <= 0)
+
+
+def test_color_histogram_matches_getcolors_order():
+    img = Image.new("RGBA", (6, 1))
+    for x, color in enumerate([(5, 5, 5, 255), (9, 0, 0, 255), (9, 0, 0, 255),
+                               (1, 2, 3, 255), (200, 0, 0, 255), (1, 2, 3, 255)]):
+        img.putpixel((x, 0), color)
+
+    colors, counts = color_histogram(np.asarray(img), use_cache=False)
+
+    expected = sorted(img.getcolors(), reverse=True)
+    assert [(int(n), tuple(int(v) for v in c)) for n, c in zip(counts, colors)] == expected
+
+
+def test_color_histogram_is_cached():
+    clear_histogram_cache()
+    rgba = np.zeros((4, 4, 4), dtype=np.uint8)
+
+    first = color_histogram(rgba)
+    with patch('palette.np.unique') as mock_unique:
+        assert color_histogram(rgba.copy()) is first
+        mock_unique.assert_not_called()
+
+
+def test_image_digest_depends_on_shape():
+    rgba = np.zeros((4, 4, 4), dtype=np.uint8)
+    assert image_digest(rgba) != image_digest(rgba.reshape(2, 8, 4))
+
+
+def test_cluster_swatches():
+    colors = np.array([[100, 0, 0, 255], [101, 1, 0, 255], [0, 0, 200, 255], [102, 2, 1, 255]], dtype=np.uint8)
+    counts = np.array([10, 8, 7, 1])
+
+    swatches, swatch_counts = cluster_swatches(colors, counts, max_swatches=10, merge_distance=16)
+    assert swatches.tolist() == [[100, 0, 0, 255], [0, 0, 200, 255]]
+    assert swatch_counts.tolist() == [19, 7]
+
+    swatches, swatch_counts = cluster_swatches(colors, counts, max_swatches=2)
+    assert swatches.tolist() == [[100, 0, 0, 255], [101, 1, 0, 255]]
+    assert swatch_counts.tolist() == [10, 8]
+
+
+def test_cluster_swatches_across_cell_boundaries():
+    # 95 and 96 fall in different cells of a 24 grid but are one shade apart
+    colors = np.array([[95, 95, 95, 255], [96, 96, 96, 255], [200, 20, 20, 255], [140, 140, 140, 255]],
+                      dtype=np.uint8)
+    counts = np.array([9, 8, 5, 2])
+
+    swatches, swatch_counts = cluster_swatches(colors, counts, max_swatches=10, merge_distance=24)
+    assert swatches.tolist() == [[95, 95, 95, 255], [200, 20, 20, 255], [140, 140, 140, 255]]
+    assert swatch_counts.tolist() == [17, 5, 2]
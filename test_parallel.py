@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+import numpy as np
+
+from engine import swap_rgba
+from recipe import Recipe
+from parallel import parallel_swap, parallel_color_change, band_rows
+from test_engine import random_sprite
+
+
+def test_band_rows():
+    assert band_rows(100, 8) == 13
+    assert band_rows(3, 8) == 1
+
+
+def test_parallel_color_change_matches_color_change():
+    rgba = random_sprite(37, 0)
+    for thresh, preserve in ((0, True), (45, True), (80, False)):
+        result = parallel_color_change(rgba, (250, 200, 10), (120, 60, 200), thresh, preserve,
+                                       workers=3, min_pixels=0)
+        assert np.array_equal(result, swap_rgba(rgba, (250, 200, 10), (120, 60, 200), thresh, preserve))
+
+
+def test_parallel_swap_recipe():
+    rgba = random_sprite(37, 1)
+    recipe = Recipe([((120, 60, 200), (250, 200, 10), 45, True), ((0, 0, 0), (30, 0, 30), 0, False)])
+
+    result = parallel_swap(rgba, recipe, workers=2, min_pixels=0)
+
+    assert np.array_equal(result, recipe.apply(rgba))
+    assert not np.array_equal(result, rgba)
+
+
+def test_small_images_stay_in_process():
+    rgba = random_sprite(37, 0)
+    recipe = Recipe([((120, 60, 200), (250, 200, 10), 45, True)])
+    with patch("parallel.ProcessPoolExecutor") as mock_pool:
+        assert np.array_equal(parallel_swap(rgba, recipe, workers=4), recipe.apply(rgba))
+        assert np.array_equal(parallel_swap(rgba, recipe, workers=1, min_pixels=0), recipe.apply(rgba))
+        mock_pool.assert_not_called()
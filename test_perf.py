@@ -0,0 +1,79 @@
+import json
+import time
+import numpy as np
+from perf import Profiler, _DISABLED, current_rss_kb
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+
+    with profiler.stage("swap", 100) as ctx:
+        pass
+
+    assert profiler.stage("swap") is _DISABLED
+    assert ctx is None
+    assert profiler.events == []
+
+
+def test_stage_records_timing():
+    profiler = Profiler(enabled=True)
+
+    with profiler.stage("swap", 100):
+        time.sleep(0.01)
+    with profiler.stage("swap", 50):
+        pass
+    with profiler.stage("preview"):
+        pass
+
+    summary = profiler.summary()
+    assert summary["swap"]["calls"] == 2
+    assert summary["swap"]["pixels"] == 150
+    assert summary["swap"]["total"] >= 0.01
+    assert summary["swap"]["max"] >= summary["swap"]["mean"]
+    assert summary["preview"]["pixels"] == 0
+    assert "swap" in profiler.format_summary()
+
+
+def test_stage_records_memory_growth():
+    profiler = Profiler(enabled=True)
+
+    with profiler.stage("grow"):
+        grown = np.ones(32 * 1024 * 1024, dtype=np.uint8)
+
+    (event,) = profiler.events
+    if current_rss_kb() is None:
+        assert event["rss_delta_kb"] is None
+    else:
+        assert event["rss_delta_kb"] >= 16 * 1024
+        assert profiler.summary()["grow"]["max_rss_delta_kb"] == event["rss_delta_kb"]
+        assert "RSS +MB" in profiler.format_summary()
+    del grown
+
+
+def test_drain_and_reset():
+    profiler = Profiler(enabled=True)
+    with profiler.stage("decode"):
+        pass
+
+    events = profiler.drain()
+
+    assert [e["name"] for e in events] == ["decode"]
+    assert profiler.events == []
+
+
+def test_exports(tmp_path):
+    profiler = Profiler(enabled=True)
+    with profiler.stage("decode", 10):
+        pass
+    with profiler.stage("swap", 10):
+        pass
+
+    profiler.export_json(tmp_path / "perf.json")
+    profiler.export_trace(tmp_path / "trace.json")
+
+    data = json.loads((tmp_path / "perf.json").read_text())
+    assert set(data["summary"]) == {"decode", "swap"}
+    trace = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [e["name"] for e in trace] == ["decode", "swap"]
+    assert trace[0]["ph"] == "X" and trace[0]["ts"] == 0
+    assert trace[1]["ts"] >= trace[0]["ts"]
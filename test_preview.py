@@ -0,0 +1,79 @@
+import numpy as np
+
+from preview import PreviewRenderer, fit_zoom, zoom_levels, zoom_label, zoom_array, changed_box
+
+
+def test_fit_zoom():
+    assert fit_zoom((32, 16)) == (7, 1)
+    assert fit_zoom((250, 250)) == (1, 1)
+    assert fit_zoom((1000, 300)) == (1, 4)
+    assert fit_zoom((1001, 300)) == (1, 5)
+
+
+def test_zoom_levels_and_labels():
+    assert zoom_levels((100, 80)) == [(1, 1), (2, 1)]
+    assert zoom_levels((4096, 4096)) == [(1, 17)]
+    assert zoom_label((3, 1)) == "3x"
+    assert zoom_label((1, 4)) == "1/4x"
+
+
+def test_zoom_array_is_nearest_neighbour():
+    index = np.arange(6).reshape(2, 3)
+    assert zoom_array(index, (2, 1)).tolist() == [[0, 0, 1, 1, 2, 2]] * 2 + [[3, 3, 4, 4, 5, 5]] * 2
+    assert zoom_array(np.arange(16).reshape(4, 4), (1, 2)).tolist() == [[0, 2], [8, 10]]
+
+
+def test_changed_box():
+    mask = np.zeros((5, 6), dtype=bool)
+    assert changed_box(mask) is None
+    mask[1, 2] = mask[3, 4] = True
+    assert changed_box(mask) == (2, 1, 5, 4)
+
+
+def test_update_renders_only_changed_rows():
+    palette = np.array([[10, 10, 10, 255], [20, 20, 20, 255], [30, 30, 30, 0]], dtype=np.uint8)
+    index = np.zeros((10, 20), dtype=np.uint16)
+    index[4:6, 8:10] = 1
+    index[0, 0] = 2
+    renderer = PreviewRenderer(index, box=100)
+
+    frame, box = renderer.update(palette)
+    assert renderer.zoom == (5, 1)
+    assert box == (0, 0, 100, 50)
+    assert np.array_equal(frame, palette[zoom_array(index, (5, 1))])
+
+    swapped = palette.copy()
+    swapped[1] = (200, 0, 0, 255)
+    frame, box = renderer.update(swapped)
+    assert box == (40, 20, 50, 30)
+    assert np.array_equal(frame, swapped[zoom_array(index, (5, 1))])
+
+    assert renderer.update(swapped)[1] is None
+
+
+def test_update_reuses_frames_of_earlier_palettes():
+    palette = np.array([[10, 10, 10, 255], [20, 20, 20, 255]], dtype=np.uint8)
+    index = np.eye(8, dtype=np.uint16)
+    renderer = PreviewRenderer(index, box=16)
+    first, _ = renderer.update(palette)
+
+    swapped = palette.copy()
+    swapped[0] = (1, 2, 3, 255)
+    renderer.update(swapped)
+
+    # Undo back to the first palette hands back the cached frame
+    frame, box = renderer.update(palette.copy())
+    assert frame is first
+    assert box == (0, 0, 16, 16)
+    assert np.array_equal(first, palette[zoom_array(index, renderer.zoom)])
+
+
+def test_set_zoom_redraws_everything():
+    palette = np.array([[10, 10, 10, 255]], dtype=np.uint8)
+    renderer = PreviewRenderer(np.zeros((4, 4), dtype=np.uint16), box=16)
+    renderer.update(palette)
+
+    renderer.set_zoom((2, 1))
+    frame, box = renderer.update(palette)
+    assert frame.shape == (8, 8, 4)
+    assert box == (0, 0, 8, 8)
@@ -1,12 +1,27 @@
+import time
 from unittest.mock import MagicMock, patch
+import numpy as np
 from PIL import Image
-from project import load_image, upload_image, extract_and_show_colors, select_color, highlight_selected_swatch, pick_new_color, color_change, apply_color_swap, update_status_label, undo, save_image
+import project
+from recipe import Recipe
+from session import SwapSession
+from live_preview import PreviewWorker
+from region import label_regions
+from perf import Profiler
+from project import load_image, upload_image, extract_and_show_colors, select_color, highlight_selected_swatch, pick_new_color, schedule_preview, poll_preview, cancel_preview, color_change, get_distance_index, update_threshold_info, apply_color_swap, apply_recipe, save_recipe, load_recipe, update_status_label, undo, redo, save_image, refresh_modified_preview, change_zoom, toggle_perf_panel, refresh_perf_panel, set_profiling, export_perf
+
+def make_session(img):
+    return SwapSession(np.asarray(img.convert("RGBA")))
 
 def test_load_image():
     dummy_image = Image.new('RGBA', (100, 100))
 
-    with patch('project.Image.open', return_value=dummy_image) as mock_open, \
+    with patch('session.Image.open', return_value=dummy_image) as mock_open, \
          patch('project.ImageTk.PhotoImage', side_effect=lambda img: f"MockPhotoImage({img.width}x{img.height})") as mock_photo, \
+         patch('project.session', None), \
+         patch('project.preview_renderer', None), \
+         patch('project.zoom_info_label', new=MagicMock()) as mock_zoom_label, \
+         patch('project.update_threshold_info') as mock_info, \
          patch('project.extract_and_show_colors') as mock_extract, \
          patch('project.original_canvas', new=MagicMock()) as mock_orig_canvas, \
          patch('project.modified_canvas', new=MagicMock()) as mock_mod_canvas:
@@ -17,7 +32,9 @@ def test_load_image():
         assert mock_photo.call_count == 2
         mock_orig_canvas.config.assert_called_once()
         mock_mod_canvas.config.assert_called_once()
-        mock_extract.assert_called_once_with(dummy_image)
+        assert np.array_equal(mock_extract.call_args.args[0], np.asarray(dummy_image))
+        assert project.session.path == "dummy_path.png"
+        mock_zoom_label.config.assert_called_once_with(text="2x")
     
 def test_upload_image():
     with patch('project.filedialog.askopenfilename', return_value='test_image.png') as mock_dialog, \
@@ -41,27 +58,54 @@ def test_extract_and_show_colors():
     for i in range(10):
         img.putpixel((i, 0), (i*10, i*10, i*10, 255))
 
-    dummy_colors = [(100, (i*10, i*10, i*10, 255)) for i in range(10)]
-
     with patch('project.original_color_frame', new=MagicMock()) as mock_orig_frame, \
          patch('project.latest_color_frame', new=MagicMock()) as mock_latest_frame, \
          patch('project.tk.Frame', side_effect=lambda *args, **kwargs: MagicMock()) as mock_tkframe, \
-         patch.object(img, 'getcolors', return_value=dummy_colors):
+         patch('project.group_shades', new=MagicMock(get=lambda: False)):
 
         mock_orig_frame.winfo_children.return_value = [MagicMock(), MagicMock()]
         mock_latest_frame.winfo_children.return_value = [MagicMock()]
 
-        extract_and_show_colors(img)
+        extract_and_show_colors(np.asarray(img))
 
         assert all(w.destroy.called for w in mock_orig_frame.winfo_children.return_value)
         assert all(w.destroy.called for w in mock_latest_frame.winfo_children.return_value)
 
         assert mock_tkframe.call_count == 20 
 
+def test_extract_and_show_colors_many_colors():
+    # More than 16 colors used to show no palette at all
+    img = Image.new("RGBA", (40, 1))
+    for i in range(40):
+        img.putpixel((i, 0), (i * 5, 100, 100, 255))
+    for i in range(5):
+        img.putpixel((i, 0), (0, 0, 255, 255))
+
+    with patch('project.original_color_frame', new=MagicMock()), \
+         patch('project.latest_color_frame', new=MagicMock()), \
+         patch('project.tk.Frame', side_effect=lambda *args, **kwargs: MagicMock()) as mock_tkframe, \
+         patch('project.group_shades', new=MagicMock(get=lambda: False)):
+
+        extract_and_show_colors(np.asarray(img))
+
+        assert mock_tkframe.call_count == 20
+        assert project.unique_colors[0] == (0, 0, 255, 255)
+
+    with patch('project.original_color_frame', new=MagicMock()), \
+         patch('project.latest_color_frame', new=MagicMock()), \
+         patch('project.tk.Frame', side_effect=lambda *args, **kwargs: MagicMock()), \
+         patch('project.group_shades', new=MagicMock(get=lambda: True)):
+
+        extract_and_show_colors(np.asarray(img))
+
+        # Neighbouring shades collapse into fewer swatches
+        assert len(project.unique_colors) < 10
+
 def test_select_coloe():
     color = (100, 150, 200, 255)
 
     with patch('project.highlight_selected_swatch') as mock_highlight, \
+         patch('project.update_threshold_info') as mock_threshold_info, \
          patch('project.update_status_label') as mock_status, \
          patch('project.selected_color', new=None), \
          patch('project.selected_from_latest', new=None):
@@ -71,6 +115,7 @@ def test_select_coloe():
         # Check if the selected color swatch gets highlighted
         mock_highlight.assert_called_once_with(color, True)
         mock_status.assert_called_once()
+        mock_threshold_info.assert_called_once()
 
 def test_highlight_selected_swatch():
     target_color = (100, 150, 200, 255)
@@ -107,16 +152,131 @@ def test_pick_new_color():
         pick_new_color()
 
         mock_info.assert_called_once_with("Select Color", "Please select a color to change on the sprite.")
-    # Valid color selection allows color swap
+    # Valid color selection starts a live preview; nothing is committed yet
     with patch('project.selected_color', (100, 100, 100, 255)), \
          patch('project.colorchooser.askcolor', return_value=((255, 0, 0), "#ff0000")) as mock_chooser, \
          patch('project.apply_color_swap') as mock_apply, \
+         patch('project.schedule_preview') as mock_schedule, \
+         patch('project.status_label', MagicMock()), \
+         patch('project.preview_pending', False), \
          patch('project.new_rgb', new=None):
 
         pick_new_color()
 
         mock_chooser.assert_called_once()
-        mock_apply.assert_called_once()
+        mock_schedule.assert_called_once()
+        mock_apply.assert_not_called()
+        assert project.preview_pending
+        assert project.new_rgb == (255, 0, 0)
+
+def test_schedule_and_poll_preview():
+    img = Image.new("RGBA", (4, 4), (100, 100, 100, 255))
+    worker = PreviewWorker()
+    sprite = make_session(img)
+
+    with patch('project.preview_worker', worker), \
+         patch('project.preview_pending', True), \
+         patch('project.selected_color', (100, 100, 100, 255)), \
+         patch('project.new_rgb', (0, 255, 0)), \
+         patch('project.session', sprite), \
+         patch('project.preview_renderer', None), \
+         patch('project.threshold', new=MagicMock(get=lambda: 10)), \
+         patch('project.preserve_bw', new=MagicMock(get=lambda: True)), \
+         patch('project.ImageTk.PhotoImage', side_effect=lambda im: im), \
+         patch('project.modified_canvas', new=MagicMock()) as mock_canvas:
+
+        schedule_preview()
+        deadline = time.monotonic() + 5
+        while worker.results.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        poll_preview()
+        worker.stop()
+
+        preview = mock_canvas.config.call_args.kwargs["image"]
+        # 4px sprite at the largest integer zoom that fits the preview box
+        assert preview.size == (248, 248)
+        assert preview.getpixel((0, 0)) == (0, 255, 0, 255)
+        # The edit itself is untouched until it is confirmed
+        assert sprite.image().getpixel((0, 0)) == (100, 100, 100, 255)
+        assert not sprite.history.can_undo()
+        mock_canvas.after.assert_called_once_with(project.PREVIEW_POLL_MS, poll_preview)
+
+def test_poll_preview_survives_errors():
+    worker = MagicMock()
+    worker.poll.side_effect = ValueError("bad palette")
+
+    with patch('project.preview_worker', worker), \
+         patch('project.preview_pending', True), \
+         patch('project.status_label', MagicMock()) as mock_status, \
+         patch('project.modified_canvas', new=MagicMock()) as mock_canvas:
+
+        poll_preview()
+
+        mock_status.config.assert_called_once_with(text="Preview failed: bad palette")
+        mock_canvas.after.assert_called_once_with(project.PREVIEW_POLL_MS, poll_preview)
+
+def test_refresh_modified_preview_incremental():
+    palette = np.array([[200, 100, 50, 255], [0, 0, 0, 255]], dtype=np.uint8)
+    swapped = np.array([[200, 100, 50, 255], [10, 20, 30, 255]], dtype=np.uint8)
+    index = np.zeros((10, 10), dtype=np.uint16)
+    index[2, 3] = 1
+    sprite = SwapSession(palette[index], indexed=(palette, index))
+
+    with patch('project.session', sprite), \
+         patch('project.preview_renderer', None), \
+         patch('project.ImageTk.PhotoImage', side_effect=lambda im: im), \
+         patch('project.modified_canvas', new=MagicMock()) as mock_canvas:
+
+        refresh_modified_preview()
+        assert mock_canvas.config.call_args.kwargs["image"].size == (250, 250)
+
+        sprite.palette = swapped
+        refresh_modified_preview()
+
+        # Only the 25x25 block of the changed pixel is redrawn
+        mock_canvas.config.assert_called_once()
+        assert mock_canvas.tk.call.call_args.args[4:] == (75, 50)
+
+        sprite.palette = palette
+        refresh_modified_preview()
+        assert mock_canvas.tk.call.call_count == 2
+
+def test_change_zoom():
+    img = Image.new("RGBA", (50, 40), (100, 100, 100, 255))
+
+    with patch('project.session', make_session(img)), \
+         patch('project.preview_renderer', None), \
+         patch('project.preview_pending', False), \
+         patch('project.zoom_info_label', new=MagicMock()) as mock_zoom_label, \
+         patch('project.ImageTk.PhotoImage', side_effect=lambda im: im), \
+         patch('project.original_canvas', new=MagicMock()) as mock_orig_canvas, \
+         patch('project.modified_canvas', new=MagicMock()) as mock_canvas:
+
+        change_zoom(-1)
+
+        mock_zoom_label.config.assert_called_once_with(text="4x")
+        assert mock_orig_canvas.config.call_args.kwargs["image"].size == (200, 160)
+        assert mock_canvas.config.call_args.kwargs["image"].size == (200, 160)
+
+        change_zoom(1)
+        change_zoom(1)
+        mock_zoom_label.config.assert_called_with(text="5x")
+
+def test_cancel_preview():
+    worker = MagicMock()
+
+    with patch('project.preview_worker', worker), \
+         patch('project.preview_pending', True), \
+         patch('project.refresh_modified_preview') as mock_refresh:
+
+        cancel_preview()
+
+        assert not project.preview_pending
+        worker.cancel.assert_called_once()
+        mock_refresh.assert_called_once()
+
+        cancel_preview()
+        mock_refresh.assert_called_once()
 
 def test_color_change():
     # Create a 3x1 image: red, black, near-red (should be threshold-matched)
@@ -141,15 +301,54 @@ def test_color_change():
     assert a == 255
     assert 0 <= r <= 255 and 100 <= g <= 255 and 0 <= b <= 255
 
-def test_apply_color_swap():
+def test_get_distance_index():
+    img = Image.new("RGBA", (4, 1), (200, 40, 40, 255))
+    img.putpixel((3, 0), (0, 0, 0, 255))
+
+    with patch('project.session', make_session(img)), \
+         patch('project.preserve_bw', new=MagicMock(get=lambda: True)):
+
+        index = get_distance_index((200, 40, 40))
+        assert index.pixel_count(0) == 3
+        # Reused while the palette and selection stay the same
+        assert get_distance_index((200, 40, 40)) is index
+        assert get_distance_index((0, 0, 0)) is not index
 
+def test_update_threshold_info():
+    img = Image.new("RGBA", (4, 1), (200, 40, 40, 255))
+    img.putpixel((3, 0), (190, 40, 40, 255))
+
+    with patch('project.session', make_session(img)), \
+         patch('project.selected_color', (200, 40, 40, 255)), \
+         patch('project.threshold', new=MagicMock(get=lambda: 5)), \
+         patch('project.preserve_bw', new=MagicMock(get=lambda: True)), \
+         patch('project.threshold_info_label', MagicMock()) as mock_label:
+
+        update_threshold_info()
+        mock_label.config.assert_called_with(text="Affects 1 colors, 3 px")
+
+        with patch('project.threshold', new=MagicMock(get=lambda: 10)):
+            update_threshold_info()
+        mock_label.config.assert_called_with(text="Affects 2 colors, 4 px")
+
+    with patch('project.selected_color', None), \
+         patch('project.threshold_info_label', MagicMock()) as mock_label:
+        update_threshold_info()
+        mock_label.config.assert_called_once_with(text="")
+
+def test_apply_color_swap():
     dummy_image = Image.new("RGBA", (10, 10), (100, 100, 100, 255))
+    sprite = make_session(dummy_image)
 
-    with patch('project.modified_pil', dummy_image), \
+    with patch('project.session', sprite), \
          patch('project.selected_color', (100, 100, 100, 255)), \
          patch('project.new_rgb', (0, 255, 0)), \
-         patch('project.undo_stack', []), \
-         patch('project.color_change') as mock_color_change, \
+         patch('project.region_seed', None), \
+         patch('project.preview_renderer', None), \
+         patch('project.threshold', new=MagicMock(get=lambda: 25)), \
+         patch('project.preserve_bw', new=MagicMock(get=lambda: False)), \
+         patch('project.connectivity', new=MagicMock(get=lambda: 4)), \
+         patch('project.update_threshold_info'), \
          patch('project.ImageTk.PhotoImage', return_value='MockedPhoto'), \
          patch('project.modified_canvas', new=MagicMock()) as mock_canvas, \
          patch('project.latest_color_frame', new=MagicMock()) as mock_frame:
@@ -161,12 +360,14 @@ def test_apply_color_swap():
         mock_frame.winfo_children.return_value = [non_matching_widget, matching_widget]
 
         apply_color_swap()
-        mock_color_change.assert_called_once()
 
         # Check canvas image updated
         mock_canvas.config.assert_called_once_with(image='MockedPhoto')
         matching_widget.config.assert_called_once_with(bg='#00ff00')
         assert matching_widget.color_value == (0, 255, 0, 255)
+        assert sprite.image().getpixel((5, 5)) == (0, 255, 0, 255)
+        assert sprite.recipe.steps == [((100, 100, 100), (0, 255, 0), 25, False, "rgb", "average")]
+        assert len(sprite.history) == 1
     # Check if error message is shown when no color is selected
     with patch('project.selected_color', None), \
          patch('project.new_rgb', (255, 255, 255)), \
@@ -174,6 +375,92 @@ def test_apply_color_swap():
         apply_color_swap()
         mock_warn.assert_called_once_with("Missing", "Select a base color and new color first.")
 
+def test_apply_recipe():
+    img = Image.new("RGBA", (4, 4), (200, 40, 40, 255))
+    img.putpixel((0, 0), (0, 0, 0, 255))
+    loaded = Recipe([((200, 40, 40), (10, 10, 240), 30, True), ((10, 10, 240), (90, 200, 90), 0, True)])
+    sprite = make_session(img)
+
+    with patch('project.session', sprite), \
+         patch('project.update_threshold_info'), \
+         patch('project.refresh_modified_preview') as mock_refresh, \
+         patch('project.extract_and_show_colors'):
+
+        apply_recipe(loaded)
+
+        # One undo entry for the whole recipe
+        assert len(sprite.history) == 1
+        assert sprite.image().getpixel((1, 1)) == (90, 200, 90, 255)
+        assert sprite.image().getpixel((0, 0)) == (0, 0, 0, 255)
+        assert sprite.recipe.steps == loaded.steps
+        mock_refresh.assert_called_once()
+
+    with patch('project.session', None), \
+         patch('project.messagebox.showerror') as mock_error:
+        apply_recipe(loaded)
+        mock_error.assert_called_once()
+
+def test_save_and_load_recipe(tmp_path):
+    path = str(tmp_path / "recipe.json")
+    sprite = make_session(Image.new("RGBA", (2, 2)))
+    sprite.recipe = Recipe([((1, 2, 3), (4, 5, 6), 30, True)])
+
+    with patch('project.session', sprite), \
+         patch('project.filedialog.asksaveasfilename', return_value=path), \
+         patch('project.messagebox.showinfo') as mock_info:
+        save_recipe()
+        mock_info.assert_called_once_with("Saved", f"Recipe saved to {path}")
+
+    with patch('project.filedialog.askopenfilename', return_value=path), \
+         patch('project.apply_recipe') as mock_apply:
+        load_recipe()
+        mock_apply.assert_called_once_with(sprite.recipe)
+
+    with patch('project.session', make_session(Image.new("RGBA", (2, 2)))), \
+         patch('project.messagebox.showinfo') as mock_info:
+        save_recipe()
+        mock_info.assert_called_once_with("Save Recipe", "No swaps to save yet.")
+
+def test_perf_panel():
+    with patch('project.perf_panel_visible', False), \
+         patch('project.perf_toggle', MagicMock()) as mock_toggle, \
+         patch('project.perf_panel', MagicMock()) as mock_panel, \
+         patch('project.perf_text', MagicMock()) as mock_text, \
+         patch('project.perf.profiler', Profiler(enabled=True)) as profiler:
+
+        with profiler.stage("swap", 4):
+            pass
+        toggle_perf_panel()
+
+        mock_panel.pack.assert_called_once()
+        assert "swap" in mock_text.insert.call_args.args[1]
+        mock_text.after.assert_called_once_with(project.PERF_REFRESH_MS, refresh_perf_panel)
+
+        toggle_perf_panel()
+        mock_panel.pack_forget.assert_called_once()
+        mock_toggle.config.assert_called_with(text="Performance \u25b8")
+
+def test_set_profiling():
+    with patch('project.perf_enabled', new=MagicMock(get=lambda: True)), \
+         patch('project.perf.profiler', Profiler()) as profiler:
+        set_profiling()
+        assert profiler.enabled
+
+def test_export_perf(tmp_path):
+    path = str(tmp_path / "trace.json")
+
+    with patch('project.perf.profiler', Profiler(enabled=True)) as profiler, \
+         patch('project.filedialog.asksaveasfilename', return_value=path), \
+         patch('project.messagebox.showinfo') as mock_info:
+
+        export_perf()
+        mock_info.assert_called_once_with("Export Timings", "No timings recorded yet.")
+
+        with profiler.stage("decode"):
+            pass
+        export_perf(trace=True)
+        assert "traceEvents" in open(path).read()
+
 def test_update_status_label():
     # With a selected color
     with patch('project.selected_color', (123, 45, 67, 255)), \
@@ -192,57 +479,218 @@ def test_update_status_label():
         mock_label.config.assert_called_once_with(text="No color selected")
 
 def test_undo():
-    # Test when undo stack is empty
-    with patch('project.undo_stack', []), \
+    # Test when history is empty
+    with patch('project.session', make_session(Image.new("RGBA", (2, 2)))), \
          patch('project.messagebox.showinfo') as mock_info:
         undo()
         mock_info.assert_called_once_with("Undo", "Nothing to undo.")
-    
-    #test when undo stack is not empty
-    dummy_image = Image.new("RGBA", (10, 10), (200, 100, 50, 255))
 
-    with patch('project.undo_stack', [dummy_image.copy()]), \
+    #test when history is not empty
+    palette = np.array([[200, 100, 50, 255], [0, 0, 0, 255]], dtype=np.uint8)
+    index = np.zeros((10, 10), dtype=np.uint16)
+    index[0, 0] = 1
+    sprite = SwapSession(palette[index], indexed=(palette, index))
+    sprite.swap((10, 20, 30), (200, 100, 50), 30, True)
+
+    with patch('project.session', sprite), \
+         patch('project.preview_renderer', None), \
          patch('project.modified_canvas', new=MagicMock()) as mock_canvas, \
          patch('project.ImageTk.PhotoImage', return_value='MockedPhoto'), \
          patch('project.extract_and_show_colors') as mock_extract, \
-         patch('project.update_status_label') as mock_status, \
-         patch('project.modified_pil', dummy_image):
+         patch('project.update_threshold_info'), \
+         patch('project.update_status_label') as mock_status:
 
         undo()
 
-        # Ensure image is popped and updated
+        # Ensure the delta is reverted and the preview updated
+        assert sprite.image().getpixel((1, 1)) == (200, 100, 50, 255)
+        assert sprite.image().getpixel((0, 0)) == (0, 0, 0, 255)
+        assert sprite.recipe.steps == []
+        assert sprite.history.can_redo()
         mock_canvas.config.assert_called_once_with(image='MockedPhoto')
         mock_extract.assert_called_once()
         mock_status.assert_called_once()
 
-def test_save_image():
+        redo()
+
+        assert sprite.image().getpixel((1, 1)) == (10, 20, 30, 255)
+        assert len(sprite.recipe) == 1
+
+def test_redo():
+    with patch('project.session', None), \
+         patch('project.messagebox.showinfo') as mock_info:
+        redo()
+        mock_info.assert_called_once_with("Redo", "Nothing to redo.")
+
+def test_save_image(tmp_path):
     # No image
-    with patch('project.modified_pil', None), \
+    with patch('project.session', None), \
          patch('project.messagebox.showerror') as mock_error:
         save_image()
         mock_error.assert_called_once_with("Error", "No image to save.")
 
     # Image exists and saves successfully
-    dummy_image = Image.new("RGBA", (10, 10))
+    path = str(tmp_path / "test_output.png")
+    sprite = make_session(Image.new("RGBA", (10, 10), (1, 2, 3, 255)))
+
+    with patch('project.session', sprite), \
+         patch('project.filedialog.asksaveasfilename', return_value=path) as mock_ask, \
+         patch('project.messagebox.showinfo') as mock_info:
 
-    with patch('project.modified_pil', dummy_image), \
-         patch('project.filedialog.asksaveasfilename', return_value="test_output.png") as mock_ask, \
-         patch('project.messagebox.showinfo') as mock_info, \
-         patch.object(dummy_image, 'save') as mock_save:
-        
         save_image()
-        mock_save.assert_called_once_with("test_output.png")
-        mock_info.assert_called_once_with("Saved", "Sprite saved to test_output.png")
+        assert Image.open(path).getpixel((0, 0)) == (1, 2, 3, 255)
+        mock_info.assert_called_once_with("Saved", f"Sprite saved to {path}")
 
     # Image exists but user cancels save dialog
-    dummy_image = Image.new("RGBA", (10, 10))
-
-    with patch('project.modified_pil', dummy_image), \
+    with patch('project.session', sprite), \
          patch('project.filedialog.asksaveasfilename', return_value="") as mock_ask, \
          patch('project.messagebox.showinfo') as mock_info, \
-         patch.object(dummy_image, 'save') as mock_save:
-        
+         patch.object(sprite, 'save') as mock_save:
+
         save_image()
         mock_save.assert_not_called()
         mock_info.assert_not_called()
 
+def test_load_and_save_indexed(tmp_path):
+    src, dst = str(tmp_path / "indexed.png"), str(tmp_path / "out.png")
+    im = Image.fromarray(np.array([[0, 1], [1, 2]], dtype=np.uint8))
+    im.putpalette(bytes([200, 40, 40, 0, 0, 0, 180, 30, 30]), "RGB")
+    im.save(src, transparency=1)
+
+    with patch('project.session', None), \
+         patch('project.preview_renderer', None), \
+         patch('project.zoom_info_label', new=MagicMock()), \
+         patch('project.update_threshold_info'), \
+         patch('project.extract_and_show_colors'), \
+         patch('project.ImageTk.PhotoImage', side_effect=lambda im: im), \
+         patch('project.original_canvas', new=MagicMock()), \
+         patch('project.modified_canvas', new=MagicMock()), \
+         patch('project.filedialog.asksaveasfilename', return_value=dst), \
+         patch('project.messagebox.showinfo'):
+
+        load_image(src)
+        assert project.session.indexed
+        assert len(project.session.palette) == 3
+
+        project.session.swap((0, 0, 255), (200, 40, 40), 0, True)
+        save_image()
+
+    with Image.open(dst) as out:
+        assert out.mode == "P"
+        assert np.asarray(out).tolist() == [[0, 1], [1, 2]]
+        assert out.convert("RGBA").getpixel((0, 0)) == (0, 0, 255, 255)
+        assert out.convert("RGBA").getpixel((1, 0)) == (0, 0, 0, 0)
+
+def test_region_swap_and_undo():
+    pixels = np.array([[[200, 40, 40, 255], [0, 0, 0, 255], [200, 40, 40, 255]]] * 2, dtype=np.uint8)
+    sprite = SwapSession(pixels)
+    # 3x2 sprite at 83x zoom, centered in a 255x170 label
+    event = MagicMock(x=10, y=100, widget=MagicMock(winfo_width=lambda: 255, winfo_height=lambda: 170))
+    state = dict(session=sprite, preview_renderer=None, selected_color=None, region_seed=None, new_rgb=None)
+    controls = dict(region_mode=MagicMock(get=lambda: True), connectivity=MagicMock(get=lambda: 4),
+                    threshold=MagicMock(get=lambda: 30), preserve_bw=MagicMock(get=lambda: True),
+                    status_label=MagicMock(), latest_color_frame=MagicMock(), modified_canvas=MagicMock(),
+                    update_threshold_info=MagicMock(), highlight_selected_swatch=MagicMock(),
+                    extract_and_show_colors=MagicMock(), update_status_label=MagicMock())
+
+    with patch.multiple('project', **state, **controls), \
+         patch('project.ImageTk.PhotoImage', side_effect=lambda im: im):
+
+        project.select_region(event)
+        assert project.region_seed == (0, 1)
+        assert project.selected_color == (200, 40, 40, 255)
+
+        project.new_rgb = (0, 0, 255)
+        apply_color_swap()
+
+        # Only the left blob changes, and the swap stays out of the recipe
+        assert sprite.image().getpixel((0, 0)) == (0, 0, 255, 255)
+        assert sprite.image().getpixel((2, 0)) == (200, 40, 40, 255)
+        assert len(sprite.recipe) == 0
+        assert project.region_seed is None
+
+        undo()
+        assert np.array_equal(sprite.rgba(), pixels)
+        assert np.array_equal(sprite.counts, [2, 4])
+
+        redo()
+        assert sprite.image().getpixel((0, 0)) == (0, 0, 255, 255)
+        assert sprite.image().getpixel((2, 1)) == (200, 40, 40, 255)
+
+def test_region_preview_labels_on_the_worker():
+    pixels = np.array([[[200, 40, 40, 255], [0, 0, 0, 255], [200, 40, 40, 255]]] * 2, dtype=np.uint8)
+    sprite = SwapSession(pixels)
+    worker = MagicMock()
+    state = dict(session=sprite, preview_renderer=None, selected_color=(200, 40, 40, 255), region_seed=(0, 1),
+                 new_rgb=(0, 0, 255), preview_pending=True, preview_worker=worker, distance_metric="rgb",
+                 brightness_mode="average")
+    controls = dict(connectivity=MagicMock(get=lambda: 4), threshold=MagicMock(get=lambda: 30),
+                    preserve_bw=MagicMock(get=lambda: True))
+
+    with patch.multiple('project', **state, **controls), \
+         patch('region.label_regions', wraps=label_regions) as mock_label:
+
+        schedule_preview()
+
+        # The slider thread only queues the job; labelling happens when it runs
+        mock_label.assert_not_called()
+        fn, *args = worker.submit.call_args[0]
+        frame = fn(*args)
+        mock_label.assert_called_once()
+
+    assert frame[0, 0].tolist() == [0, 0, 255, 255]
+    assert frame[0, -1].tolist() == [200, 40, 40, 255]
+
+def test_save_image_animated(tmp_path):
+    frames = [Image.new("RGBA", (6, 6), (200, 40, 40, 255)), Image.new("RGBA", (6, 6), (0, 0, 0, 255))]
+    src = str(tmp_path / "anim.gif")
+    dst = str(tmp_path / "out.gif")
+    frames[0].save(src, save_all=True, append_images=frames[1:], duration=[120, 80], loop=0)
+    sprite = SwapSession.open(src)
+    sprite.recipe = Recipe([((200, 40, 40), (0, 0, 255), 30, True)])
+
+    with patch('project.session', sprite), \
+         patch('project.filedialog.asksaveasfilename', return_value=dst), \
+         patch('project.messagebox.showinfo') as mock_info:
+
+        save_image()
+
+        mock_info.assert_called_once_with("Saved", f"Animated sprite (2 frames) saved to {dst}")
+        with Image.open(dst) as out:
+            assert out.n_frames == 2
+            assert out.convert("RGBA").getpixel((0, 0)) == (0, 0, 255, 255)
+
+    # Region swaps can't be replayed over the frames, so the save is refused
+    sprite.swap((0, 255, 0), (0, 0, 255), 0, True, seed=(0, 0))
+    with patch('project.session', sprite), \
+         patch('project.filedialog.asksaveasfilename', return_value=dst), \
+         patch('project.messagebox.showinfo') as mock_info, \
+         patch('project.messagebox.showerror') as mock_error:
+
+        save_image()
+
+        mock_info.assert_not_called()
+        mock_error.assert_called_once()
+        with Image.open(dst) as out:
+            assert out.convert("RGBA").getpixel((0, 0)) == (0, 0, 255, 255)
+
+def test_distance_and_brightness_menus():
+    with patch('project.on_threshold_change') as mock_threshold_change, \
+         patch('project.schedule_preview') as mock_schedule, \
+         patch('project.distance_metric', "rgb"), \
+         patch('project.brightness_mode', "average"):
+        project.set_distance_metric("CIELAB ΔE2000")
+        project.set_brightness_mode("L*")
+
+        assert project.distance_metric == "de2000"
+        assert project.brightness_mode == "lightness"
+        mock_threshold_change.assert_called_once()
+        mock_schedule.assert_called_once()
+
+        palette = np.array([[200, 40, 40, 255], [190, 45, 45, 255], [40, 200, 40, 255]], dtype=np.uint8)
+        index = np.array([[0, 1, 2]], dtype=np.uint16)
+        with patch('project.session', SwapSession(palette[index], indexed=(palette, index))), \
+             patch('project.preserve_bw', new=MagicMock(get=lambda: True)):
+            dist_index = get_distance_index((200, 40, 40))
+        assert dist_index.metric == "de2000"
+        assert dist_index.rows(10).tolist() == [0, 1]
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from recipe import Recipe, SwapStep
+from engine import swap_rgba
+
+
+def random_rgba(seed):
+    rng = np.random.default_rng(seed)
+    rgba = rng.integers(0, 256, size=(16, 16, 4), dtype=np.uint8)
+    rgba[::3, ::2, :3] = (180, 70, 30)
+    return rgba
+
+
+def test_add_normalizes_steps():
+    recipe = Recipe()
+    recipe.add((180, 70, 30, 255), [0, 0, 255], 30, 1)
+
+    assert recipe.steps == [SwapStep((180, 70, 30), (0, 0, 255), 30, True)]
+    assert len(recipe) == 1
+
+
+def test_apply_matches_sequential_swaps():
+    rgba = random_rgba(0)
+    steps = [((180, 70, 30), (20, 90, 250), 60, True),
+             ((20, 90, 250), (240, 240, 20), 35, False),
+             ((0, 0, 0), (50, 0, 50), 10, False)]
+
+    expected = rgba
+    for old_rgb, new_rgb, thresh, preserve in steps:
+        expected = swap_rgba(expected, new_rgb, old_rgb, thresh, preserve)
+
+    assert np.array_equal(Recipe(steps).apply(rgba), expected)
+
+
+def test_empty_recipe_is_identity():
+    rgba = random_rgba(1)
+    assert np.array_equal(Recipe().apply(rgba), rgba)
+
+
+def test_save_and_load(tmp_path):
+    recipe = Recipe([((180, 70, 30), (20, 90, 250), 60, True), ((1, 2, 3), (4, 5, 6), 0, False)])
+    path = tmp_path / "recipe.json"
+
+    recipe.save(path)
+
+    assert Recipe.load(path) == recipe
+
+
+def test_from_dict_rejects_unknown_version():
+    with pytest.raises(ValueError):
+        Recipe.from_dict({"version": 99, "steps": []})
+
+
+def test_save_and_load_keeps_metric_and_brightness(tmp_path):
+    recipe = Recipe()
+    recipe.add((180, 70, 30), (20, 90, 250), 12, True, "de2000", "lightness")
+    path = tmp_path / "recipe.json"
+
+    recipe.save(path)
+
+    assert Recipe.load(path).steps == [SwapStep((180, 70, 30), (20, 90, 250), 12, True, "de2000", "lightness")]
+
+
+def test_from_dict_reads_version_1():
+    recipe = Recipe.from_dict({"version": 1, "steps": [
+        {"old": [180, 70, 30], "new": [20, 90, 250], "threshold": 60, "preserve_bw": True}]})
+
+    assert recipe.steps == [SwapStep((180, 70, 30), (20, 90, 250), 60, True, "rgb", "average")]
+
+
+def test_compile_uses_step_metric_and_brightness():
+    rgba = random_rgba(2)
+    recipe = Recipe([((180, 70, 30), (20, 90, 250), 20, True, "de76", "luminance")])
+
+    assert np.array_equal(recipe.apply(rgba),
+                          swap_rgba(rgba, (20, 90, 250), (180, 70, 30), 20, True, "de76", "luminance"))
@@ -0,0 +1,100 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from region import label_regions, RegionLabels, swap_region
+from engine import swap_rgba, apply_palette
+
+
+def flood_labels(mask, connectivity):
+    # Straightforward BFS reference, numbered in row-major order of first pixel
+    steps = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+    if connectivity == 8:
+        steps += [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+    labels = np.zeros(mask.shape, dtype=int)
+    count = 0
+    for y, x in zip(*np.nonzero(mask)):
+        if labels[y, x]:
+            continue
+        count += 1
+        labels[y, x] = count
+        queue = deque([(y, x)])
+        while queue:
+            cy, cx = queue.popleft()
+            for dy, dx in steps:
+                ny, nx = cy + dy, cx + dx
+                if 0 <= ny < mask.shape[0] and 0 <= nx < mask.shape[1] and mask[ny, nx] and not labels[ny, nx]:
+                    labels[ny, nx] = count
+                    queue.append((ny, nx))
+    return labels
+
+
+def test_label_regions_matches_flood_fill():
+    rng = np.random.default_rng(3)
+    for density in (0.3, 0.5, 0.7):
+        mask = rng.random((23, 31)) < density
+        for connectivity in (4, 8):
+            assert np.array_equal(label_regions(mask, connectivity), flood_labels(mask, connectivity))
+
+
+def test_label_regions_diagonal_and_u_shapes():
+    diagonal = np.eye(4, dtype=bool)
+    assert label_regions(diagonal, 4).max() == 4
+    assert label_regions(diagonal, 8).max() == 1
+
+    # The two arms only meet along the bottom row
+    u_shape = np.array([[1, 0, 1], [1, 0, 1], [1, 1, 1]], dtype=bool)
+    assert label_regions(u_shape).max() == 1
+    assert label_regions(np.zeros((3, 3), dtype=bool)).max() == 0
+
+
+def test_region_labels_cache():
+    index = np.array([[0, 1, 0], [0, 1, 0]], dtype=np.uint16)
+    cache = RegionLabels()
+
+    labels = cache.labels(index, np.array([0]))
+    assert labels.tolist() == [[1, 0, 2], [1, 0, 2]]
+    assert cache.labels(index, np.array([0])) is labels
+    assert cache.labels(index, np.array([0]), 8) is not labels
+    assert cache.labels(index.copy(), np.array([0])) is not labels
+
+
+def test_region_labels_shared_between_threads():
+    rng = np.random.default_rng(0)
+    index = rng.integers(0, 6, size=(64, 64)).astype(np.uint16)
+    cache = RegionLabels(cache_size=2)
+    row_sets = [np.array([n, (n + 1) % 6]) for n in range(6)] * 4
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda rows: cache.labels(index, rows), row_sets))
+
+    for rows, labels in zip(row_sets, results):
+        assert np.array_equal(labels, label_regions(np.isin(index, rows)))
+
+
+def test_swap_region_edits_exclusive_rows_in_place():
+    palette = np.array([[200, 40, 40, 255], [0, 0, 0, 255], [190, 40, 40, 255]], dtype=np.uint8)
+    index = np.array([[0, 1, 2], [0, 1, 2]], dtype=np.uint16)
+    region = index == 0
+
+    new_palette, new_index = swap_region(palette, index, region, (0, 0, 255), (200, 40, 40))
+
+    assert new_index is index
+    assert new_palette[0].tolist() == [0, 0, 255, 255]
+    assert np.array_equal(new_palette[1:], palette[1:])
+
+
+def test_swap_region_copies_shared_rows():
+    palette = np.array([[200, 40, 40, 255], [0, 0, 0, 255], [180, 30, 30, 128]], dtype=np.uint8)
+    index = np.array([[0, 2, 1, 0, 2]], dtype=np.uint16)
+    region = np.array([[True, True, False, False, False]])
+
+    new_palette, new_index = swap_region(palette, index, region, (0, 0, 255), (200, 40, 40))
+
+    rgba = apply_palette(palette, index)
+    expected = rgba.copy()
+    expected[region] = swap_rgba(rgba[region], (0, 0, 255), (200, 40, 40), 255, False)
+    assert np.array_equal(apply_palette(new_palette, new_index), expected)
+    assert len(new_palette) == 5
+    assert np.array_equal(index, [[0, 2, 1, 0, 2]])
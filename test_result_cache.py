@@ -0,0 +1,86 @@
+import os
+from unittest.mock import patch
+
+import numpy as np
+
+from recipe import Recipe
+from result_cache import ResultCache, recipe_key
+
+
+def test_recipe_key_normalizes_parameters():
+    a = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+    b = Recipe()
+    b.add([200, 40, 40, 255], np.array([0, 128, 255]), 30.0, 1)
+    assert recipe_key(a) == recipe_key(b)
+    assert recipe_key(a) != recipe_key(Recipe([((200, 40, 40), (0, 128, 255), 31, True)]))
+    assert recipe_key(a) != recipe_key(Recipe([((200, 40, 40), (0, 128, 255), 30, False)]))
+    assert recipe_key(a) == recipe_key(Recipe([((200, 40, 40), (0, 128, 255), 30, True, "rgb", "average")]))
+    assert recipe_key(a) != recipe_key(Recipe([((200, 40, 40), (0, 128, 255), 30, True, "de76", "average")]))
+    assert recipe_key(a) != recipe_key(Recipe([((200, 40, 40), (0, 128, 255), 30, True, "rgb", "lightness")]))
+
+
+def test_output_and_mapping_round_trip(tmp_path):
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+    src = tmp_path / "out.png"
+    src.write_bytes(b"encoded sprite")
+    mapped = np.arange(8, dtype=np.uint8).reshape(2, 4)
+
+    with ResultCache(str(tmp_path / "cache")) as cache:
+        assert not cache.fetch_output("abc", recipe, ".png", str(tmp_path / "copy.png"))
+        cache.store_output("abc", recipe, ".png", str(src))
+        cache.store_mapping("abc", recipe, mapped)
+
+    with ResultCache(str(tmp_path / "cache")) as cache:
+        assert cache.fetch_output("abc", recipe, ".png", str(tmp_path / "copy.png"))
+        assert (tmp_path / "copy.png").read_bytes() == b"encoded sprite"
+        assert not cache.fetch_output("abc", recipe, ".bmp", str(tmp_path / "copy.bmp"))
+        assert np.array_equal(cache.fetch_mapping("abc", recipe), mapped)
+        assert cache.fetch_mapping("abd", recipe) is None
+        assert cache.hit_rate() == 0.5
+
+
+def test_entry_evicted_while_fetching_is_a_miss(tmp_path):
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+    src = tmp_path / "out.png"
+    src.write_bytes(b"encoded sprite")
+
+    with ResultCache(str(tmp_path / "cache")) as cache:
+        cache.store_output("abc", recipe, ".png", str(src))
+        cache.store_mapping("abc", recipe, np.zeros((2, 4), dtype=np.uint8))
+        # Another process removes the files between the index lookup and the read
+        with patch('result_cache.shutil.copyfile', side_effect=FileNotFoundError), \
+             patch('result_cache.np.load', side_effect=FileNotFoundError):
+            assert not cache.fetch_output("abc", recipe, ".png", str(tmp_path / "copy.png"))
+            assert cache.fetch_mapping("abc", recipe) is None
+        assert cache.misses == 1 and cache.hits == 0
+        assert cache.nbytes() == 0
+
+
+def test_source_digest_tracks_size_and_mtime(tmp_path):
+    sprite = tmp_path / "a.png"
+    sprite.write_bytes(b"one")
+
+    with ResultCache(str(tmp_path / "cache")) as cache:
+        assert cache.source_digest(str(sprite)) is None
+        cache.remember_source(str(sprite), "abc")
+        assert cache.source_digest(str(sprite)) == "abc"
+
+        sprite.write_bytes(b"three")
+        assert cache.source_digest(str(sprite)) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    recipe = Recipe([((200, 40, 40), (0, 128, 255), 30, True)])
+    src = tmp_path / "out.png"
+    src.write_bytes(b"x" * 100)
+
+    with ResultCache(str(tmp_path / "cache"), max_bytes=250) as cache:
+        cache.store_output("a", recipe, ".png", str(src))
+        cache.store_output("b", recipe, ".png", str(src))
+        assert cache.fetch_output("a", recipe, ".png", str(tmp_path / "copy.png"))
+        cache.store_output("c", recipe, ".png", str(src))
+
+        assert cache.nbytes() == 200
+        assert not cache.fetch_output("b", recipe, ".png", str(tmp_path / "copy.png"))
+        assert cache.fetch_output("a", recipe, ".png", str(tmp_path / "copy.png"))
+        assert len(os.listdir(tmp_path / "cache" / "objects")) == 2
@@ -0,0 +1,194 @@
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import numpy as np
+import pytest
+from PIL import Image
+from colorspace import METRICS, BRIGHTNESS_MODES
+from engine import swap_rgba
+from recipe import Recipe
+from session import SwapSession, color_change, main
+from test_engine import random_sprite
+
+
+def sprite(seed):
+    rng = np.random.default_rng(seed)
+    rgba = np.empty((24, 24, 4), dtype=np.uint8)
+    rgba[..., :3] = np.clip(np.array([200, 40, 40]) + rng.integers(-40, 41, size=(24, 24, 3)), 0, 255)
+    rgba[..., 3] = rng.integers(100, 256, size=(24, 24))
+    rgba[::5, ::3, :3] = 0
+    rgba[1::4, ::2, :3] = (200, 40, 40)
+    return rgba
+
+
+def test_color_change():
+    img = Image.new('RGBA', (3, 1))
+    img.putpixel((0, 0), (255, 0, 0, 255))   # exact match
+    img.putpixel((1, 0), (0, 0, 0, 255))     # black, preserved
+    img.putpixel((2, 0), (250, 5, 5, 128))   # near match, brightness-adjusted
+
+    out = color_change(img, (0, 255, 0), (255, 0, 0, 255), 10, True)
+
+    assert out.getpixel((0, 0)) == (0, 255, 0, 255)
+    assert out.getpixel((1, 0)) == (0, 0, 0, 255)
+    r, g, b, a = out.getpixel((2, 0))
+    assert a == 128 and 100 <= g <= 255
+    assert img.getpixel((0, 0)) == (255, 0, 0, 255)
+
+
+def test_swap_matches_whole_image_swap():
+    rgba = sprite(0)
+    session = SwapSession(rgba)
+    index = session.index
+
+    session.swap((0, 255, 0), (200, 40, 40), 30, True)
+    expected = swap_rgba(rgba, (0, 255, 0), (200, 40, 40), 30, True)
+    assert np.array_equal(session.rgba(), expected)
+
+    # Later swaps only recolor the palette
+    session.swap((0, 0, 255), (0, 255, 0), 12, False, "de2000", "lightness")
+    expected = swap_rgba(expected, (0, 0, 255), (0, 255, 0), 12, False, "de2000", "lightness")
+    assert np.array_equal(session.rgba(), expected)
+    assert session.index is index
+    assert session.recipe.apply(rgba).tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize("metric", [key for key, _ in METRICS])
+@pytest.mark.parametrize("brightness", [key for key, _ in BRIGHTNESS_MODES])
+def test_swap_matches_swap_rgba_for_every_setting(metric, brightness):
+    # The session recolors palette rows, the batch path whole pixel arrays;
+    # a recipe must replay exactly as it looked while editing
+    thresh = {"rgb": 60, "weighted": 150, "de76": 25, "de2000": 20}[metric]
+    rng = np.random.default_rng(0)
+    for seed in range(20):
+        old_rgb, new_rgb = (tuple(int(v) for v in rng.integers(0, 256, 3)) for _ in range(2))
+        rgba = random_sprite(24, seed, old_rgb)
+        session = SwapSession(rgba)
+
+        session.swap(new_rgb, old_rgb, thresh, True, metric, brightness)
+
+        expected = swap_rgba(rgba, new_rgb, old_rgb, thresh, True, metric, brightness)
+        assert np.array_equal(session.rgba(), expected)
+        assert np.array_equal(session.recipe.apply(rgba), expected)
+
+
+def test_undo_redo_and_recipe():
+    rgba = sprite(1)
+    session = SwapSession(rgba)
+    loaded = Recipe([((200, 40, 40), (10, 10, 240), 30, True), ((10, 10, 240), (90, 200, 90), 0, True)])
+
+    assert not session.undo()
+    session.swap((0, 255, 0), (200, 40, 40), 30, True)
+    session.apply_recipe(loaded)
+    assert len(session.recipe) == 3 and len(session.history) == 2
+
+    assert session.undo()
+    assert len(session.recipe) == 1
+    assert session.undo()
+    assert np.array_equal(session.rgba(), rgba) and len(session.recipe) == 0
+
+    assert session.redo() and session.redo() and not session.redo()
+    assert np.array_equal(session.rgba(), loaded.apply(swap_rgba(rgba, (0, 255, 0), (200, 40, 40), 30, True)))
+
+
+def test_region_swap():
+    pixels = np.array([[[200, 40, 40, 255], [0, 0, 0, 255], [200, 40, 40, 255]]] * 2, dtype=np.uint8)
+    session = SwapSession(pixels)
+
+    session.swap((0, 0, 255), (200, 40, 40), 30, True, seed=(0, 1))
+
+    assert session.color_at(0, 0) == (0, 0, 255, 255)
+    assert session.color_at(2, 1) == (200, 40, 40, 255)
+    assert len(session.recipe) == 0
+    assert np.array_equal(session.counts, [2, 2, 2])
+    session.undo()
+    assert np.array_equal(session.rgba(), pixels)
+
+
+def test_open_and_save_indexed(tmp_path):
+    src, dst = str(tmp_path / "indexed.png"), str(tmp_path / "out.png")
+    im = Image.fromarray(np.array([[0, 1], [1, 2]], dtype=np.uint8))
+    im.putpalette(bytes([200, 40, 40, 0, 0, 0, 180, 30, 30]), "RGB")
+    im.save(src, transparency=1)
+
+    session = SwapSession.open(src)
+    session.swap((0, 0, 255), (200, 40, 40), 0, True)
+    assert session.save(dst) is None
+
+    with Image.open(dst) as out:
+        assert out.mode == "P"
+        assert out.convert("RGBA").getpixel((0, 0)) == (0, 0, 255, 255)
+        assert out.convert("RGBA").getpixel((1, 0)) == (0, 0, 0, 0)
+
+
+def test_animated_save_refuses_region_swaps(tmp_path):
+    src, dst = str(tmp_path / "anim.gif"), str(tmp_path / "out.gif")
+    frames = [Image.new("RGB", (2, 2), (200, 40, 40)), Image.new("RGB", (2, 2), (0, 0, 0))]
+    frames[0].save(src, save_all=True, append_images=frames[1:], duration=100)
+
+    session = SwapSession.open(src)
+    session.swap((0, 0, 255), (200, 40, 40), 0, True, seed=(0, 0))
+    with pytest.raises(ValueError):
+        session.save(dst)
+    assert not os.path.exists(dst)
+    # Still images keep the region swap
+    session.save(str(tmp_path / "still.bmp"))
+
+    session.undo()
+    session.redo()
+    with pytest.raises(ValueError):
+        session.save(dst)
+
+    session.undo()
+    session.swap((0, 0, 255), (200, 40, 40), 0, True)
+    assert session.save(dst) == 2
+    with Image.open(dst) as out:
+        assert out.convert("RGB").getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_animated_save_over_its_own_file(tmp_path):
+    src = str(tmp_path / "anim.gif")
+    frames = [Image.new("RGB", (2, 2), (200, 40, 40)), Image.new("RGB", (2, 2), (0, 0, 0))]
+    frames[0].save(src, save_all=True, append_images=frames[1:], duration=100)
+
+    session = SwapSession.open(src)
+    session.swap((0, 0, 255), (200, 40, 40), 0, True)
+    assert session.save(src) == 2
+
+    with Image.open(src) as out:
+        assert out.n_frames == 2
+        assert out.convert("RGB").getpixel((0, 0)) == (0, 0, 255)
+
+
+def test_sessions_are_independent_across_threads():
+    images = [sprite(seed) for seed in range(4)]
+    colors = [(0, 255, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255)]
+
+    def edit(n):
+        session = SwapSession(images[n])
+        session.swap(colors[n], (200, 40, 40), 25, True, "de76", "luminance")
+        session.swap((10, 10, 10), colors[n], 5, False)
+        session.undo()
+        return session
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        sessions = list(pool.map(edit, range(4)))
+
+    for n, session in enumerate(sessions):
+        expected = swap_rgba(images[n], colors[n], (200, 40, 40), 25, True, "de76", "luminance")
+        assert np.array_equal(session.rgba(), expected)
+        assert len(session.recipe) == 1
+
+
+def test_session_does_not_import_gui():
+    code = ("import sys, session; "
+            "assert not {'tkinter', 'PIL.ImageTk', 'project'} & set(sys.modules), sorted(sys.modules)")
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_main_launches_gui_lazily():
+    with patch('project.main') as mock_main:
+        main()
+    mock_main.assert_called_once_with()
@@ -0,0 +1,89 @@
+import tracemalloc
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+from streaming import open_rgba, iter_strips, StripMapper, stream_swap
+from recipe import Recipe
+from test_engine import random_sprite
+
+RECIPE = Recipe([((120, 60, 200), (250, 200, 10), 45, True), ((0, 0, 0), (30, 0, 30), 0, False)])
+
+
+def test_iter_strips():
+    assert list(iter_strips(10, 4)) == [(0, 4), (4, 8), (8, 10)]
+
+
+def test_strip_mapper_matches_whole_image():
+    rgba = random_sprite(70, 0)
+    mapper = StripMapper(RECIPE)
+
+    result = np.concatenate([mapper.apply(rgba[top:bottom]) for top, bottom in iter_strips(len(rgba), 16)])
+
+    assert np.array_equal(result, RECIPE.apply(rgba))
+    assert len(mapper.keys) == len(np.unique(rgba.reshape(-1, 4), axis=0))
+
+
+@pytest.mark.parametrize("src_ext", [".png", ".npy"])
+@pytest.mark.parametrize("dst_ext", [".png", ".npy", ".bmp"])
+def test_stream_swap(tmp_path, src_ext, dst_ext):
+    rgba = random_sprite(70, 0)
+    src = str(tmp_path / f"in{src_ext}")
+    dst = str(tmp_path / f"out{dst_ext}")
+    if src_ext == ".npy":
+        np.save(src, rgba)
+    else:
+        Image.fromarray(rgba).save(src)
+
+    assert stream_swap(src, dst, RECIPE, strip_rows=9) == (70, 70)
+
+    result = np.asarray(open_rgba(dst)[:])
+    if dst_ext == ".bmp":
+        # BMP drops alpha on save, so only compare the color channels
+        assert np.array_equal(result[..., :3], RECIPE.apply(rgba)[..., :3])
+    else:
+        assert np.array_equal(result, RECIPE.apply(rgba))
+    assert list(tmp_path.glob("tmp*.npy")) == []
+
+
+def test_stream_swap_converts_png_strip_by_strip(tmp_path):
+    # Few distinct colors, so the mapper stays small next to the image
+    colors = random_sprite(6, 0).reshape(-1, 4)
+    rgba = colors[np.random.default_rng(0).integers(0, len(colors), size=(512, 512))]
+    src, dst = str(tmp_path / "in.png"), str(tmp_path / "out.png")
+    Image.fromarray(rgba).save(src)
+
+    assert np.array_equal(open_rgba(src)[100:140], rgba[100:140])
+    tracemalloc.start()
+    try:
+        stream_swap(src, dst, RECIPE, strip_rows=16)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # No full-size array is ever made from the decoded image
+    assert peak < rgba.nbytes
+
+
+@pytest.mark.parametrize("dst_ext", [".png", ".npy", ".bmp"])
+def test_stream_swap_failure_leaves_no_output(tmp_path, dst_ext):
+    src, dst = str(tmp_path / "in.npy"), str(tmp_path / f"out{dst_ext}")
+    np.save(src, random_sprite(70, 0))
+    calls = []
+
+    def fail_on_second_strip(rgba):
+        calls.append(len(rgba))
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        return rgba
+
+    with patch("streaming.StripMapper.apply", side_effect=fail_on_second_strip), pytest.raises(RuntimeError):
+        stream_swap(src, dst, RECIPE, strip_rows=9)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["in.npy"]
+
+
+def test_open_rgba_rejects_bad_arrays(tmp_path):
+    np.save(tmp_path / "bad.npy", np.zeros((4, 4, 3), dtype=np.uint8))
+    with pytest.raises(ValueError):
+        open_rgba(str(tmp_path / "bad.npy"))
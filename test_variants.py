@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+from PIL import Image
+
+from recipe import Recipe
+from variants import compile_variants, pack_sheet, generate, main
+
+RECIPES = {
+    "blue": Recipe([((200, 40, 40), (0, 128, 255), 30, True)]),
+    "gold": Recipe([((200, 40, 40), (250, 200, 20), 30, True), ((0, 0, 0), (40, 20, 0), 0, False)]),
+    "dark": Recipe([((200, 40, 40), (60, 10, 10), 60, False)]),
+}
+
+
+def make_sprite(path):
+    rng = np.random.default_rng(0)
+    rgba = np.empty((9, 12, 4), dtype=np.uint8)
+    rgba[...] = (200, 40, 40, 255)
+    rgba[::2, ::3] = (0, 0, 0, 255)
+    rgba[1::3, 1::2] = (180, 30, 30, 255)
+    rgba[rng.random((9, 12)) < 0.1] = (255, 255, 255, 0)
+    Image.fromarray(rgba).save(path)
+    return rgba
+
+
+def save_recipes(tmp_path):
+    paths = []
+    for name, recipe in RECIPES.items():
+        recipe.save(tmp_path / f"{name}.json")
+        paths.append(str(tmp_path / f"{name}.json"))
+    return paths
+
+
+def test_pack_sheet_layout():
+    palettes = [np.full((2, 4), n, dtype=np.uint8) for n in range(3)]
+    index = np.array([[0, 1]], dtype=np.uint16)
+
+    palette, sheet, cells = pack_sheet(palettes, index)
+
+    assert len(palette) == 7
+    assert sheet.tolist() == [[0, 1, 2, 3], [4, 5, 6, 6]]
+    assert cells[2] == {"x": 0, "y": 1, "width": 2, "height": 1}
+    assert np.array_equal(palette[sheet[1, 0]], palettes[2][0])
+
+
+def test_generate_separate_files(tmp_path):
+    rgba = make_sprite(tmp_path / "sprite.png")
+
+    manifest = generate(str(tmp_path / "sprite.png"), save_recipes(tmp_path), str(tmp_path / "out"))
+
+    assert [v["name"] for v in manifest["variants"]] == list(RECIPES)
+    for entry, recipe in zip(manifest["variants"], RECIPES.values()):
+        with Image.open(entry["file"]) as out:
+            assert out.mode == "P"
+            assert np.array_equal(np.asarray(out.convert("RGBA")), recipe.apply(rgba))
+
+
+def test_main_sheet(tmp_path):
+    rgba = make_sprite(tmp_path / "sprite.png")
+    sheet = tmp_path / "sheet.png"
+
+    assert main([str(tmp_path / "sprite.png"), *save_recipes(tmp_path), "--sheet", str(sheet)]) == 0
+
+    manifest = json.loads((tmp_path / "sheet.json").read_text())
+    sheet_rgba = np.asarray(Image.open(sheet).convert("RGBA"))
+    assert sheet_rgba.shape == (18, 24, 4)
+    for entry, recipe in zip(manifest["variants"], RECIPES.values()):
+        x, y, w, h = entry["x"], entry["y"], entry["width"], entry["height"]
+        assert np.array_equal(sheet_rgba[y:y + h, x:x + w], recipe.apply(rgba))
+    assert not sheet_rgba[9:, 12:].any()
+
+
+def test_main_sheet_indexed_many_colors(tmp_path):
+    # 200 palette entries per variant push the sheet's index past uint8
+    rng = np.random.default_rng(1)
+    colors = np.column_stack([np.arange(200), np.full(200, 40), np.full(200, 40)]).astype(np.uint8)
+    index = rng.integers(0, 200, size=(20, 40)).astype(np.uint8)
+    im = Image.fromarray(index, "P")
+    im.putpalette(colors.tobytes() + bytes(3 * 56), "RGB")
+    im.save(tmp_path / "sprite.png")
+    rgba = np.asarray(im.convert("RGBA"))
+    recipe_paths = save_recipes(tmp_path)[:2]
+    sheet = tmp_path / "sheet.png"
+
+    assert main([str(tmp_path / "sprite.png"), *recipe_paths, "--sheet", str(sheet)]) == 0
+
+    manifest = json.loads((tmp_path / "sheet.json").read_text())
+    sheet_rgba = np.asarray(Image.open(sheet).convert("RGBA"))
+    for entry, recipe in zip(manifest["variants"], RECIPES.values()):
+        x, y, w, h = entry["x"], entry["y"], entry["width"], entry["height"]
+        assert np.array_equal(sheet_rgba[y:y + h, x:x + w], recipe.apply(rgba))
+
+
+def test_compile_variants_only_touches_the_palette():
+    palette = np.array([[200, 40, 40, 255], [0, 0, 0, 255]], dtype=np.uint8)
+    palettes = compile_variants(palette, RECIPES.values())
+    assert [p.shape for p in palettes] == [(2, 4)] * 3
+    assert palettes[0][0].tolist() == [0, 128, 255, 255]
@@ -0,0 +1,123 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from recipe import Recipe
+from batch import decode, encode
+from indexed import MAX_PALETTE, index_idat, write_palette_png
+
+
+def compile_variants(palette, recipes):
+    # Each variant is just a recolored palette over the shared index map
+    return [recipe.compile(palette) for recipe in recipes]
+
+
+def write_variants(paths, palettes, index, indexed):
+    # Variants written as indexed PNGs share one compressed index map, so
+    # each extra file only costs its own palette
+    size = (index.shape[1], index.shape[0])
+    idat = None
+    for path, palette in zip(paths, palettes):
+        if path.lower().endswith(".png") and len(palette) <= MAX_PALETTE:
+            if idat is None:
+                idat = index_idat(index)
+            write_palette_png(path, palette, idat, size)
+        else:
+            encode(palette, index, indexed, path)
+
+
+def pack_sheet(palettes, index, columns=None):
+    # Lays the variants out on a grid. Every variant keeps its own block of
+    # palette rows, plus one transparent row for empty cells at the end.
+    count = len(palettes)
+    columns = columns or math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    height, width = index.shape
+    palette = np.concatenate(list(palettes) + [np.zeros((1, 4), dtype=np.uint8)])
+    dtype = np.uint8 if len(palette) <= 256 else np.uint16 if len(palette) <= 0xFFFF else np.uint32
+    sheet = np.full((rows * height, columns * width), len(palette) - 1, dtype=dtype)
+
+    cells, offset = [], 0
+    for n, variant in enumerate(palettes):
+        x, y = n % columns * width, n // columns * height
+        # Widened first, so a uint8 index map from an indexed sprite doesn't wrap
+        sheet[y:y + height, x:x + width] = index.astype(dtype) + offset
+        cells.append({"x": x, "y": y, "width": width, "height": height})
+        offset += len(variant)
+    return palette, sheet, cells
+
+
+def write_sheet(path, palette, sheet):
+    if path.lower().endswith(".png") and len(palette) <= MAX_PALETTE:
+        write_palette_png(path, palette, index_idat(sheet), (sheet.shape[1], sheet.shape[0]))
+    else:
+        encode(palette, sheet, False, path)
+
+
+def variant_name(recipe_path):
+    return os.path.splitext(os.path.basename(recipe_path))[0]
+
+
+def generate(sprite, recipe_paths, output_dir=None, sheet=None, columns=None):
+    # Decodes the sprite once; returns the manifest of everything written
+    recipes = [Recipe.load(path) for path in recipe_paths]
+    names = [variant_name(path) for path in recipe_paths]
+    palette, index, indexed = decode(sprite)
+    palettes = compile_variants(palette, recipes)
+    manifest = {"sprite": sprite, "width": index.shape[1], "height": index.shape[0], "variants": []}
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        stem, ext = os.path.splitext(os.path.basename(sprite))
+        paths = [os.path.join(output_dir, f"{stem}_{name}{ext}") for name in names]
+        write_variants(paths, palettes, index, indexed)
+        manifest["variants"] = [{"name": name, "recipe": recipe_path, "file": path}
+                                for name, recipe_path, path in zip(names, recipe_paths, paths)]
+    if sheet:
+        sheet_palette, sheet_index, cells = pack_sheet(palettes, index, columns)
+        write_sheet(sheet, sheet_palette, sheet_index)
+        manifest["sheet"] = sheet
+        if not manifest["variants"]:
+            manifest["variants"] = [{"name": name, "recipe": recipe_path}
+                                    for name, recipe_path in zip(names, recipe_paths)]
+        for entry, cell in zip(manifest["variants"], cells):
+            entry.update(cell)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recolor one sprite with many recipes at once.")
+    parser.add_argument("sprite", help="sprite to recolor")
+    parser.add_argument("recipes", nargs="+", help="JSON recipes, one per variant")
+    parser.add_argument("-o", "--output", metavar="DIR", help="write each variant to its own file in DIR")
+    parser.add_argument("--sheet", metavar="FILE", help="pack all variants into one sprite sheet")
+    parser.add_argument("--columns", type=int, help="variants per sheet row (default: square-ish grid)")
+    parser.add_argument("--manifest", metavar="JSON",
+                        help="where to write the manifest (default: next to the sheet or in DIR)")
+    args = parser.parse_args(argv)
+    if not args.output and not args.sheet:
+        parser.error("give --output, --sheet or both")
+
+    start = time.perf_counter()
+    try:
+        manifest = generate(args.sprite, args.recipes, args.output, args.sheet, args.columns)
+    except (OSError, ValueError, KeyError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+    manifest_path = args.manifest or (os.path.splitext(args.sheet)[0] + ".json" if args.sheet
+                                      else os.path.join(args.output, "manifest.json"))
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Wrote {len(manifest['variants'])} variants in {time.perf_counter() - start:.2f} s; "
+          f"manifest in {manifest_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())